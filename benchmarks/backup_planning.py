@@ -0,0 +1,99 @@
+"""
+Compares planning quality and speed of packing strategies and joint planning on generated workloads,
+using benchmarks/simulator.py, without calling AWS. Fails if results are worse than the baseline.
+
+    python benchmarks/backup_planning.py [--update-baseline] [workload ...]
+"""
+from __future__ import print_function
+import json
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from simulator import WORKLOADS, simulate
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backup_planning_baseline.json')
+PLANNERS = {
+    'greedy': {'packing_strategy': 'greedy'},
+    'balanced': {'packing_strategy': 'balanced'},
+    'joint': {'joint_planning': True}
+}
+# quality metrics are deterministic, planning time depends on the machine
+QUALITY_METRICS = ('cost', 'makespan', 'tables_over_recovery_point', 'failed_boosts', 'infeasible_plan')
+MAX_QUALITY_REGRESSION = 1.05
+MAX_PLANNING_SLOWDOWN = 5.0
+MIN_COMPARED_PLANNING_SECONDS = 0.5
+
+
+def run(workload_names):
+    results = {}
+
+    for workload_name in workload_names:
+        table_descriptions = WORKLOADS[workload_name]()
+
+        for planner_name in sorted(PLANNERS):
+            metrics = simulate(table_descriptions, **PLANNERS[planner_name])
+            results['{}/{}'.format(workload_name, planner_name)] = metrics
+
+    return results
+
+
+def print_results(results):
+    columns = ('pipelines', 'makespan', 'cluster_hours', 'idle_cluster_seconds', 'read_capacity_unit_hours',
+               'tables_over_recovery_point', 'failed_boosts', 'infeasible_plan', 'cost', 'planning_seconds')
+    print("{:<24}".format('workload/planner') + "".join("{:>14}".format(x[:13]) for x in columns))
+
+    for name in sorted(results):
+        print("{:<24}".format(name) + "".join("{:>14}".format(results[name][x]) for x in columns))
+
+
+def find_regressions(results, baseline):
+    regressions = []
+
+    for name, metrics in sorted(results.items()):
+        expected = baseline.get(name)
+
+        if not expected:
+            continue
+
+        for metric in QUALITY_METRICS:
+            if metrics[metric] > expected.get(metric, 0) * MAX_QUALITY_REGRESSION:
+                regressions.append("{} {}: {} instead of {}".format(name, metric, metrics[metric],
+                                                                   expected.get(metric, 0)))
+
+        planning_limit = max(expected['planning_seconds'], MIN_COMPARED_PLANNING_SECONDS) * MAX_PLANNING_SLOWDOWN
+
+        if metrics['planning_seconds'] > planning_limit:
+            regressions.append("{} planning_seconds: {} instead of {}".format(name, metrics['planning_seconds'],
+                                                                             expected['planning_seconds']))
+
+    return regressions
+
+
+def main(arguments):
+    logging.disable(logging.ERROR)
+    update_baseline = '--update-baseline' in arguments
+    workload_names = [x for x in arguments if not x.startswith('--')] or sorted(WORKLOADS)
+    results = run(workload_names)
+    print_results(results)
+
+    if update_baseline:
+        with open(BASELINE_FILE, 'w') as f:
+            json.dump(results, f, indent=4, sort_keys=True)
+            f.write('\n')
+
+        return 0
+
+    with open(BASELINE_FILE) as f:
+        regressions = find_regressions(results, json.load(f))
+
+    for regression in regressions:
+        print("Regression: {}".format(regression))
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
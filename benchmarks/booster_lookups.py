@@ -0,0 +1,115 @@
+"""
+Times DynamoDbBooster boost planning and throughput restore planning on synthetic accounts,
+without calling AWS. Time per table should stay roughly flat as table count grows.
+
+    python benchmarks/booster_lookups.py [table_count ...]
+"""
+from __future__ import print_function
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+from hippolyte.dynamodb_booster import DynamoDbBooster, index_by_table_name
+from hippolyte.utils import MAX_TABLES_PER_PIPELINE, INITIAL_READ_THROUGHPUT_PERCENT, chunks
+
+TABLE_COUNTS = [100, 1000, 5000, 20000]
+MAX_PER_TABLE_GROWTH = 4.0
+LIMITS = {'TableMaxReadCapacityUnits': 40000}
+
+
+class FakeCapacityExecutor(object):
+    def apply(self, changes):
+        return [{
+            'table_name': change['description']['Table']['TableName'],
+            'status': 'unchanged',
+            'previous_read_capacity_units': change['read_capacity_units'],
+            'read_capacity_units': change['read_capacity_units'],
+            'error': None,
+            'error_code': None
+        } for change in changes]
+
+
+class FakeConfigUtil(object):
+    def __init__(self, backed_up_tables):
+        self.backed_up_tables = backed_up_tables
+
+    def list_backed_up_tables(self, pipelines, backup_bucket):
+        return self.backed_up_tables
+
+
+def create_table_descriptions(table_count, read_capacity_units):
+    return [{
+        'Table': {
+            'TableName': 'table-{}'.format(index),
+            'TableArn': 'arn:aws:dynamodb:us-east-1:123456789012:table/table-{}'.format(index),
+            'TableSizeBytes': 10 * 1024 ** 3,
+            'ProvisionedThroughput': {'ReadCapacityUnits': read_capacity_units, 'WriteCapacityUnits': 5}
+        }
+    } for index in range(table_count)]
+
+
+def create_pipeline_definitions(table_descriptions):
+    table_names = [x['Table']['TableName'] for x in table_descriptions]
+
+    return [{'objects': [{'id': 'DDBSourceTable{}'.format(index), 'tableName': table_name}
+                         for index, table_name in enumerate(pipeline_tables)]}
+            for pipeline_tables in chunks(table_names, MAX_TABLES_PER_PIPELINE)]
+
+
+def create_booster(table_descriptions, backed_up_tables):
+    booster = DynamoDbBooster(table_descriptions, 'benchmark', INITIAL_READ_THROUGHPUT_PERCENT)
+    booster.capacity_executor = FakeCapacityExecutor()
+    booster.config_util = FakeConfigUtil(backed_up_tables)
+
+    return booster
+
+
+def time_boost_planning(table_count):
+    table_descriptions = create_table_descriptions(table_count, 10)
+    booster = create_booster(table_descriptions, [])
+    started = time.time()
+    descriptions_by_name = index_by_table_name(table_descriptions)
+
+    for definition in create_pipeline_definitions(table_descriptions):
+        booster._plan_pipeline_boost(definition['objects'], 3300, LIMITS, descriptions_by_name)
+
+    return time.time() - started
+
+
+def time_restore_planning(table_count):
+    previous_descriptions = create_table_descriptions(table_count, 10)
+    current_descriptions = create_table_descriptions(table_count, 100)
+    backed_up_tables = [x['Table']['TableName'] for x in previous_descriptions]
+    booster = create_booster(current_descriptions, backed_up_tables)
+    started = time.time()
+
+    booster._restore_all_tables({'Pipelines': [], 'Tables': previous_descriptions})
+
+    return time.time() - started
+
+
+def main(table_counts):
+    logging.disable(logging.ERROR)
+    print("{:>8} {:>12} {:>16} {:>12} {:>16}".format('tables', 'boost [s]', 'boost/table [us]', 'restore [s]',
+                                                     'restore/table [us]'))
+    per_table = []
+
+    for table_count in table_counts:
+        boost = time_boost_planning(table_count)
+        restore = time_restore_planning(table_count)
+        per_table.append((boost + restore) / table_count)
+        print("{:>8} {:>12.3f} {:>16.1f} {:>12.3f} {:>16.1f}".format(
+            table_count, boost, boost / table_count * 1e6, restore, restore / table_count * 1e6))
+
+    growth = per_table[-1] / per_table[0]
+    print("Time per table grew {:.2f} times from {} to {} tables.".format(growth, table_counts[0], table_counts[-1]))
+
+    return 0 if growth <= MAX_PER_TABLE_GROWTH else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main(map(int, sys.argv[1:]) or TABLE_COUNTS))
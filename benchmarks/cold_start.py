@@ -0,0 +1,81 @@
+"""
+Measures Lambda cold start of the monitor step, each run in a fresh interpreter, without calling AWS:
+
+* import: importing hippolyte.dynamodb_backup
+* setup: creating booster, config util, monitor and pipeline util, the way monitor() does
+* first call: first DynamoDB API call, including creation of its client
+* clients: boto3 clients created until then
+
+    python benchmarks/cold_start.py [runs]
+"""
+from __future__ import print_function
+import json
+import os
+import subprocess
+import sys
+import time
+
+RUNS = 5
+
+
+def measure():
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'benchmark')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'benchmark')
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+    from moto import mock_dynamodb2
+    mock = mock_dynamodb2()
+    mock.start()
+
+    started = time.time()
+    import hippolyte.dynamodb_backup
+    imported = time.time()
+
+    from hippolyte import aws_utils
+    from hippolyte.config_util import ConfigUtil
+    from hippolyte.dynamodb_booster import DynamoDbBooster
+    from hippolyte.monitor import Monitor
+    DynamoDbBooster([], 'benchmark', 0.5)
+    ConfigUtil()
+    Monitor('123456789012', 'benchmark', 'benchmark', 'arn:aws:sns:us-east-1:123456789012:benchmark')
+    aws_utils.DataPipelineUtil()
+    set_up = time.time()
+
+    aws_utils.DynamoDBUtil().list_tables()
+    called = time.time()
+    mock.stop()
+
+    return {
+        'import': imported - started,
+        'setup': set_up - imported,
+        'first_call': called - set_up,
+        'clients': len(aws_utils._clients),
+        'scheduler_imported': 'hippolyte.pipeline_scheduler' in sys.modules
+    }
+
+
+def main(runs):
+    results = []
+
+    for _ in range(runs):
+        output = subprocess.check_output([sys.executable, os.path.abspath(__file__), '--child'])
+        results.append(json.loads(output.splitlines()[-1]))
+
+    def median(key):
+        return sorted(x[key] for x in results)[len(results) // 2]
+
+    print("{:>12} {:>12} {:>16} {:>8} {:>20}".format('import [ms]', 'setup [ms]', 'first call [ms]', 'clients',
+                                                    'scheduler imported'))
+    print("{:>12.1f} {:>12.1f} {:>16.1f} {:>8} {:>20}".format(median('import') * 1000, median('setup') * 1000,
+                                                             median('first_call') * 1000, median('clients'),
+                                                             results[0]['scheduler_imported']))
+
+    return 0
+
+
+if __name__ == '__main__':
+    if '--child' in sys.argv:
+        print(json.dumps(measure()))
+    else:
+        sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else RUNS))
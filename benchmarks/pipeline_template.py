@@ -0,0 +1,68 @@
+"""
+Compares rendering pipeline definitions with the parsed PipelineTemplate against the previous
+pystache render followed by json.loads, for full pipelines of MAX_TABLES_PER_PIPELINE tables.
+
+    python benchmarks/pipeline_template.py [pipeline_count]
+"""
+from __future__ import print_function
+import copy
+import json
+import logging
+import os
+import sys
+import time
+import pystache
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from hippolyte.pipeline_scheduler import Scheduler
+from hippolyte.pipeline_template import PipelineTemplate
+from hippolyte.utils import MAX_TABLES_PER_PIPELINE
+
+PIPELINE_COUNT = 200
+
+
+def create_parameters(scheduler):
+    backups = [scheduler.create_backup_parameters(index, 'table-{}'.format(index))
+               for index in range(MAX_TABLES_PER_PIPELINE)]
+
+    return scheduler.create_pipeline_parameters(backups, 1024 ** 3)
+
+
+def render_with_pystache(template, parameters):
+    parameters = copy.copy(parameters)
+    parameters['backups'] = [dict(backup, comma=True) for backup in parameters['backups']]
+    parameters['backups'][-1]['comma'] = False
+
+    return json.loads(pystache.render(template, parameters))
+
+
+def main(pipeline_count):
+    logging.disable(logging.ERROR)
+    scheduler = Scheduler([], 'multiple.template', 'subnet-1', 'eu-west-1', 'backup-bucket', 'log-bucket')
+    parameters = create_parameters(scheduler)
+
+    with open(os.path.join(os.path.dirname(__file__), '..', 'hippolyte', 'multiple.template')) as f:
+        template = f.read()
+
+    started = time.time()
+    rendered_with_pystache = [render_with_pystache(template, parameters) for _ in range(pipeline_count)]
+    pystache_duration = time.time() - started
+
+    started = time.time()
+    pipeline_template = PipelineTemplate(template)
+    rendered = [pipeline_template.render(parameters) for _ in range(pipeline_count)]
+    template_duration = time.time() - started
+
+    if rendered != rendered_with_pystache:
+        print("Rendered definitions differ.")
+        return 1
+
+    print("{} pipelines: pystache + json.loads {:.3f}s, PipelineTemplate {:.3f}s, {:.1f} times faster.".format(
+        pipeline_count, pystache_duration, template_duration, pystache_duration / template_duration))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else PIPELINE_COUNT))
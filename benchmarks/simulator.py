@@ -0,0 +1,328 @@
+"""
+Runs backup planning end to end, the way dynamodb_backup.backup() does, against stubbed AWS utils,
+then simulates execution of the planned pipelines to measure planning quality:
+
+* pipelines: number of data pipelines
+* makespan: duration of the longest pipeline, in seconds
+* read_capacity_unit_hours: read capacity added by boosts, billed by the hour while pipeline runs
+* cluster_hours: EMR hours billed, whole hours per pipeline
+* idle_cluster_seconds: billed cluster time, after pipelines finished
+* tables_over_recovery_point: tables, which finished after the recovery window
+* failed_boosts: boosts rejected, as they would take the account over its read limit
+* infeasible_plan: 1 if joint planning found no plan meeting recovery window within read capacity limits
+* planning_seconds: time spent in planner, scheduler and booster
+
+Workloads are lists of describe_table results. They can be generated, or loaded from a JSON file with
+descriptions exported from a real account.
+"""
+from __future__ import print_function
+import json
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+from hippolyte.backup_planner import BackupPlanner, get_provisioned_read_capacity_units
+from hippolyte.capacity_executor import BOOSTED, CAPPED, FAILED, RESTORED, UNCHANGED
+from hippolyte.cluster_sizing import get_hourly_price
+from hippolyte.duration_model import DurationModel
+from hippolyte.dynamodb_booster import DynamoDbBooster
+from hippolyte.pipeline_scheduler import Scheduler
+from hippolyte.pipeline_template import load_pipeline_template
+from hippolyte.table_packing import DEFAULT_PACKING_STRATEGY
+from hippolyte.utils import ACTIVITY_BOOTSTRAP_TIME, EMR_BOOTSTRAP_TIME, INITIAL_READ_THROUGHPUT_PERCENT, \
+    MAX_DURATION_SEC, MAX_DURATION_SINGLE_PIPELINE, READ_CAPACITY_UNIT_HOURLY_PRICE, list_tables_in_definition
+
+DEFAULT_LIMITS = {
+    'AccountMaxReadCapacityUnits': 80000,
+    'AccountMaxWriteCapacityUnits': 80000,
+    'TableMaxReadCapacityUnits': 40000,
+    'TableMaxWriteCapacityUnits': 40000
+}
+# accounts provisioning more than the default limit have had it raised, leaving that part of what is provisioned
+# for boosts
+RAISED_ACCOUNT_LIMIT_HEADROOM = 0.25
+MIN_TABLE_SIZE_BYTES = 1024
+MAX_TABLE_SIZE_BYTES = 2 * 1024 ** 4
+
+
+def uniform_workload(table_count, seed=1):
+    """
+    Tables from 1MB to 10GB, with 5 to 200 read capacity units, all values equally likely. 500 tables provision
+    about 51000 read capacity units, leaving room for boosts within the default account limit.
+    """
+    generator = random.Random(seed)
+
+    return [_create_description(index, generator.randint(1024 ** 2, 10 * 1024 ** 3), generator.randint(5, 200))
+            for index in range(table_count)]
+
+
+def heavy_tailed_workload(table_count, seed=1):
+    """
+    Mostly small tables and a few huge ones, with Pareto distributed size. Bigger tables tend to have more
+    read capacity, with some empty tables in between.
+    """
+    generator = random.Random(seed)
+    descriptions = []
+
+    for index in range(table_count):
+        if generator.random() < 0.05:
+            size = 0
+        else:
+            size = min(int(generator.paretovariate(0.8) * 20 * 1024 ** 2), MAX_TABLE_SIZE_BYTES)
+
+        read_capacity_units = max(1, min(int(math.sqrt(size / 1024 ** 2) * generator.uniform(1, 10)), 2000))
+        descriptions.append(_create_description(index, size, read_capacity_units))
+
+    return descriptions
+
+
+def large_account_workload(seed=1):
+    """
+    10 thousand tables with heavy tailed sizes.
+    """
+    return heavy_tailed_workload(10000, seed)
+
+
+def load_workload(path):
+    """
+    :param path: JSON file with a list of describe_table results
+    """
+    with open(path) as f:
+        return json.load(f)
+
+
+WORKLOADS = {
+    'uniform': lambda: uniform_workload(500),
+    'heavy-tailed': lambda: heavy_tailed_workload(2000),
+    'large-account': large_account_workload
+}
+
+
+def _create_description(index, size, read_capacity_units):
+    table_name = 'table-{:05d}'.format(index)
+
+    return {
+        'Table': {
+            'TableName': table_name,
+            'TableArn': 'arn:aws:dynamodb:us-east-1:123456789012:table/{}'.format(table_name),
+            'TableSizeBytes': size,
+            'ItemCount': size // 512,
+            'TableStatus': 'ACTIVE',
+            'ProvisionedThroughput': {'ReadCapacityUnits': read_capacity_units, 'WriteCapacityUnits': 5}
+        }
+    }
+
+
+class _FakeCapacityExecutor(object):
+    def __init__(self, account_max_read_capacity_units, provisioned_read_capacity_units):
+        """
+        Applies changes the way DynamoDB would, failing increases which take read capacity provisioned in the
+        account over its limit.
+        """
+        self.account_max_read_capacity_units = account_max_read_capacity_units
+        self.provisioned_read_capacity_units = provisioned_read_capacity_units
+
+    def apply(self, changes):
+        results = []
+
+        for change in changes:
+            previous = change['description']['Table']['ProvisionedThroughput']['ReadCapacityUnits']
+            increase = change['read_capacity_units'] - previous
+            error = None
+            error_code = None
+
+            if not increase:
+                status = UNCHANGED
+            elif increase > 0 and \
+                    self.provisioned_read_capacity_units + increase > self.account_max_read_capacity_units:
+                status = FAILED
+                error = 'Subscriber limit exceeded: Provisioned throughput increase would exceed account limit'
+                error_code = 'LimitExceededException'
+            elif increase < 0:
+                status = RESTORED
+            else:
+                status = CAPPED if change['capped'] else BOOSTED
+
+            if status != FAILED:
+                self.provisioned_read_capacity_units += increase
+
+            results.append({
+                'table_name': change['description']['Table']['TableName'],
+                'status': status,
+                'previous_read_capacity_units': previous,
+                'read_capacity_units': previous if status == FAILED else change['read_capacity_units'],
+                'error': error,
+                'error_code': error_code
+            })
+
+        return results
+
+
+class _FakeConfigUtil(object):
+    def save_configuration(self, pipeline_descriptions, backup_bucket, table_descriptions, scaling_policies,
+                           scalable_targets, exports=None):
+        pass
+
+    def save_boosts(self, backup_bucket, boosts):
+        pass
+
+
+class _FakeApplicationAutoScalingUtil(object):
+    def describe_scalable_targets(self, service_namespace, resource_ids=None):
+        return {'ScalableTargets': []}
+
+    def describe_scaling_policies(self, service_namespace, resource_id=None, scalable_dimension=None):
+        return {'ScalingPolicies': []}
+
+
+class _FakeDynamoDBUtil(object):
+    def __init__(self, limits):
+        self.limits = limits
+
+    def describe_limits(self):
+        return self.limits
+
+
+def get_default_limits(table_descriptions):
+    """
+    :return: DEFAULT_LIMITS, with account read limit raised for workloads provisioning more than that already
+    """
+    provisioned = get_provisioned_read_capacity_units(table_descriptions)
+    account_limit = max(DEFAULT_LIMITS['AccountMaxReadCapacityUnits'],
+                        int(math.ceil(provisioned * (1 + RAISED_ACCOUNT_LIMIT_HEADROOM))))
+
+    return dict(DEFAULT_LIMITS, AccountMaxReadCapacityUnits=account_limit)
+
+
+def simulate(table_descriptions, packing_strategy=DEFAULT_PACKING_STRATEGY, joint_planning=False,
+             recovery_window=MAX_DURATION_SEC, limits=None, duration_model=None, actual_durations=None):
+    """
+    :param table_descriptions: describe_table results, not modified
+    :param packing_strategy: one of table_packing.PACKING_STRATEGIES, used without joint_planning
+    :param joint_planning: whether tables and boosts are planned by BackupPlanner, packing_strategy is used if no
+        plan is feasible, as in backup()
+    :param recovery_window: every table should be backed up within that many seconds
+    :param limits: as returned from DynamoDBUtil.describe_limits(), defaults to get_default_limits()
+    :param duration_model: DurationModel used for planning
+    :param actual_durations: DurationModel used to simulate how long exports really take, defaults to
+        duration_model, so that estimates are exact
+    :return: metrics, as described in the module docstring
+    """
+    limits = limits or get_default_limits(table_descriptions)
+    duration_model = duration_model or DurationModel()
+    actual_durations = actual_durations or duration_model
+    table_descriptions = json.loads(json.dumps(table_descriptions))
+    original_read_capacity_units = dict((x['Table']['TableName'],
+                                         x['Table']['ProvisionedThroughput']['ReadCapacityUnits'])
+                                        for x in table_descriptions)
+    started = time.time()
+    plan = None
+    target_duration = MAX_DURATION_SEC
+
+    infeasible_plan = 0
+
+    if joint_planning:
+        plan = BackupPlanner(table_descriptions, recovery_window, limits, duration_model).plan()
+        target_duration = recovery_window
+
+        if not plan['Feasible']:
+            plan = None
+            target_duration = MAX_DURATION_SEC
+            infeasible_plan = 1
+
+    scheduler = Scheduler(table_descriptions, 'multiple.template', 'subnet-simulated', 'us-east-1',
+                          'simulated-backups', 'simulated-logs', packing_strategy=packing_strategy,
+                          duration_model=duration_model, target_duration=target_duration, plan=plan)
+    template = load_pipeline_template(scheduler.template_file)
+    parameters = scheduler.build_parameters()
+    pipeline_descriptions = []
+
+    for index, pipeline_parameters in enumerate(parameters):
+        definition = template.render(pipeline_parameters)
+        pipeline_descriptions.append({
+            'pipeline_id': 'df-simulated-{}'.format(index),
+            'backed_up_tables': list_tables_in_definition(definition),
+            'definition': definition
+        })
+
+    booster = _create_booster(table_descriptions, limits, duration_model)
+    results = booster.boost_throughput(pipeline_descriptions, MAX_DURATION_SINGLE_PIPELINE, plan)
+    planning_seconds = time.time() - started
+    metrics = _execute(pipeline_descriptions, parameters, table_descriptions, original_read_capacity_units,
+                       actual_durations, recovery_window, planning_seconds)
+    metrics['failed_boosts'] = len([x for x in results if x['status'] == FAILED])
+    metrics['infeasible_plan'] = infeasible_plan
+
+    return metrics
+
+
+def _create_booster(table_descriptions, limits, duration_model):
+    booster = DynamoDbBooster(table_descriptions, 'simulated-backups', INITIAL_READ_THROUGHPUT_PERCENT,
+                              duration_model=duration_model)
+    booster.capacity_executor = _FakeCapacityExecutor(limits['AccountMaxReadCapacityUnits'],
+                                                      get_provisioned_read_capacity_units(table_descriptions))
+    booster.config_util = _FakeConfigUtil()
+    booster.application_auto_scaling_util = _FakeApplicationAutoScalingUtil()
+    booster.dynamo_db_util = _FakeDynamoDBUtil(limits)
+
+    return booster
+
+
+def _execute(pipeline_descriptions, parameters, table_descriptions, original_read_capacity_units,
+             actual_durations, recovery_window, planning_seconds):
+    """
+    Tables of a pipeline are exported one after another, after the cluster bootstraps. Boosted tables
+    stay boosted until their pipeline finishes.
+    """
+    descriptions_by_name = dict((x['Table']['TableName'], x['Table']) for x in table_descriptions)
+    metrics = {
+        'pipelines': len(pipeline_descriptions),
+        'tables': 0,
+        'makespan': 0,
+        'read_capacity_unit_hours': 0,
+        'cluster_hours': 0,
+        'idle_cluster_seconds': 0,
+        'tables_over_recovery_point': 0,
+        'cost': 0.0,
+        'planning_seconds': round(planning_seconds, 3)
+    }
+
+    for description, pipeline_parameters in zip(pipeline_descriptions, parameters):
+        elapsed = EMR_BOOTSTRAP_TIME
+        boost = 0
+
+        for node in description['definition']['objects']:
+            if 'tableName' not in node:
+                continue
+
+            table = descriptions_by_name[node['tableName']]
+            read_capacity_units = table['ProvisionedThroughput']['ReadCapacityUnits']
+            elapsed += ACTIVITY_BOOTSTRAP_TIME + actual_durations.estimate(
+                table['TableName'], table['TableSizeBytes'], read_capacity_units,
+                float(node['readThroughputPercent']))
+            boost += read_capacity_units - original_read_capacity_units[table['TableName']]
+            metrics['tables'] += 1
+
+            if elapsed > recovery_window:
+                metrics['tables_over_recovery_point'] += 1
+
+        hours = int(math.ceil(elapsed / 3600.0))
+        cluster = {
+            'masterInstanceType': pipeline_parameters['masterInstanceType'],
+            'coreInstanceType': pipeline_parameters['coreInstanceType'],
+            'coreInstanceCount': pipeline_parameters['coreInstanceCount']
+        }
+        metrics['makespan'] = max(metrics['makespan'], int(round(elapsed)))
+        metrics['read_capacity_unit_hours'] += boost * hours
+        metrics['cluster_hours'] += hours
+        metrics['idle_cluster_seconds'] += int(round(hours * 3600 - elapsed))
+        metrics['cost'] += boost * hours * READ_CAPACITY_UNIT_HOURLY_PRICE + get_hourly_price(cluster) * hours
+
+    metrics['cost'] = round(metrics['cost'], 2)
+
+    return metrics
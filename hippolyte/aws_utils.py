@@ -1,28 +1,141 @@
 from datetime import datetime
-import time
+import gzip
+import io
 import json
+import math
+import threading
+import time
 from uuid import uuid4
+from concurrent.futures import ThreadPoolExecutor
 import boto3
 from botocore.exceptions import ClientError
-from retrying import retry
 import hippolyte.pipeline_translator as pipeline_translator
-from hippolyte.utils import chunks
+from hippolyte.client_config import RetryPolicy, build_client_settings, create_botocore_config
+from hippolyte.instrumentation import instrument_client
+from hippolyte.rate_limiter import get_rate_limiter
+from hippolyte.utils import TABLE_ACTIVE_POLL_DELAY, TABLE_ACTIVE_MAX_POLLS, chunks
+
+MAX_RESOURCE_IDS_PER_REQUEST = 50
+MAX_PIPELINE_IDS_PER_REQUEST = 25
+MISSING_PIPELINE_ERROR_CODES = ('PipelineNotFoundException', 'PipelineDeletedException')
+GZIP_MAGIC = b'\x1f\x8b'
+MAX_METRIC_DATAPOINTS = 1440
+
+_session = None
+_clients = {}
+_client_settings = build_client_settings()
+_clients_lock = threading.Lock()
+
+
+def create_client(service_name, session=None, settings=None):
+    """
+    :param settings: as returned from client_config.build_client_settings(), defaults to the ones set with
+        configure_clients()
+    :return: boto3 client with timeouts, connection pool and retry policy from settings, paced by the rate limiter
+    shared by all clients of service_name, with its calls recorded by instrumentation
+    """
+    settings = settings or _client_settings
+    client = (session or boto3).client(service_name, config=create_botocore_config(settings))
+    RetryPolicy.from_settings(settings).attach(client)
+
+    return instrument_client(get_rate_limiter(service_name).attach(client))
+
+
+def configure_clients(settings):
+    """
+    Sets settings of clients created from now on. Shared clients created with different settings are dropped.
+    :param settings: as returned from client_config.build_client_settings()
+    """
+    global _client_settings
+
+    if settings != _client_settings:
+        reset_clients()
+        _client_settings = settings
+
+
+def get_client(service_name):
+    """
+    Clients are created on first use from a single shared session and then reused by every util, thread and,
+    as long as Lambda keeps the process warm, every invocation. Boto3 clients are thread safe, but creating
+    them is not, so they are created under a lock.
+    :return: client of service_name, as returned from create_client()
+    """
+    global _session
+
+    with _clients_lock:
+        if service_name not in _clients:
+            if _session is None:
+                _session = boto3.session.Session()
+
+            _clients[service_name] = create_client(service_name, _session, _client_settings)
+
+        return _clients[service_name]
+
+
+def reset_clients():
+    """
+    Drops shared session and clients, so that next get_client() creates them again.
+    """
+    global _session
+
+    with _clients_lock:
+        _session = None
+        _clients.clear()
+
+
+class ServiceUtil(object):
+    """
+    Base of utils calling a single AWS service. Client is only looked up on first use, so creating utils is cheap
+    and utils, which end up not being used, never create a client.
+    """
+    service_name = None
+    _client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = self._init_client()
+
+        return self._client
+
+    @client.setter
+    def client(self, client):
+        self._client = client
+
+    @property
+    def rate_limiter(self):
+        return get_rate_limiter(self.service_name)
+
+    def _init_client(self):
+        return get_client(self.service_name)
+
+
+def iterate_pages(client, operation_name, **kwargs):
+    """
+    Yields response pages of a paginated operation, fetching the next page only when it is needed.
+    """
+    paginator = client.get_paginator(operation_name)
+
+    for page in paginator.paginate(**kwargs):
+        yield page
 
 
-def retry_if_throttling_error(exception):
-    if isinstance(exception, ClientError):
-        return 'Throttling' in exception.message or 'limit exceeded' in exception.message
+def iterate_items(client, operation_name, result_key, **kwargs):
+    """
+    Yields items under result_key, from all pages of a paginated operation.
+    Stopping the iteration early stops fetching further pages.
+    """
+    for page in iterate_pages(client, operation_name, **kwargs):
+        for item in page.get(result_key, []):
+            yield item
 
-    return False
 
+class DataPipelineUtil(ServiceUtil):
+    service_name = 'datapipeline'
 
-class DataPipelineUtil(object):
     def __init__(self):
-        self.client = boto3.client('datapipeline')
+        self._translations = {}
 
-    @retry(retry_on_exception=retry_if_throttling_error,
-           wait_exponential_multiplier=1000,
-           stop_max_attempt_number=5)
     def create_pipeline(self, name=None):
         if not name:
             name = "dynamodb-backup-" + datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
@@ -39,106 +152,169 @@ class DataPipelineUtil(object):
             ]
         )
 
-    @retry(retry_on_exception=retry_if_throttling_error,
-           wait_exponential_multiplier=1000,
-           stop_max_attempt_number=5)
     def put_pipeline_definition(self, pipeline_id, definition):
+        translation = self.translate_definition(pipeline_id, definition)
+
         return self.client.put_pipeline_definition(
             pipelineId=pipeline_id,
-            pipelineObjects=pipeline_translator.definition_to_api_objects(definition),
-            parameterObjects=pipeline_translator.definition_to_api_parameters(definition),
-            parameterValues=pipeline_translator.definition_to_parameter_values(definition)
+            pipelineObjects=translation['objects'],
+            parameterObjects=translation['parameters'],
+            parameterValues=translation['values']
         )
 
-    @retry(retry_on_exception=retry_if_throttling_error,
-           wait_exponential_multiplier=1000,
-           stop_max_attempt_number=5)
     def activate_pipeline(self, pipeline_id, definition):
-        return self.client.activate_pipeline(
+        response = self.client.activate_pipeline(
             pipelineId=pipeline_id,
-            parameterValues=pipeline_translator.definition_to_parameter_values(definition)
+            parameterValues=self.translate_definition(pipeline_id, definition)['values']
         )
+        self._translations.pop(pipeline_id, None)
+
+        return response
+
+    def translate_definition(self, pipeline_id, definition):
+        """
+        Converts definition to API structures once per pipeline, so that put_pipeline_definition and
+        activate_pipeline called with the same definition object share the conversion.
+        :return: as returned from pipeline_translator.translate_definition()
+        """
+        cached = self._translations.get(pipeline_id)
+
+        if cached is None or cached[0] is not definition:
+            cached = (definition, pipeline_translator.translate_definition(definition))
+            self._translations[pipeline_id] = cached
+
+        return cached[1]
 
-    @retry(retry_on_exception=retry_if_throttling_error,
-           wait_exponential_multiplier=1000,
-           stop_max_attempt_number=5)
     def list_pipelines(self):
-        pipelines = []
-        paginator = self.client.get_paginator('list_pipelines')
-        page_iterator = paginator.paginate(PaginationConfig={
-            'MaxItems': 1000
-        })
-
-        for page in page_iterator:
-            pipelines += page.get("pipelineIdList", [])
-
-        return pipelines
-
-    @retry(retry_on_exception=retry_if_throttling_error,
-           wait_exponential_multiplier=1000,
-           stop_max_attempt_number=5)
-    def describe_pipelines(self):
-        pipeline_list = self.list_pipelines()
-        pipeline_ids = map(lambda x: x['id'], pipeline_list)
-        pipeline_ids_chunked = list(chunks(pipeline_ids, 25))
-        pipeline_descriptions = []
-
-        for pipeline_id in pipeline_ids_chunked:
-            descriptions = self.client.describe_pipelines(pipelineIds=pipeline_id)
-            pipeline_descriptions += descriptions['pipelineDescriptionList']
-
-        return pipeline_descriptions
-
-    @retry(retry_on_exception=retry_if_throttling_error,
-           wait_exponential_multiplier=1000,
-           stop_max_attempt_number=5)
+        return list(self.iter_pipelines(max_items=1000))
+
+    def iter_pipelines(self, max_items=None):
+        """
+        :param max_items: stop after that many pipelines, all pipelines are listed if not given
+        :return: generator of {'id', 'name'} elements, fetched page by page
+        """
+        pagination_config = {'MaxItems': max_items} if max_items else {}
+
+        return iterate_items(self.client, 'list_pipelines', 'pipelineIdList', PaginationConfig=pagination_config)
+
+    def describe_pipelines(self, pipeline_ids=None, workers=1):
+        """
+        :param pipeline_ids: if given, only those pipelines are described, skipping ones which don't exist anymore,
+            otherwise all pipelines of the account are
+        :param workers: how many chunks of MAX_PIPELINE_IDS_PER_REQUEST pipelines to describe concurrently
+        :return: pipeline descriptions, in the same order as pipeline_ids
+        """
+        existing_pipeline_ids = map(lambda x: x['id'], self.iter_pipelines())
+
+        if pipeline_ids is None:
+            pipeline_ids = existing_pipeline_ids
+        else:
+            # most recorded pipelines are deleted once finished, and each of those would fail a whole request
+            existing_pipeline_ids = set(existing_pipeline_ids)
+            pipeline_ids = filter(lambda x: x in existing_pipeline_ids, pipeline_ids)
+
+        pipeline_ids_chunked = list(chunks(list(pipeline_ids), MAX_PIPELINE_IDS_PER_REQUEST))
+
+        if workers <= 1:
+            described_chunks = map(self._describe_existing_pipelines, pipeline_ids_chunked)
+        else:
+            executor = ThreadPoolExecutor(max_workers=workers)
+
+            try:
+                described_chunks = list(executor.map(self._describe_existing_pipelines, pipeline_ids_chunked))
+            finally:
+                executor.shutdown()
+
+        return [description for chunk in described_chunks for description in chunk]
+
+    def _describe_existing_pipelines(self, pipeline_ids):
+        """
+        A single deleted pipeline fails the whole request, so chunk is split in halves until it's found. Only
+        pipelines deleted after they were listed get here.
+        """
+        try:
+            return self.client.describe_pipelines(pipelineIds=pipeline_ids)['pipelineDescriptionList']
+        except ClientError as e:
+            if e.response['Error']['Code'] not in MISSING_PIPELINE_ERROR_CODES:
+                raise
+
+        if len(pipeline_ids) == 1:
+            return []
+
+        middle = len(pipeline_ids) // 2
+
+        return self._describe_existing_pipelines(pipeline_ids[:middle]) + \
+            self._describe_existing_pipelines(pipeline_ids[middle:])
+
     def delete_pipeline(self, pipeline_id):
         self.client.delete_pipeline(pipelineId=pipeline_id)
 
 
-class DynamoDBUtil(object):
-    def __init__(self):
-        self.client = boto3.client('dynamodb')
+class DynamoDBUtil(ServiceUtil):
+    service_name = 'dynamodb'
 
-    @retry(retry_on_exception=retry_if_throttling_error,
-           wait_exponential_multiplier=1000,
-           stop_max_attempt_number=5)
     def list_tables(self):
-        tables = []
-        paginator = self.client.get_paginator('list_tables')
-        page_iterator = paginator.paginate(PaginationConfig={
-            'MaxItems': 10000,
-            'PageSize': 100
-        })
+        return list(self.iter_tables(max_items=10000))
+
+    def iter_tables(self, max_items=None):
+        """
+        :param max_items: stop after that many tables, all tables are listed if not given
+        :return: generator of table names, fetched page by page
+        """
+        pagination_config = {'PageSize': 100}
 
-        for page in page_iterator:
-            tables += page.get("TableNames", [])
+        if max_items:
+            pagination_config['MaxItems'] = max_items
 
-        return tables
+        return iterate_items(self.client, 'list_tables', 'TableNames', PaginationConfig=pagination_config)
 
-    @retry(retry_on_exception=retry_if_throttling_error,
-           wait_exponential_multiplier=1000,
-           stop_max_attempt_number=5)
     def describe_table(self, table_name):
         return self.client.describe_table(TableName=table_name)
 
-    def describe_tables(self, table_names):
-        table_descriptions = []
+    def describe_tables(self, table_names, workers=1):
+        """
+        :param table_names: names of tables to describe
+        :param workers: how many tables to describe concurrently, 1 describes them one after another
+        :return: table descriptions, in the same order as table_names
+        """
+        if workers <= 1:
+            table_descriptions = []
+
+            for table_name in table_names:
+                table_descriptions.append(self.describe_table(table_name))
+
+            return table_descriptions
+
+        def describe(table_name):
+            return self.rate_limiter.call(self.client.describe_table, TableName=table_name)
+
+        executor = ThreadPoolExecutor(max_workers=workers)
+
+        try:
+            return list(executor.map(describe, table_names))
+        finally:
+            executor.shutdown()
+
+    def iter_scan_pages(self, table_name, segment=0, total_segments=1):
+        """
+        Eventually consistent scan of a single segment of the table, with consumed capacity of each page.
+        :return: generator of scan responses, fetched page by page
+        """
+        arguments = {'TableName': table_name, 'Segment': segment, 'TotalSegments': total_segments,
+                     'ReturnConsumedCapacity': 'TOTAL'}
 
-        for table_name in table_names:
-            table_descriptions.append(self.describe_table(table_name))
+        while True:
+            page = self.client.scan(**arguments)
+            yield page
 
-        return table_descriptions
+            if 'LastEvaluatedKey' not in page:
+                return
+
+            arguments['ExclusiveStartKey'] = page['LastEvaluatedKey']
 
-    @retry(retry_on_exception=retry_if_throttling_error,
-           wait_exponential_multiplier=1000,
-           stop_max_attempt_number=5)
     def describe_limits(self):
         return self.client.describe_limits()
 
-    @retry(retry_on_exception=retry_if_throttling_error,
-           wait_exponential_multiplier=1000,
-           stop_max_attempt_number=5)
     def batch_write_items(self, table_name, items):
         table = self.client.Table(TableName=table_name)
 
@@ -146,17 +322,11 @@ class DynamoDBUtil(object):
             for item in items:
                 batch.put_item(Item=item)
 
-    @retry(retry_on_exception=retry_if_throttling_error,
-           wait_exponential_multiplier=1000,
-           stop_max_attempt_number=5)
     def update_item(self, table_name, key, update_expression, expression_attribute_values):
         table = self.client.Table(TableName=table_name)
         table.update_item(Key=key, UpdateExpression=update_expression,
                           ExpressionAttributeValues=expression_attribute_values)
 
-    @retry(retry_on_exception=retry_if_throttling_error,
-           wait_exponential_multiplier=1000,
-           stop_max_attempt_number=5)
     def change_capacity_units(self, table_name, new_read_throughput=None, new_write_throughput=None):
         table_description = self.describe_table(table_name).get('Table', {})
 
@@ -166,6 +336,33 @@ class DynamoDBUtil(object):
         if requires_update:
             self.client.update_table(TableName=table_name, ProvisionedThroughput=throughput)
 
+    def update_read_capacity(self, table_description, new_read_throughput):
+        """
+        Same as change_capacity_units, but current throughput is taken from table_description,
+        instead of describing the table again.
+        :param table_description: describe_table output
+        :return: True, if table was updated
+        """
+        table = table_description.get('Table', {})
+        throughput, requires_update = self._get_adjusted_throughput(table, new_read_throughput, None)
+
+        if requires_update:
+            self.client.update_table(TableName=table['TableName'], ProvisionedThroughput=throughput)
+
+        return requires_update
+
+    def wait_until_active(self, table_name, delay=TABLE_ACTIVE_POLL_DELAY, max_polls=TABLE_ACTIVE_MAX_POLLS):
+        """
+        :return: True, if table became ACTIVE before max_polls ran out
+        """
+        for _ in range(max_polls):
+            if self.describe_table(table_name).get('Table', {}).get('TableStatus') == 'ACTIVE':
+                return True
+
+            time.sleep(delay)
+
+        return False
+
     def _get_adjusted_throughput(self, table_description, new_read_throughput, new_write_throughput):
         current_throughput = table_description.get('ProvisionedThroughput')
         current_read_throughput = current_throughput.get('ReadCapacityUnits')
@@ -189,44 +386,80 @@ class DynamoDBUtil(object):
         return throughput, requires_update
 
 
-class S3Util(object):
-    def __init__(self):
-        self.client = boto3.client('s3')
+class S3Util(ServiceUtil):
+    service_name = 's3'
 
-    @retry(retry_on_exception=retry_if_throttling_error,
-           wait_exponential_multiplier=1000,
-           stop_max_attempt_number=5)
-    def put_json(self, bucket, key, json_file):
-        body = json.dumps(json_file, default=lambda o: str(o), sort_keys=True, indent=4)
-        self.client.put_object(Bucket=bucket, Key=key, Body=body)
+    def put_json(self, bucket, key, json_file, compress=False):
+        """
+        :param compress: if set, json is written without whitespace and gzip compressed
+        """
+        if not compress:
+            body = json.dumps(json_file, default=lambda o: str(o), sort_keys=True, indent=4)
+            self.client.put_object(Bucket=bucket, Key=key, Body=body)
+            return
+
+        body = io.BytesIO()
+        with gzip.GzipFile(fileobj=body, mode='wb') as gzip_file:
+            gzip_file.write(json.dumps(json_file, default=lambda o: str(o), sort_keys=True, separators=(',', ':')))
+
+        self.client.put_object(Bucket=bucket, Key=key, Body=body.getvalue(), ContentType='application/json',
+                               ContentEncoding='gzip')
 
-    @retry(retry_on_exception=retry_if_throttling_error,
-           wait_exponential_multiplier=1000,
-           stop_max_attempt_number=5)
     def get_json(self, bucket, key):
+        """
+        :return: parsed json object, decompressed first if it was written with compress set
+        """
         obj = self.client.get_object(Bucket=bucket, Key=key)
-        return json.loads(obj.get('Body').read().decode('utf-8'))
+        body = obj.get('Body').read()
 
-    @retry(retry_on_exception=retry_if_throttling_error,
-           wait_exponential_multiplier=1000,
-           stop_max_attempt_number=5)
-    def list_objects(self, bucket, prefix):
-        paginator = self.client.get_paginator('list_objects')
-        contents = []
-        response = None
+        if body[:2] == GZIP_MAGIC:
+            body = gzip.GzipFile(fileobj=io.BytesIO(body)).read()
 
-        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
-            response = page
-            contents += page.get('Contents', [])
+        return json.loads(body.decode('utf-8'))
 
-        if response:
-            response['Contents'] = contents
+    def put_object(self, bucket, key, body):
+        self.client.put_object(Bucket=bucket, Key=key, Body=body)
 
-        return response
+    def delete_object(self, bucket, key):
+        self.client.delete_object(Bucket=bucket, Key=key)
+
+    def list_objects(self, bucket, prefix):
+        return {'Contents': list(self.iter_objects(bucket, prefix))}
+
+    def iter_objects(self, bucket, prefix, delimiter=None):
+        """
+        :param delimiter: if given, objects below the next delimiter are not listed, see iter_common_prefixes
+        :return: generator of objects under prefix, as in list_objects Contents, fetched page by page
+        """
+        return iterate_items(self.client, 'list_objects', 'Contents', **self._list_arguments(bucket, prefix, delimiter))
+
+    def iter_common_prefixes(self, bucket, prefix, delimiter='/'):
+        """
+        :return: generator of distinct key prefixes under prefix, up to the next delimiter
+        """
+        for common_prefix in iterate_items(self.client, 'list_objects', 'CommonPrefixes',
+                                           **self._list_arguments(bucket, prefix, delimiter)):
+            yield common_prefix['Prefix']
+
+    def _list_arguments(self, bucket, prefix, delimiter):
+        arguments = {'Bucket': bucket, 'Prefix': prefix}
+
+        if delimiter:
+            arguments['Delimiter'] = delimiter
+
+        return arguments
+
+    def find_object_with_suffix(self, bucket, prefix, suffix):
+        """
+        Lists objects under prefix, page by page, until the first key ending with suffix is found.
+        :return: object, as returned in list_objects Contents or None if there is no such key
+        """
+        for content in self.iter_objects(bucket, prefix):
+            if content['Key'].endswith(suffix):
+                return content
+
+        return None
 
-    @retry(retry_on_exception=retry_if_throttling_error,
-           wait_exponential_multiplier=1000,
-           stop_max_attempt_number=5)
     def object_exists(self, bucket, key):
         try:
             self.client.get_object(Bucket=bucket, Key=key)
@@ -237,68 +470,61 @@ class S3Util(object):
         return True
 
 
-class ApplicationAutoScalingUtil(object):
-    def __init__(self):
-        self.client = self._init_client()
+class ApplicationAutoScalingUtil(ServiceUtil):
+    service_name = 'application-autoscaling'
 
-    def _init_client(self):
-        return boto3.client('application-autoscaling')
+    def describe_scalable_targets(self, service_namespace, resource_ids=None):
+        return {'ScalableTargets': list(self.iter_scalable_targets(service_namespace, resource_ids))}
 
-    @retry(retry_on_exception=retry_if_throttling_error,
-           wait_exponential_multiplier=1000,
-           stop_max_attempt_number=5)
-    def describe_scalable_targets(self, service_namespace):
-        paginator = self.client.get_paginator('describe_scalable_targets')
-        targets = []
-        response = None
+    def iter_scalable_targets(self, service_namespace, resource_ids=None):
+        """
+        :param resource_ids: if given, only targets of those resources are described, in chunks of
+            MAX_RESOURCE_IDS_PER_REQUEST, otherwise the whole namespace is
+        :return: generator of scalable targets, fetched page by page
+        """
+        if resource_ids is None:
+            return iterate_items(self.client, 'describe_scalable_targets', 'ScalableTargets',
+                                 ServiceNamespace=service_namespace)
 
-        for page in paginator.paginate(ServiceNamespace=service_namespace):
-            response = page
-            targets += page.get('ScalableTargets', [])
-            time.sleep(3)
+        return self._iter_scalable_targets_of(service_namespace, resource_ids)
 
-        if response:
-            response['ScalableTargets'] = targets
+    def _iter_scalable_targets_of(self, service_namespace, resource_ids):
+        for resource_ids_chunk in chunks(list(resource_ids), MAX_RESOURCE_IDS_PER_REQUEST):
+            for target in iterate_items(self.client, 'describe_scalable_targets', 'ScalableTargets',
+                                        ServiceNamespace=service_namespace, ResourceIds=resource_ids_chunk):
+                yield target
 
-        return response
+    def describe_scaling_policies(self, service_namespace, resource_id=None, scalable_dimension=None):
+        return {'ScalingPolicies': list(self.iter_scaling_policies(service_namespace, resource_id,
+                                                                   scalable_dimension))}
 
-    @retry(retry_on_exception=retry_if_throttling_error,
-           wait_exponential_multiplier=1000,
-           stop_max_attempt_number=5)
-    def describe_scaling_policies(self, service_namespace):
-        paginator = self.client.get_paginator('describe_scaling_policies')
-        policies = []
-        response = None
+    def iter_scaling_policies(self, service_namespace, resource_id=None, scalable_dimension=None):
+        """
+        :param resource_id: if given, only policies of that resource are described
+        :param scalable_dimension: if given, only policies of that dimension are described, requires resource_id
+        :return: generator of scaling policies, fetched page by page
+        """
+        arguments = {'ServiceNamespace': service_namespace}
 
-        for page in paginator.paginate(ServiceNamespace=service_namespace):
-            response = page
-            policies += page.get('ScalingPolicies', [])
+        if resource_id:
+            arguments['ResourceId'] = resource_id
 
-        if response:
-            response['ScalingPolicies'] = policies
+            if scalable_dimension:
+                arguments['ScalableDimension'] = scalable_dimension
 
-        return response
+        return iterate_items(self.client, 'describe_scaling_policies', 'ScalingPolicies', **arguments)
 
-    @retry(retry_on_exception=retry_if_throttling_error,
-           wait_exponential_multiplier=1000,
-           stop_max_attempt_number=5)
     def delete_scaling_policy(self, policy_name, service_namespace, resource_id, scalable_dimension):
         self.client.delete_scaling_policy(PolicyName=policy_name,
                                           ServiceNamespace=service_namespace,
                                           ResourceId=resource_id,
                                           ScalableDimension=scalable_dimension)
 
-    @retry(retry_on_exception=retry_if_throttling_error,
-           wait_exponential_multiplier=1000,
-           stop_max_attempt_number=5)
     def deregister_scalable_target(self, service_namespace, resource_id, scalable_dimension):
         self.client.deregister_scalable_target(ServiceNamespace=service_namespace,
                                                ResourceId=resource_id,
                                                ScalableDimension=scalable_dimension)
 
-    @retry(retry_on_exception=retry_if_throttling_error,
-           wait_exponential_multiplier=1000,
-           stop_max_attempt_number=5)
     def put_scaling_policy(self, policy_name, service_namespace, resource_id, scalable_dimension, policy_type,
                            target_scaling_policy_configuration):
         self.client.put_scaling_policy(PolicyName=policy_name,
@@ -308,9 +534,6 @@ class ApplicationAutoScalingUtil(object):
                                        PolicyType=policy_type,
                                        TargetTrackingScalingPolicyConfiguration=target_scaling_policy_configuration)
 
-    @retry(retry_on_exception=retry_if_throttling_error,
-           wait_exponential_multiplier=1000,
-           stop_max_attempt_number=5)
     def register_scalable_target(self, service_namespace, resource_id, scalable_dimension,
                                  min_capacity, max_capacity, role_arn):
         self.client.register_scalable_target(ServiceNamespace=service_namespace,
@@ -321,16 +544,48 @@ class ApplicationAutoScalingUtil(object):
                                              RoleARN=role_arn)
 
 
-class SnsUtil(object):
-    def __init__(self):
-        self.client = boto3.client('sns')
+class SnsUtil(ServiceUtil):
+    service_name = 'sns'
 
-    @retry(retry_on_exception=retry_if_throttling_error,
-           wait_exponential_multiplier=1000,
-           stop_max_attempt_number=5)
     def publish(self, sns_topic, subject, message):
         self.client.publish(
             TopicArn=sns_topic,
             Message=message,
             Subject=subject
         )
+
+
+class CloudWatchUtil(ServiceUtil):
+    service_name = 'cloudwatch'
+
+    def get_metric_sum(self, namespace, metric_name, dimensions, start_time, end_time):
+        """
+        :param dimensions: {dimension_name: value}
+        :param start_time: datetime
+        :param end_time: datetime
+        :return: sum of the metric in between start_time and end_time, 0 if there were no datapoints
+        """
+        return sum(x['Sum'] for x in self._get_datapoints(namespace, metric_name, dimensions, start_time, end_time,
+                                                          'Sum'))
+
+    def get_metric_maximum(self, namespace, metric_name, dimensions, start_time, end_time):
+        """
+        :return: highest value of the metric in between start_time and end_time, None if there were no datapoints
+        """
+        datapoints = self._get_datapoints(namespace, metric_name, dimensions, start_time, end_time, 'Maximum')
+
+        return max(x['Maximum'] for x in datapoints) if datapoints else None
+
+    def _get_datapoints(self, namespace, metric_name, dimensions, start_time, end_time, statistic):
+        period = int(math.ceil((end_time - start_time).total_seconds() / MAX_METRIC_DATAPOINTS / 60.0)) * 60
+        response = self.client.get_metric_statistics(
+            Namespace=namespace,
+            MetricName=metric_name,
+            Dimensions=[{'Name': name, 'Value': value} for name, value in sorted(dimensions.items())],
+            StartTime=start_time,
+            EndTime=end_time,
+            Period=max(period, 60),
+            Statistics=[statistic]
+        )
+
+        return response.get('Datapoints', [])
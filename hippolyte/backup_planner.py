@@ -0,0 +1,322 @@
+from __future__ import print_function
+import heapq
+import logging
+import math
+from datetime import datetime, timedelta
+
+from hippolyte.aws_utils import CloudWatchUtil
+from hippolyte.cluster_sizing import choose_cluster, get_hourly_price
+from hippolyte.duration_model import DurationModel
+from hippolyte.utils import ACTIVITY_BOOTSTRAP_TIME, EMR_BOOTSTRAP_TIME, INITIAL_READ_THROUGHPUT_PERCENT, \
+    MAX_ALLOWED_PROVISIONED_READ_THROUGHPUT, MAX_TABLES_PER_PIPELINE, READ_CAPACITY_UNIT_HOURLY_PRICE
+
+PIPELINE_COUNT_GROWTH = 1.25
+# AccountProvisionedReadCapacityUtilization is published every 5 minutes
+ACCOUNT_UTILIZATION_LOOKBACK = 3600
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+class BackupPlanner(object):
+    def __init__(self, table_descriptions, recovery_window, limits, duration_model=None,
+                 read_throughput_percent=INITIAL_READ_THROUGHPUT_PERCENT, account_read_capacity_units=None):
+        """
+        Decides together how to assign tables to pipelines and how much read capacity to add to each table,
+        so that every pipeline finishes within recovery_window, at the lowest sum of read capacity unit hours
+        and EMR cluster hours.
+        :param table_descriptions: descriptions, as returned from DynamoDBUtil.describe_tables()
+        :param recovery_window: max duration of every pipeline, in seconds
+        :param limits: as returned from DynamoDBUtil.describe_limits()
+        :param duration_model: DurationModel learned from past backups
+        :param read_throughput_percent: part of provisioned read capacity used by backup of tables, which are not boosted
+        :param account_read_capacity_units: read capacity provisioned in the whole account, as returned from
+        get_account_read_capacity_units(), defaults to read capacity of table_descriptions and their indexes
+        """
+        if account_read_capacity_units is None:
+            account_read_capacity_units = get_provisioned_read_capacity_units(table_descriptions)
+
+        self.recovery_window = recovery_window
+        self.read_throughput_percent = read_throughput_percent
+        self.read_limit = min(MAX_ALLOWED_PROVISIONED_READ_THROUGHPUT, limits['TableMaxReadCapacityUnits'])
+        # boosts can only use read capacity, which isn't provisioned anywhere in the account yet
+        self.account_headroom = max(limits['AccountMaxReadCapacityUnits'] - account_read_capacity_units, 0)
+        self.tables = []
+        duration_model = duration_model or DurationModel()
+
+        for description in table_descriptions:
+            table = description['Table']
+            table_size = table.get('TableSizeBytes', 0)
+
+            if not table_size:
+                continue
+
+            read_capacity_units = table['ProvisionedThroughput']['ReadCapacityUnits']
+            self.tables.append({
+                'name': table['TableName'],
+                'size': table_size,
+                'read_capacity_units': read_capacity_units,
+                # duration of backup, when reading at 1 read capacity unit per second
+                'work': duration_model.estimate(table['TableName'], table_size, 1, 1.0),
+                'free_rate': read_capacity_units * read_throughput_percent,
+                'max_rate': max(self.read_limit - read_capacity_units, 0)
+            })
+
+        self.tables.sort(key=lambda x: (-x['work'] / x['free_rate'], x['name']))
+
+    def plan(self):
+        """
+        Tries pipeline counts from the fewest allowed by MAX_TABLES_PER_PIPELINE up to the count, which needs
+        no read capacity increase, keeping the cheapest plan meeting recovery window and account read limit.
+        If none does, the plan with the shortest longest pipeline is returned, preferring plans within account
+        read limit. Such plan isn't Feasible and shouldn't be deployed.
+        :return: {'Pipelines': [[table_name]], 'Tables': {table_name: {'ReadCapacityUnits', 'ReadThroughputPercent',
+            'EstimatedDuration', 'Capped'}}, 'PipelineDurations': [seconds], 'Cost': {'ReadCapacityUnitHours',
+            'ClusterHours', 'Total'}, 'ReadCapacityIncrease': read capacity units added to all tables,
+            'WithinAccountLimit': bool, 'Feasible': bool}
+        """
+        if not self.tables:
+            return self._empty_plan()
+
+        min_count = int(math.ceil(len(self.tables) / float(MAX_TABLES_PER_PIPELINE)))
+        max_count = max(min_count, self._count_without_boost())
+        evaluated = {}
+
+        def evaluate(count):
+            if count not in evaluated:
+                evaluated[count] = self._plan_for_pipeline_count(count)
+
+            return evaluated[count]
+
+        count = min_count
+
+        while count < max_count:
+            evaluate(count)
+            count = max(count + 1, int(count * PIPELINE_COUNT_GROWTH))
+
+        evaluate(max_count)
+        best_count = min(evaluated, key=lambda x: _rank(evaluated[x]))
+
+        for count in range(max(best_count - 8, min_count), min(best_count + 8, max_count) + 1):
+            evaluate(count)
+
+        best = evaluated[min(evaluated, key=lambda x: _rank(evaluated[x]))]
+
+        if not best['Feasible']:
+            logger.warn("Couldn't find plan meeting recovery window of {}s within read capacity limits."
+                        .format(self.recovery_window))
+
+        return best
+
+    def _count_without_boost(self):
+        """
+        :return: number of pipelines needed, if tables are backed up at their current read capacity
+        """
+        budget = self.recovery_window - EMR_BOOTSTRAP_TIME
+        count = 0
+        load = budget
+        tables = 0
+
+        for table in self.tables:
+            duration = table['work'] / table['free_rate'] + ACTIVITY_BOOTSTRAP_TIME
+
+            if load + duration > budget or tables >= MAX_TABLES_PER_PIPELINE:
+                count += 1
+                load = 0
+                tables = 0
+
+            load += duration
+            tables += 1
+
+        return count
+
+    def _plan_for_pipeline_count(self, count):
+        pipelines = self._assign_tables(count)
+        plan = self._empty_plan()
+        total_boost = 0
+
+        for pipeline in pipelines:
+            rates = self._boost_rates(pipeline)
+            duration = EMR_BOOTSTRAP_TIME
+            boost = 0
+
+            for table in pipeline:
+                rate = rates[table['name']]
+                table_duration = table['work'] / rate + ACTIVITY_BOOTSTRAP_TIME
+                duration += table_duration
+
+                if rate > table['free_rate']:
+                    new_read_capacity_units = table['read_capacity_units'] + int(math.ceil(rate))
+                    boost += new_read_capacity_units - table['read_capacity_units']
+                    plan['Tables'][table['name']] = {
+                        'ReadCapacityUnits': new_read_capacity_units,
+                        # rounded up, so that backup doesn't read slower than estimated
+                        'ReadThroughputPercent': math.ceil(100 * (1 - float(table['read_capacity_units']) /
+                                                                  new_read_capacity_units)) / 100,
+                        'EstimatedDuration': round(table_duration),
+                        'Capped': rate >= table['max_rate']
+                    }
+                else:
+                    plan['Tables'][table['name']] = {
+                        'ReadCapacityUnits': table['read_capacity_units'],
+                        'ReadThroughputPercent': self.read_throughput_percent,
+                        'EstimatedDuration': round(table_duration),
+                        'Capped': False
+                    }
+
+            hours = math.ceil(duration / 3600.0)
+            cluster = choose_cluster(sum(x['size'] for x in pipeline),
+                                     max(rates[x['name']] for x in pipeline), self.recovery_window)
+
+            plan['Pipelines'].append([x['name'] for x in pipeline])
+            plan['PipelineDurations'].append(round(duration))
+            plan['Cost']['ReadCapacityUnitHours'] += boost * hours
+            plan['Cost']['ClusterHours'] += hours
+            plan['Cost']['Total'] += boost * hours * READ_CAPACITY_UNIT_HOURLY_PRICE + \
+                get_hourly_price(cluster) * hours
+            total_boost += boost
+
+        plan['Cost'] = dict((key, round(value, 2)) for key, value in plan['Cost'].items())
+        plan['ReadCapacityIncrease'] = total_boost
+        plan['WithinAccountLimit'] = total_boost <= self.account_headroom
+        plan['Feasible'] = max(plan['PipelineDurations']) <= self.recovery_window and plan['WithinAccountLimit']
+
+        return plan
+
+    def _assign_tables(self, count):
+        """
+        Longest table first, to the least loaded pipeline, which still has room for another table.
+        """
+        pipelines = [[] for _ in range(count)]
+        heap = [(0, index) for index in range(count)]
+
+        for table in self.tables:
+            load, index = heapq.heappop(heap)
+            pipelines[index].append(table)
+
+            if len(pipelines[index]) < MAX_TABLES_PER_PIPELINE:
+                heapq.heappush(heap, (load + table['work'] / table['free_rate'], index))
+
+        return [pipeline for pipeline in pipelines if pipeline]
+
+    def _boost_rates(self, pipeline):
+        """
+        Read rates, which fit pipeline into recovery window with the smallest total read capacity increase.
+        Minimising sum of rates, while sum of work / rate stays within time left, gives rates proportional to
+        square root of work. Tables, for which that is less than their current rate or more than their limit,
+        are fixed at those and the rest is computed again.
+        :return: {table_name: read capacity units per second used by backup}
+        """
+        time_left = self.recovery_window - EMR_BOOTSTRAP_TIME - ACTIVITY_BOOTSTRAP_TIME * len(pipeline)
+        rates = dict((x['name'], x['free_rate']) for x in pipeline)
+
+        if sum(x['work'] / x['free_rate'] for x in pipeline) <= time_left:
+            return rates
+
+        flexible = [x for x in pipeline if x['max_rate'] > x['free_rate']]
+        fixed_duration = sum(x['work'] / x['free_rate'] for x in pipeline if x not in flexible)
+
+        while flexible:
+            remaining = time_left - fixed_duration
+
+            if remaining <= 0:
+                for table in flexible:
+                    rates[table['name']] = table['max_rate']
+                break
+
+            total = sum(math.sqrt(x['work']) for x in flexible)
+            still_flexible = []
+
+            for table in flexible:
+                rate = math.sqrt(table['work']) * total / remaining
+
+                if rate <= table['free_rate']:
+                    fixed_duration += table['work'] / table['free_rate']
+                elif rate >= table['max_rate']:
+                    rates[table['name']] = table['max_rate']
+                    fixed_duration += table['work'] / table['max_rate']
+                else:
+                    rates[table['name']] = rate
+                    still_flexible.append(table)
+
+            if len(still_flexible) == len(flexible):
+                break
+
+            flexible = still_flexible
+
+        return rates
+
+    def _empty_plan(self):
+        return {
+            'Pipelines': [],
+            'Tables': {},
+            'PipelineDurations': [],
+            'Cost': {'ReadCapacityUnitHours': 0, 'ClusterHours': 0, 'Total': 0},
+            'ReadCapacityIncrease': 0,
+            'WithinAccountLimit': True,
+            'Feasible': True
+        }
+
+
+def _rank(plan):
+    if plan['Feasible']:
+        return 0, 0, plan['Cost']['Total'], 0
+
+    return 1, not plan['WithinAccountLimit'], max(plan['PipelineDurations']), plan['Cost']['Total']
+
+
+def get_provisioned_read_capacity_units(table_descriptions):
+    """
+    :return: read capacity units provisioned for tables and their global secondary indexes
+    """
+    total = 0
+
+    for description in table_descriptions:
+        table = description['Table']
+        total += table['ProvisionedThroughput']['ReadCapacityUnits']
+        total += sum(x.get('ProvisionedThroughput', {}).get('ReadCapacityUnits', 0)
+                     for x in table.get('GlobalSecondaryIndexes', []))
+
+    return total
+
+
+def get_account_read_capacity_units(table_descriptions, limits, cloud_watch_util=None):
+    """
+    Account read limit applies to all tables and indexes in the account, including the ones not backed up,
+    so read capacity provisioned in the account is taken from AccountProvisionedReadCapacityUtilization metric.
+    :param table_descriptions: descriptions of described tables, used if the metric is missing or behind
+    :param limits: as returned from DynamoDBUtil.describe_limits()
+    :return: read capacity units provisioned in the whole account
+    """
+    end_time = datetime.utcnow()
+    utilization = (cloud_watch_util or CloudWatchUtil()).get_metric_maximum(
+        'AWS/DynamoDB', 'AccountProvisionedReadCapacityUtilization', {},
+        end_time - timedelta(seconds=ACCOUNT_UTILIZATION_LOOKBACK), end_time)
+    described = get_provisioned_read_capacity_units(table_descriptions)
+
+    if utilization is None:
+        logger.warn("No AccountProvisionedReadCapacityUtilization datapoints, using read capacity of {} tables."
+                    .format(len(table_descriptions)))
+        return described
+
+    return max(described, int(math.ceil(utilization * limits['AccountMaxReadCapacityUnits'] / 100.0)))
+
+
+def format_plan(plan):
+    """
+    :return: human readable plan, as returned from BackupPlanner.plan()
+    """
+    lines = ["Backup plan: {} pipelines, {} read capacity unit hours, {} cluster hours, estimated cost {}{}.".format(
+        len(plan['Pipelines']), plan['Cost']['ReadCapacityUnitHours'], plan['Cost']['ClusterHours'],
+        plan['Cost']['Total'], "" if plan['Feasible'] else ", NOT meeting recovery window or read capacity limits")]
+
+    for index, (table_names, duration) in enumerate(zip(plan['Pipelines'], plan['PipelineDurations'])):
+        lines.append("Pipeline {}: {} tables, estimated duration {}s".format(index, len(table_names), duration))
+
+        for table_name in table_names:
+            table = plan['Tables'][table_name]
+            lines.append("    {}: {} RCU, readThroughputPercent {}, estimated duration {}s{}".format(
+                table_name, table['ReadCapacityUnits'], table['ReadThroughputPercent'], table['EstimatedDuration'],
+                " (capped)" if table['Capped'] else ""))
+
+    return "\n".join(lines)
@@ -0,0 +1,154 @@
+from __future__ import print_function
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+from hippolyte.instrumentation import get_remaining_seconds
+from hippolyte.rate_limiter import get_rate_limiter
+from hippolyte.utils import CAPACITY_CHANGE_WORKERS, FRESH_DESCRIPTION_MAX_AGE, TABLE_ACTIVE_POLL_DELAY, \
+    TABLE_ACTIVE_MAX_POLLS, INVOCATION_SAFETY_MARGIN, get_description_age
+
+BOOSTED = 'boosted'
+CAPPED = 'capped'
+RESTORED = 'restored'
+UNCHANGED = 'unchanged'
+FAILED = 'failed'
+DECREASE_QUOTA_EXHAUSTED = 'decrease-quota-exhausted'
+SUCCESSFUL_STATUSES = (BOOSTED, CAPPED, RESTORED)
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+def capacity_change(table_description, read_capacity_units, capped=False):
+    """
+    :param table_description: describe_table output of the table to change
+    :param read_capacity_units: desired read capacity units
+    :param capped: whether read_capacity_units were lowered to stay within limits
+    :return: single change, as accepted by CapacityChangeExecutor.apply()
+    """
+    return {
+        'description': table_description,
+        'read_capacity_units': read_capacity_units,
+        'capped': capped
+    }
+
+
+class CapacityChangeExecutor(object):
+    def __init__(self, dynamo_db_util, workers=CAPACITY_CHANGE_WORKERS, rate_budget=None, wait_for_active=False,
+                 max_description_age=FRESH_DESCRIPTION_MAX_AGE):
+        """
+        Changes read capacity of many tables concurrently. Tables stay readable while UPDATING, so by default
+        apply() doesn't wait for them to become ACTIVE again.
+        :param dynamo_db_util: DynamoDBUtil used for API calls
+        :param workers: how many tables to update, or wait for, at the same time
+        :param rate_budget: max number of DynamoDB API calls per second, shared by all workers
+        :param wait_for_active: whether apply() should return only after updated tables are ACTIVE again, or the
+            invocation is about to time out
+        :param max_description_age: descriptions older than that many seconds are described again before update,
+            so that write capacity changed in the meantime is not overwritten
+        """
+        self.dynamo_db_util = dynamo_db_util
+        self.workers = workers
+        self.wait_for_active = wait_for_active
+        self.max_description_age = max_description_age
+
+        if rate_budget:
+            get_rate_limiter('dynamodb').set_max_rate(rate_budget)
+
+    def apply(self, changes):
+        """
+        :param changes: list of changes, as returned from capacity_change()
+        :return: list of results, in changes order: {'table_name', 'status', 'previous_read_capacity_units',
+            'read_capacity_units', 'error', 'error_code'}, where status is one of: boosted, capped, restored,
+            unchanged, failed or decrease-quota-exhausted
+        """
+        results = self._map(self._change_capacity, changes)
+
+        if self.wait_for_active:
+            updated = filter(lambda x: x['status'] in SUCCESSFUL_STATUSES, results)
+            max_polls = self._get_max_polls()
+
+            for result, active in zip(updated, self._map(lambda x: self._wait_until_active(x, max_polls), updated)):
+                if not active:
+                    logger.warn("Table {} is still being updated.".format(result['table_name']))
+
+        statuses = {}
+
+        for result in results:
+            statuses[result['status']] = statuses.get(result['status'], 0) + 1
+
+        logger.info("Capacity changes: {}".format(", ".join(
+            "{} {}".format(count, status) for status, count in sorted(statuses.items()))))
+
+        return results
+
+    def _change_capacity(self, change):
+        table = change['description'].get('Table', {})
+        previous = table.get('ProvisionedThroughput', {}).get('ReadCapacityUnits')
+        target = change['read_capacity_units']
+        result = {
+            'table_name': table.get('TableName'),
+            'status': UNCHANGED,
+            'previous_read_capacity_units': previous,
+            'read_capacity_units': previous,
+            'error': None,
+            'error_code': None
+        }
+
+        if target == previous:
+            return result
+
+        try:
+            description = change['description']
+
+            if not self._is_fresh(description):
+                description = self.dynamo_db_util.describe_table(result['table_name'])
+
+            self.dynamo_db_util.update_read_capacity(description, target)
+        except ClientError as e:
+            result['error'] = e.message
+            result['error_code'] = e.response.get('Error', {}).get('Code')
+            result['status'] = DECREASE_QUOTA_EXHAUSTED if target < previous and 'decreased' in e.message else FAILED
+
+            return result
+
+        result['read_capacity_units'] = target
+
+        if target < previous:
+            result['status'] = RESTORED
+        else:
+            result['status'] = CAPPED if change['capped'] else BOOSTED
+
+        return result
+
+    def _wait_until_active(self, result, max_polls):
+        return self.dynamo_db_util.wait_until_active(result['table_name'], max_polls=max_polls)
+
+    def _get_max_polls(self):
+        """
+        :return: how many times to poll each table, so that waiting ends before the invocation times out
+        """
+        remaining_seconds = get_remaining_seconds()
+
+        if remaining_seconds is None:
+            return TABLE_ACTIVE_MAX_POLLS
+
+        return max(min(int((remaining_seconds - INVOCATION_SAFETY_MARGIN) / TABLE_ACTIVE_POLL_DELAY),
+                       TABLE_ACTIVE_MAX_POLLS), 1)
+
+    def _is_fresh(self, table_description):
+        """
+        Age of a description is taken from the Date header of describe_table response.
+        """
+        age = get_description_age(table_description)
+
+        return age is not None and age <= self.max_description_age
+
+    def _map(self, func, items):
+        executor = ThreadPoolExecutor(max_workers=max(self.workers, 1))
+
+        try:
+            return list(executor.map(func, items))
+        finally:
+            executor.shutdown()
@@ -0,0 +1,130 @@
+import calendar
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from hippolyte.aws_utils import CloudWatchUtil, S3Util
+from hippolyte.monitor import BACKUP_TIMESTAMP_PATTERN
+from hippolyte.utils import MAX_CARRY_FORWARD_AGE, VERIFY_BACKUP_WORKERS
+
+FINGERPRINT_FIELDS = ('TableSizeBytes', 'ItemCount', 'CreationDateTime')
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+def get_fingerprint(table):
+    """
+    :param table: 'Table' of describe_table output
+    :return: properties of the table, which change when it's recreated or items are added or removed, in place
+        updates are caught by ChangeDetector with write metrics
+    """
+    return dict((x, str(table.get(x))) for x in FINGERPRINT_FIELDS)
+
+
+def record_exports(table_descriptions, exported_at):
+    """
+    :param exported_at: epoch seconds, when the backup started
+    :return: entries of Exports section of backup metadata, for tables exported by the backup
+    """
+    return [{
+        'TableName': x['Table']['TableName'],
+        'Fingerprint': get_fingerprint(x['Table']),
+        'ExportedAt': exported_at,
+        'CarriedForward': False,
+        'Backend': 'datapipeline'
+    } for x in table_descriptions]
+
+
+class ChangeDetector(object):
+    def __init__(self, backup_bucket, previous_exports, max_age=MAX_CARRY_FORWARD_AGE, workers=VERIFY_BACKUP_WORKERS):
+        """
+        :param previous_exports: Exports section of the last backup metadata
+        :param max_age: tables are exported again after that many seconds, even if they didn't change
+        :param workers: how many tables to check concurrently
+        """
+        self.backup_bucket = backup_bucket
+        self.previous_exports = dict((x['TableName'], x) for x in previous_exports)
+        self.max_age = max_age
+        self.workers = workers
+        self.s3_util = S3Util()
+        self.cloud_watch_util = CloudWatchUtil()
+
+    def detect(self, table_descriptions, now=None):
+        """
+        Decides which tables need a fresh export. A table is carried forward, pointing to its last backup, only if
+        its fingerprint is the same, nothing was written to it since and that backup succeeded within max_age.
+        :param now: epoch seconds, when the backup started
+        :return: (descriptions of tables to export, Exports section for all tables)
+        """
+        now = now or time.time()
+        candidates = []
+
+        for description in table_descriptions:
+            table = description['Table']
+            export = self.previous_exports.get(table['TableName'])
+
+            if not export or export.get('Failed') or now - export['ExportedAt'] > self.max_age:
+                continue
+
+            if export['Fingerprint'] == get_fingerprint(table):
+                candidates.append(export)
+
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+
+        try:
+            locations = dict(zip(map(lambda x: x['TableName'], candidates),
+                                 executor.map(self._find_unchanged_backup, candidates)))
+        finally:
+            executor.shutdown()
+
+        changed = []
+        exports = []
+
+        for description in table_descriptions:
+            table_name = description['Table']['TableName']
+
+            if locations.get(table_name):
+                exports.append(dict(self.previous_exports[table_name], Location=locations[table_name],
+                                    CarriedForward=True))
+            else:
+                changed.append(description)
+                exports += record_exports([description], now)
+
+        logger.info("{} tables unchanged since their last backup, exporting {} tables.".format(
+            len(table_descriptions) - len(changed), len(changed)))
+
+        return changed, exports
+
+    def _find_unchanged_backup(self, export):
+        """
+        :param export: entry of Exports section of the last backup metadata
+        :return: s3 location of the last successful backup of the table, None if the table was written to since
+        """
+        if self._written_since(export['TableName'], export['ExportedAt']):
+            return None
+
+        if export['CarriedForward']:
+            prefix = export['Location'].split('/', 3)[3]
+        else:
+            prefix = self._find_last_backup_prefix(export['TableName'])
+
+        success_flag = prefix and self.s3_util.find_object_with_suffix(self.backup_bucket, prefix, '_SUCCESS')
+
+        if not success_flag or calendar.timegm(success_flag['LastModified'].utctimetuple()) < export['ExportedAt']:
+            return None
+
+        return 's3://{}/{}'.format(self.backup_bucket, prefix)
+
+    def _written_since(self, table_name, exported_at):
+        written = self.cloud_watch_util.get_metric_sum('AWS/DynamoDB', 'ConsumedWriteCapacityUnits',
+                                                       {'TableName': table_name},
+                                                       datetime.utcfromtimestamp(exported_at), datetime.utcnow())
+        return written > 0
+
+    def _find_last_backup_prefix(self, table_name):
+        prefixes = filter(lambda x: BACKUP_TIMESTAMP_PATTERN.match(x.split('/')[-2]),
+                          self.s3_util.iter_common_prefixes(self.backup_bucket, '{}/'.format(table_name)))
+
+        return max(prefixes) if prefixes else None
@@ -0,0 +1,98 @@
+import random
+
+from botocore.config import Config
+from botocore.retryhandler import EXCEPTION_MAP
+from hippolyte.rate_limiter import is_throttling_error_code
+
+# can be overridden per account with 'client_config' in project_config.ACCOUNT_CONFIGS
+DEFAULT_CLIENT_SETTINGS = {
+    'connect_timeout': 5,
+    'read_timeout': 60,
+    'max_pool_connections': 10,
+    'max_attempts': 5,
+    'base_retry_delay': 1.0,
+    'max_retry_delay': 20.0
+}
+# connections kept on top of worker count, for calls made from the main thread meanwhile
+POOL_CONNECTIONS_HEADROOM = 2
+CONNECTION_ERRORS = tuple(EXCEPTION_MAP['GENERAL_CONNECTION_ERROR'])
+TRANSIENT_ERROR_CODES = frozenset([
+    'ProvisionedThroughputExceededException',
+    'RequestTimeout',
+    'RequestTimeoutException',
+    'PriorRequestNotComplete'
+])
+
+
+def build_client_settings(account_settings=None, concurrency=0):
+    """
+    :param account_settings: overrides of DEFAULT_CLIENT_SETTINGS
+    :param concurrency: most threads calling the same client at the same time, the connection pool is made
+        big enough for all of them, unless max_pool_connections is set explicitly
+    :return: settings accepted by create_botocore_config() and RetryPolicy.from_settings()
+    """
+    settings = dict(DEFAULT_CLIENT_SETTINGS)
+    settings['max_pool_connections'] = max(settings['max_pool_connections'],
+                                           concurrency + POOL_CONNECTIONS_HEADROOM)
+    settings.update(account_settings or {})
+
+    return settings
+
+
+def create_botocore_config(settings):
+    return Config(connect_timeout=settings['connect_timeout'],
+                  read_timeout=settings['read_timeout'],
+                  max_pool_connections=settings['max_pool_connections'])
+
+
+class RetryPolicy(object):
+    def __init__(self, max_attempts, base_delay, max_delay):
+        """
+        Single retry policy for every call of a client, replacing the one botocore registers, so that calls
+        are not retried again on top of botocore retries. Throttling, limit exceeded, server and connection
+        errors are retried with exponential backoff and full jitter.
+        :param max_attempts: how many times a call is attempted, including the first attempt
+        :param base_delay: upper bound of the delay after the first attempt, in seconds
+        :param max_delay: upper bound of any delay, in seconds
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(settings['max_attempts'], settings['base_retry_delay'], settings['max_retry_delay'])
+
+    def attach(self, client):
+        endpoint_prefix = client.meta.service_model.endpoint_prefix
+        client.meta.events.unregister('needs-retry.{}'.format(endpoint_prefix),
+                                      unique_id='retry-config-{}'.format(endpoint_prefix))
+        client.meta.events.register('needs-retry.{}'.format(endpoint_prefix), self,
+                                    unique_id='retry-policy-{}'.format(endpoint_prefix))
+
+        return client
+
+    def __call__(self, attempts, response=None, caught_exception=None, **kwargs):
+        """
+        Called by botocore after every attempt.
+        :return: seconds to wait before the next attempt, or None if the call shouldn't be retried
+        """
+        if attempts >= self.max_attempts or not self.is_retryable(response, caught_exception):
+            return None
+
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempts - 1)))
+
+    def is_retryable(self, response, caught_exception):
+        if caught_exception is not None:
+            return isinstance(caught_exception, CONNECTION_ERRORS)
+
+        if response is None:
+            return False
+
+        http_response, parsed = response
+        error = (parsed or {}).get('Error', {})
+
+        return http_response.status_code >= 500 or \
+            is_throttling_error_code(error.get('Code'), error.get('Message')) or \
+            error.get('Code') in TRANSIENT_ERROR_CODES or \
+            'limit exceeded' in (error.get('Message') or '')
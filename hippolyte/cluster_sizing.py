@@ -0,0 +1,126 @@
+import math
+
+from hippolyte.utils import READ_BLOCK_SIZE_BYTES, MAX_CORE_INSTANCE_COUNT, MAP_SLOT_BYTES_PER_SECOND
+
+M1_MEDIUM_CLUSTER_MEMORY = '--yarn-key-value,yarn.nodemanager.resource.memory-mb=2048,' \
+                           '--yarn-key-value,yarn.scheduler.maximum-allocation-mb=2048,' \
+                           '--yarn-key-value,yarn.scheduler.minimum-allocation-mb=256,' \
+                           '--yarn-key-value,yarn.app.mapreduce.am.resource.mb=1024,' \
+                           '--mapred-key-value,mapreduce.map.memory.mb=768,' \
+                           '--mapred-key-value,mapreduce.map.java.opts=-Xmx512M,' \
+                           '--mapred-key-value,mapreduce.reduce.memory.mb=1024,' \
+                           '--mapred-key-value,mapreduce.reduce.java.opts=-Xmx768m,' \
+                           '--mapred-key-value,mapreduce.map.speculative=false'
+
+# yarnMemoryMb is memory available to YARN containers on a node, hourlyPrice is EC2 plus EMR on demand price
+# in us-east-1, only used to compare instance types with each other.
+INSTANCE_CATALOGUE = [
+    {
+        'instanceType': 'm1.medium',
+        'masterInstanceType': 'm1.medium',
+        'yarnMemoryMb': 2048,
+        'mapSlots': 1,
+        'hourlyPrice': 0.109,
+        'clusterMemory': M1_MEDIUM_CLUSTER_MEMORY,
+        'maxTotalDynamoDbSizeBytes': 597688320  # 570MB
+    },
+    {
+        'instanceType': 'm3.xlarge',
+        'masterInstanceType': 'm3.xlarge',
+        'yarnMemoryMb': 11520,
+        'mapSlots': 2,
+        'hourlyPrice': 0.336
+    },
+    {
+        'instanceType': 'm3.2xlarge',
+        'masterInstanceType': 'm3.xlarge',
+        'yarnMemoryMb': 23040,
+        'mapSlots': 4,
+        'hourlyPrice': 0.672
+    },
+    {
+        'instanceType': 'r3.2xlarge',
+        'masterInstanceType': 'm3.xlarge',
+        'yarnMemoryMb': 54272,
+        'mapSlots': 4,
+        'hourlyPrice': 0.845
+    }
+]
+
+
+def choose_cluster(total_table_size, peak_read_capacity_units, target_duration, catalogue=INSTANCE_CATALOGUE):
+    """
+    Picks the cheapest cluster able to export total_table_size within target_duration. Tables are exported one
+    after another, each no faster than its read rate, so a cluster faster than the fastest table read rate can't
+    shorten the export and is only sized for the whole pipeline when that needs less.
+    :param total_table_size: size in bytes of all tables backed up by the pipeline
+    :param peak_read_capacity_units: highest read capacity units consumed by the backup of a single table,
+        the export isn't considered read-bound if not given
+    :param target_duration: how long exporting all tables should take, in seconds
+    :return: {'masterInstanceType', 'coreInstanceType', 'coreInstanceCount', 'clusterMemory'}
+    """
+    required_bytes_per_second = float(total_table_size) / max(target_duration, 1)
+    read_duration = 0
+
+    if peak_read_capacity_units:
+        peak_read_bytes_per_second = peak_read_capacity_units * READ_BLOCK_SIZE_BYTES
+        required_bytes_per_second = min(required_bytes_per_second, peak_read_bytes_per_second)
+        read_duration = float(total_table_size) / peak_read_bytes_per_second
+
+    required_map_slots = max(int(math.ceil(required_bytes_per_second / MAP_SLOT_BYTES_PER_SECOND)), 1)
+    prices = dict((x['instanceType'], x['hourlyPrice']) for x in catalogue)
+    candidates = []
+
+    for instance in catalogue:
+        if total_table_size >= instance.get('maxTotalDynamoDbSizeBytes', float('inf')):
+            continue
+
+        needed_count = int(math.ceil(float(required_map_slots) / instance['mapSlots']))
+        core_instance_count = min(max(needed_count, 1), MAX_CORE_INSTANCE_COUNT)
+        capacity = core_instance_count * instance['mapSlots'] * MAP_SLOT_BYTES_PER_SECOND
+        duration = max(target_duration, read_duration, float(total_table_size) / capacity)
+        hourly_price = instance['hourlyPrice'] * core_instance_count + prices[instance['masterInstanceType']]
+        cost = hourly_price * math.ceil(duration / 3600.0)
+        candidates.append((needed_count > MAX_CORE_INSTANCE_COUNT, cost, -capacity, instance, core_instance_count))
+
+    _, _, _, instance, core_instance_count = min(candidates, key=lambda x: x[:3])
+
+    return {
+        'masterInstanceType': instance['masterInstanceType'],
+        'coreInstanceType': instance['instanceType'],
+        'coreInstanceCount': core_instance_count,
+        'clusterMemory': instance.get('clusterMemory') or build_cluster_memory(instance['yarnMemoryMb'],
+                                                                             instance['mapSlots'])
+    }
+
+
+def get_hourly_price(cluster, catalogue=INSTANCE_CATALOGUE):
+    """
+    :param cluster: as returned from choose_cluster()
+    :return: hourly price of master and core instances of the cluster
+    """
+    prices = dict((x['instanceType'], x['hourlyPrice']) for x in catalogue)
+
+    return prices[cluster['masterInstanceType']] + prices[cluster['coreInstanceType']] * cluster['coreInstanceCount']
+
+
+def build_cluster_memory(yarn_memory_mb, map_slots):
+    """
+    YARN and mapreduce settings for a node, keeping ratios used for m3.xlarge: map containers split node memory
+    between map slots, application master and reducers get half of a map container, heap is 80% of a container.
+    :return: configure-hadoop bootstrap action arguments
+    """
+    map_memory_mb = yarn_memory_mb // map_slots
+    half_map_memory_mb = map_memory_mb // 2
+
+    return ','.join([
+        '--yarn-key-value,yarn.nodemanager.resource.memory-mb={}'.format(yarn_memory_mb),
+        '--yarn-key-value,yarn.scheduler.maximum-allocation-mb={}'.format(yarn_memory_mb),
+        '--yarn-key-value,yarn.scheduler.minimum-allocation-mb={}'.format(map_memory_mb // 4),
+        '--yarn-key-value,yarn.app.mapreduce.am.resource.mb={}'.format(half_map_memory_mb),
+        '--mapred-key-value,mapreduce.map.memory.mb={}'.format(map_memory_mb),
+        '--mapred-key-value,mapreduce.map.java.opts=-Xmx{}M'.format(map_memory_mb * 4 // 5),
+        '--mapred-key-value,mapreduce.reduce.memory.mb={}'.format(half_map_memory_mb),
+        '--mapred-key-value,mapreduce.reduce.java.opts=-Xmx{}m'.format(half_map_memory_mb * 4 // 5),
+        '--mapred-key-value,mapreduce.map.speculative=false'
+    ])
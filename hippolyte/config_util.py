@@ -1,52 +1,209 @@
 __author__ = "roman.subik"
 
-from hippolyte.aws_utils import S3Util, DataPipelineUtil
+from botocore.exceptions import ClientError
+from hippolyte.aws_utils import S3Util
+from hippolyte.pipeline_states import get_pipeline_state_poller
 from hippolyte.utils import get_date_suffix
 import logging
+import threading
 
 COMMON_PREFIX = 'backup_metadata'
-DONE_STATES = ["CANCELED", "CASCADE_FAILED", "FAILED", "FINISHED", "INACTIVE", "PAUSED", "SKIPPED", "TIMEDOUT"]
+BOOSTS_KEY = 'backup_boosts'
+# copy of the latest metadata file, with its key, so it's found without listing all of them
+LATEST_METADATA_KEY = '{}/latest'.format(COMMON_PREFIX)
+METADATA_VERSION = 2
+SECTIONS = ('Tables', 'Pipelines', 'ScalingPolicies', 'ScalableTargets', 'Exports')
+# fields kept in backup metadata, None keeps the whole value, nested fields apply to an object or to objects in a list
+TABLE_FIELDS = {
+    'TableName': None,
+    'TableArn': None,
+    'TableSizeBytes': None,
+    'ItemCount': None,
+    'CreationDateTime': None,
+    'ProvisionedThroughput': {'ReadCapacityUnits': None, 'WriteCapacityUnits': None},
+    'GlobalSecondaryIndexes': {
+        'IndexName': None,
+        'ProvisionedThroughput': {'ReadCapacityUnits': None, 'WriteCapacityUnits': None}
+    }
+}
+PIPELINE_FIELDS = {'pipeline_id': None, 'backed_up_tables': None}
+PIPELINE_NODE_FIELDS = {'id': None, 'tableName': None, 'readThroughputPercent': None, 'directoryPath': None}
+SCALABLE_TARGET_FIELDS = {'ServiceNamespace': None, 'ResourceId': None, 'ScalableDimension': None,
+                          'MinCapacity': None, 'MaxCapacity': None, 'RoleARN': None}
+SCALING_POLICY_FIELDS = {'PolicyName': None, 'ServiceNamespace': None, 'ResourceId': None, 'ScalableDimension': None,
+                         'PolicyType': None, 'TargetTrackingScalingPolicyConfiguration': None}
+DONE_STATES = frozenset(["CANCELED", "CASCADE_FAILED", "FAILED", "FINISHED", "INACTIVE", "PAUSED", "SKIPPED",
+                         "TIMEDOUT"])
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def reset_metadata_cache():
+    """
+    Forgets metadata loaded so far, as Lambda reuses the process for the next invocation.
+    """
+    with _cache_lock:
+        _cache.clear()
+
 
 class ConfigUtil(object):
     def __init__(self):
         self.s3_util = S3Util()
-        self.data_pipeline_util = DataPipelineUtil()
 
     def save_configuration(self, pipeline_definitions, backup_bucket, table_descriptions,
-                           scaling_policies, scalable_targets):
-        self.s3_util.put_json(
-            backup_bucket, self._get_metadata_file_name(),
-            {
-                "Tables": table_descriptions,
-                "Pipelines": pipeline_definitions,
-                "ScalingPolicies": scaling_policies,
-                "ScalableTargets": scalable_targets
-            }
-        )
-
-    def load_configuration(self, backup_bucket):
+                           scaling_policies, scalable_targets, exports=None):
+        """
+        Keeps only fields used by restore and monitoring, each section in its own compressed object, so it can be
+        loaded separately. Metadata file only points to sections, it's written last along with its copy at
+        LATEST_METADATA_KEY.
+        :param exports: fingerprints and last backups of all tables, exported or carried forward, as returned from
+            ChangeDetector.detect()
+        """
+        suffix = get_date_suffix()
+        sections = {
+            'Tables': map(lambda x: {'Table': slim(x.get('Table', {}), TABLE_FIELDS)}, table_descriptions),
+            'Pipelines': map(slim_pipeline, pipeline_definitions),
+            'ScalingPolicies': map(lambda x: slim(x, SCALING_POLICY_FIELDS), scaling_policies),
+            'ScalableTargets': map(lambda x: slim(x, SCALABLE_TARGET_FIELDS), scalable_targets),
+            'Exports': exports or []
+        }
+        metadata = {'Version': METADATA_VERSION, 'Sections': {}}
+
+        for name in SECTIONS:
+            key = '{}/{}/{}.json.gz'.format(COMMON_PREFIX, suffix, name)
+            self._put_json(backup_bucket, key, sections[name])
+            metadata['Sections'][name] = key
+
+        metadata_file_name = self._get_metadata_file_name(suffix)
+        self._put_json(backup_bucket, metadata_file_name, metadata)
+        self._put_json(backup_bucket, LATEST_METADATA_KEY, dict(metadata, Key=metadata_file_name))
+
+    def save_pipelines(self, backup_bucket, pipeline_descriptions):
+        """
+        Replaces Pipelines section of the latest backup metadata in place, ex. once pipelines, which failed to deploy,
+        were deleted, so their tables are neither restored nor verified by the monitor.
+        :param pipeline_descriptions: pipelines of the latest backup, which are still there
+        """
+        self._replace_section(backup_bucket, 'Pipelines', map(slim_pipeline, pipeline_descriptions))
+
+    def save_exports(self, backup_bucket, exports):
+        """
+        Replaces Exports section of the latest backup metadata in place, ex. once in-process exports failed or were
+        verified by the monitor.
+        :param exports: all entries of the Exports section
+        """
+        self._replace_section(backup_bucket, 'Exports', exports)
+
+    def _replace_section(self, backup_bucket, name, section):
+        metadata = self._load_latest_metadata(backup_bucket)
+        self._put_json(backup_bucket, metadata['Sections'][name], section)
+
+    def load_configuration(self, backup_bucket, sections=SECTIONS):
+        """
+        Each object is fetched at most once per invocation, see reset_metadata_cache().
+        :param sections: names of sections to load, all by default
+        :return: {section_name: section} of the latest backup metadata, or None if there is none
+        """
+        metadata = self._load_latest_metadata(backup_bucket)
+
+        if metadata is None:
+            return
+
+        if 'Version' not in metadata:
+            # written before metadata was split into sections, with everything inline
+            return dict((x, metadata.get(x, [])) for x in sections)
+
+        return dict((x, self._get_json(backup_bucket, metadata['Sections'][x]) if x in metadata['Sections'] else [])
+                    for x in sections)
+
+    def load_backup_timestamp(self, backup_bucket):
+        """
+        :return: timestamp of the latest backup metadata, in BACKUP_TIMESTAMP_FORMAT, same as of directories written
+            by its exports, or None if there is no metadata
+        """
+        metadata = self._load_latest_metadata(backup_bucket)
+
+        if metadata is None or 'Key' not in metadata:
+            return
+
+        return metadata['Key'][len(COMMON_PREFIX) + 1:]
+
+    def _load_latest_metadata(self, backup_bucket):
+        """
+        :return: latest metadata file, as pointed to by LATEST_METADATA_KEY, or found by listing all metadata files
+            if there is no pointer yet, None if there are no metadata files
+        """
+        with _cache_lock:
+            if (backup_bucket, LATEST_METADATA_KEY) in _cache:
+                return _cache[(backup_bucket, LATEST_METADATA_KEY)]
+
+        try:
+            metadata = self.s3_util.get_json(backup_bucket, LATEST_METADATA_KEY)
+        except ClientError as e:
+            if e.response['Error']['Code'] not in ('NoSuchKey', '404'):
+                raise
+
+            logger.info("Couldn't find {}, looking for the latest metadata file.".format(LATEST_METADATA_KEY))
+            metadata = self._find_latest_metadata(backup_bucket)
+
+        with _cache_lock:
+            _cache[(backup_bucket, LATEST_METADATA_KEY)] = metadata
+
+        return metadata
+
+    def _find_latest_metadata(self, backup_bucket):
         contents = self.s3_util.list_objects(
-            backup_bucket, COMMON_PREFIX
+            backup_bucket, '{}-'.format(COMMON_PREFIX)
         ).get("Contents", [])
 
         contents = sorted(contents, key=lambda x: x['LastModified'], reverse=True)
 
         if contents:
-            return self.s3_util.get_json(
-                backup_bucket, contents[0].get('Key')
-            )
-        else:
-            return
+            return dict(self.s3_util.get_json(backup_bucket, contents[0]['Key']), Key=contents[0]['Key'])
+
+    def _get_json(self, backup_bucket, key):
+        with _cache_lock:
+            if (backup_bucket, key) in _cache:
+                return _cache[(backup_bucket, key)]
+
+        value = self.s3_util.get_json(backup_bucket, key)
+
+        with _cache_lock:
+            _cache[(backup_bucket, key)] = value
+
+        return value
+
+    def _put_json(self, backup_bucket, key, value):
+        self.s3_util.put_json(backup_bucket, key, value, compress=True)
 
-    def _get_metadata_file_name(self):
-        return '{}-{}'.format(COMMON_PREFIX, get_date_suffix())
+        with _cache_lock:
+            _cache[(backup_bucket, key)] = value
+
+    def save_boosts(self, backup_bucket, boosts):
+        """
+        Saved separately from backup metadata, which keeps throughput from before the boost, for restore.
+        :param boosts: {table_name: {'ReadCapacityUnits', 'ReadThroughputPercent'}} used by the last backup
+        """
+        self.s3_util.put_json(backup_bucket, BOOSTS_KEY, boosts)
+
+    def load_boosts(self, backup_bucket):
+        try:
+            return self.s3_util.get_json(backup_bucket, BOOSTS_KEY)
+        except ClientError as e:
+            if e.response['Error']['Code'] not in ('NoSuchKey', '404'):
+                raise
+
+            return {}
+
+    def _get_metadata_file_name(self, suffix=None):
+        return '{}-{}'.format(COMMON_PREFIX, suffix or get_date_suffix())
 
     def list_backed_up_tables(self, pipelines, backup_bucket):
-        finished_pipelines = self.list_finished_pipelines(backup_bucket, pipelines)
+        finished_pipelines = set(self.list_finished_pipelines(backup_bucket, pipelines))
         backed_up_tables = []
 
         for pipeline in pipelines:
@@ -56,35 +213,67 @@ class ConfigUtil(object):
         return backed_up_tables
 
     def list_finished_pipelines(self, backup_bucket=None, backup_pipelines=None):
+        last_configuration = None
+
         if not backup_pipelines:
-            last_configuration = self.load_configuration(backup_bucket)
+            last_configuration = self.load_configuration(backup_bucket, sections=('Pipelines',))
 
             if last_configuration:
                 backup_pipelines = last_configuration['Pipelines']
 
         if not backup_pipelines:
-            logger.error("Couldn't find any backed up tables. Has your backup ran?")
+            if last_configuration:
+                logger.info("No tables were exported by the last backup.")
+            else:
+                logger.error("Couldn't find any backed up tables. Has your backup ran?")
+
             return []
 
-        backup_pipeline_names = map(lambda x: x['pipeline_id'], backup_pipelines)
-        pipelines = self.data_pipeline_util.describe_pipelines()
+        backup_pipeline_ids = map(lambda x: x['pipeline_id'], backup_pipelines)
+        states = get_pipeline_state_poller().get_states(backup_pipeline_ids)
         finished_pipelines = []
 
-        for pipeline in pipelines:
-            fields = pipeline["fields"]
-            pipeline_id = pipeline["pipelineId"]
+        for pipeline_id in backup_pipeline_ids:
+            logger.info("Pipeline {} state is {}.".format(pipeline_id, states[pipeline_id]))
+
+            if states[pipeline_id] in DONE_STATES:
+                finished_pipelines.append(pipeline_id)
 
-            logger.info("Checking pipeline {}".format(str(pipeline_id)))
+        return finished_pipelines
 
-            if pipeline_id not in backup_pipeline_names:
-                continue
 
-            for field in fields:
-                if field["key"] != "@pipelineState":
-                    continue
-                if field["stringValue"] in DONE_STATES:
-                    logger.info("Pipeline {} state is in DONE_STATES.".format(str(pipeline_id)))
-                    logger.debug(str(pipeline))
-                    finished_pipelines.append(pipeline_id)
+def slim(item, fields):
+    """
+    :param fields: {field: None to keep the whole value, or fields kept of the nested object or list of objects}
+    :return: copy of item with only fields given
+    """
+    slimmed = {}
 
-        return finished_pipelines
+    for field, nested_fields in fields.items():
+        if field not in item:
+            continue
+
+        value = item[field]
+
+        if nested_fields is None:
+            slimmed[field] = value
+        elif isinstance(value, list):
+            slimmed[field] = map(lambda x: slim(x, nested_fields), value)
+        else:
+            slimmed[field] = slim(value, nested_fields)
+
+    return slimmed
+
+
+def slim_pipeline(pipeline_description):
+    """
+    :return: pipeline description with only table and S3 nodes of its definition, which identify backed up tables
+    and where they were exported to
+    """
+    nodes = pipeline_description.get('definition', {}).get('objects', [])
+    slimmed = slim(pipeline_description, PIPELINE_FIELDS)
+    slimmed['definition'] = {
+        'objects': [slim(x, PIPELINE_NODE_FIELDS) for x in nodes if 'tableName' in x or 'directoryPath' in x]
+    }
+
+    return slimmed
@@ -0,0 +1,135 @@
+from __future__ import print_function
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+from hippolyte.aws_utils import S3Util, DynamoDBUtil
+from hippolyte.utils import DESCRIPTION_CACHE_TTL, DESCRIBE_TABLE_WORKERS, FRESH_DESCRIPTION_MAX_AGE, \
+    get_description_age
+
+CACHE_KEY = 'table_descriptions_cache'
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+class TableDescriptionCache(object):
+    def __init__(self, backup_bucket, ttl=DESCRIPTION_CACHE_TTL):
+        """
+        Table descriptions persisted in the backup bucket, next to backup_metadata files,
+        so that only new tables and entries older than ttl have to be described again.
+        :param backup_bucket: bucket, where cache file is kept
+        :param ttl: after how many seconds a cached description is described again
+        """
+        self.backup_bucket = backup_bucket
+        self.ttl = ttl
+        self.s3_util = S3Util()
+        self.dynamo_db_util = DynamoDBUtil()
+        self.entries = None
+
+    def load(self):
+        """
+        :return: cached entries: {table_name: {'CachedAt': epoch seconds, 'Description': describe_table output}}
+        """
+        if self.entries is None:
+            try:
+                self.entries = self.s3_util.get_json(self.backup_bucket, CACHE_KEY)
+            except ClientError as e:
+                if e.response['Error']['Code'] not in ('NoSuchKey', '404'):
+                    raise
+
+                logger.info("Table description cache not found, all tables will be described.")
+                self.entries = {}
+
+        return self.entries
+
+    def snapshot(self):
+        """
+        :return: cached table descriptions, sorted by table name, without calling DynamoDB
+        """
+        entries = self.load()
+        return [entries[table_name]['Description'] for table_name in sorted(entries)]
+
+    def refresh(self, table_names, workers=DESCRIBE_TABLE_WORKERS):
+        """
+        Describes tables missing from the cache or cached longer than ttl ago,
+        and forgets tables which are no longer in table_names.
+        :param table_names: tables, which should be described
+        :param workers: how many tables to describe concurrently
+        :return: table descriptions, in the same order as table_names
+        """
+        entries = self.load()
+        now = time.time()
+
+        for table_name in set(entries) - set(table_names):
+            del entries[table_name]
+
+        stale = filter(lambda x: x not in entries or now - entries[x]['CachedAt'] > self.ttl, table_names)
+        logger.info("Describing {} out of {} tables, the rest comes from cache.".format(len(stale), len(table_names)))
+
+        for table_name, description in zip(stale, self.dynamo_db_util.describe_tables(stale, workers)):
+            entries[table_name] = {
+                'CachedAt': now,
+                'Description': description
+            }
+
+        return [entries[table_name]['Description'] for table_name in table_names]
+
+    def save(self):
+        if self.entries is not None:
+            self.s3_util.put_json(self.backup_bucket, CACHE_KEY, self.entries)
+
+    def invalidate(self):
+        logger.info("Invalidating table description cache.")
+        self.s3_util.delete_object(self.backup_bucket, CACHE_KEY)
+        self.entries = {}
+
+
+def refresh_descriptions(table_descriptions, max_age=FRESH_DESCRIPTION_MAX_AGE, workers=DESCRIBE_TABLE_WORKERS,
+                         dynamo_db_util=None):
+    """
+    Describes again tables described longer than max_age ago, ex. taken from the cache, so their current throughput
+    is known. Descriptions are updated in place, which keeps cached entries up to date too. Descriptions of tables
+    deleted in the meantime are left as they are.
+    :param max_age: seconds, 0 describes all tables again
+    :param workers: how many tables to describe concurrently
+    """
+    dynamo_db_util = dynamo_db_util or DynamoDBUtil()
+    stale = filter(lambda x: is_stale(x, max_age), table_descriptions)
+
+    def describe(description):
+        table_name = description['Table']['TableName']
+
+        try:
+            return dynamo_db_util.describe_table(table_name)
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ResourceNotFoundException':
+                raise
+
+            logger.warn("Can't describe {} again, table was deleted".format(table_name))
+            return None
+
+    executor = ThreadPoolExecutor(max_workers=max(workers, 1))
+
+    try:
+        fresh_descriptions = list(executor.map(describe, stale))
+    finally:
+        executor.shutdown()
+
+    for description, fresh_description in zip(stale, fresh_descriptions):
+        if fresh_description:
+            description.clear()
+            description.update(fresh_description)
+
+    logger.info("Described {} out of {} tables again.".format(len(stale), len(table_descriptions)))
+
+
+def is_stale(table_description, max_age):
+    """
+    :return: True if the table was described longer than max_age seconds ago, or it's not known when, always True
+        if max_age is 0
+    """
+    age = get_description_age(table_description)
+
+    return max_age <= 0 or age is None or age > max_age
@@ -0,0 +1,160 @@
+from __future__ import print_function
+import calendar
+import logging
+from datetime import datetime
+
+from botocore.exceptions import ClientError
+from hippolyte.aws_utils import S3Util
+from hippolyte.utils import ACTIVITY_BOOTSTRAP_TIME, EMR_BOOTSTRAP_TIME, INITIAL_READ_THROUGHPUT_PERCENT, \
+    DURATION_MODEL_SMOOTHING, BACKUP_TIMESTAMP_FORMAT, estimate_backup_duration
+
+MODEL_KEY = 'backup_duration_model'
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+class DurationModel(object):
+    def __init__(self, tables=None, accuracy=None):
+        """
+        Per table backup read rate, learned from past backups. Each table is described by how many bytes
+        the export reads per consumed read capacity unit, which depends on item sizes and cluster,
+        instead of assuming READ_BLOCK_SIZE_BYTES for every table.
+        :param tables: {table_name: {'BytesPerReadUnit': float, 'Runs': number of observed backups}}
+        :param accuracy: predicted and actual durations of the last observed backups
+        """
+        self.tables = tables or {}
+        self.accuracy = accuracy or []
+
+    @classmethod
+    def load(cls, backup_bucket):
+        """
+        :return: model persisted in backup_bucket, next to backup_metadata files, or empty model if there is none
+        """
+        try:
+            model = S3Util().get_json(backup_bucket, MODEL_KEY)
+        except ClientError as e:
+            if e.response['Error']['Code'] not in ('NoSuchKey', '404'):
+                raise
+
+            logger.info("Backup duration model not found, durations will be estimated from table size only.")
+            return cls()
+
+        return cls(model.get('Tables'), model.get('Accuracy'))
+
+    def save(self, backup_bucket):
+        S3Util().put_json(backup_bucket, MODEL_KEY, {
+            'Tables': self.tables,
+            'Accuracy': self.accuracy
+        })
+
+    def estimate(self, table_name, table_size_bytes, read_capacity_units, read_throughput_percent):
+        """
+        Falls back to estimate_backup_duration() for tables, which were never observed.
+        :return: estimated duration of table export in seconds, without activity bootstrap time
+        """
+        bytes_per_read_unit = self.tables.get(table_name, {}).get('BytesPerReadUnit')
+
+        if not bytes_per_read_unit:
+            return estimate_backup_duration(read_throughput_percent, table_size_bytes, read_capacity_units)
+
+        return table_size_bytes / (read_capacity_units * read_throughput_percent * bytes_per_read_unit)
+
+    def observe(self, table_name, table_size_bytes, read_capacity_units, read_throughput_percent, duration):
+        """
+        Updates read rate of the table with a single export, which took duration seconds.
+        """
+        if duration <= 0 or not table_size_bytes:
+            return
+
+        self.accuracy.append({
+            'TableName': table_name,
+            'ActualSeconds': round(duration, 1),
+            'PredictedSeconds': round(self.estimate(table_name, table_size_bytes, read_capacity_units,
+                                                    read_throughput_percent), 1),
+            'FormulaSeconds': round(estimate_backup_duration(read_throughput_percent, table_size_bytes,
+                                                             read_capacity_units), 1)
+        })
+
+        bytes_per_read_unit = table_size_bytes / (read_capacity_units * read_throughput_percent * duration)
+        table = self.tables.setdefault(table_name, {'BytesPerReadUnit': bytes_per_read_unit, 'Runs': 0})
+        table['BytesPerReadUnit'] += DURATION_MODEL_SMOOTHING * (bytes_per_read_unit - table['BytesPerReadUnit'])
+        table['Runs'] += 1
+
+    def observe_backups(self, configuration, boosts, pipeline_ids, success_flags):
+        """
+        Learns from pipelines which backed up all of their tables. Tables of a pipeline are exported one after
+        another, so duration of each one is the time between its _SUCCESS flag and the previous one, with the
+        first table starting after cluster bootstrap, at the time in the name of the backup directory.
+        :param configuration: backup metadata, as returned from ConfigUtil.load_configuration()
+        :param boosts: read capacity used during backup, as returned from ConfigUtil.load_boosts()
+        :param pipeline_ids: finished pipelines
+        :param success_flags: {table_name: _SUCCESS object of current batch, as returned from list_objects}
+        """
+        self.accuracy = []
+        pipeline_ids = set(pipeline_ids)
+        tables = dict((x['Table']['TableName'], x['Table']) for x in configuration.get('Tables', []))
+
+        for pipeline in configuration.get('Pipelines', []):
+            table_names = pipeline.get('backed_up_tables', [])
+
+            if pipeline['pipeline_id'] not in pipeline_ids or not table_names:
+                continue
+
+            if not all(table_name in success_flags and table_name in tables for table_name in table_names):
+                logger.info("Skipping pipeline {} as some of its tables failed.".format(pipeline['pipeline_id']))
+                continue
+
+            nodes = dict((x['tableName'], x) for x in pipeline['definition']['objects'] if 'tableName' in x)
+            finished = sorted((_to_epoch(success_flags[x]['LastModified']), x) for x in table_names)
+            started = _get_batch_start(success_flags[finished[0][1]])
+
+            if started is None:
+                continue
+
+            previous_end = started + EMR_BOOTSTRAP_TIME
+
+            for end, table_name in finished:
+                table = tables[table_name]
+                boost = boosts.get(table_name, {})
+                read_capacity_units = boost.get('ReadCapacityUnits',
+                                                table['ProvisionedThroughput']['ReadCapacityUnits'])
+                read_throughput_percent = float(boost.get(
+                    'ReadThroughputPercent', nodes.get(table_name, {}).get('readThroughputPercent',
+                                                                           INITIAL_READ_THROUGHPUT_PERCENT)))
+
+                self.observe(table_name, table['TableSizeBytes'], read_capacity_units, read_throughput_percent,
+                             end - previous_end - ACTIVITY_BOOTSTRAP_TIME)
+                previous_end = end
+
+    def accuracy_report(self):
+        """
+        :return: summary of last observed backups: {'Tables': count, 'ModelError': mean absolute percentage
+            error of the model, 'FormulaError': the same for estimate_backup_duration()}
+        """
+        if not self.accuracy:
+            return {'Tables': 0, 'ModelError': None, 'FormulaError': None}
+
+        def mean_error(key):
+            errors = [abs(x[key] - x['ActualSeconds']) / x['ActualSeconds'] for x in self.accuracy]
+            return round(100 * sum(errors) / len(errors), 1)
+
+        return {
+            'Tables': len(self.accuracy),
+            'ModelError': mean_error('PredictedSeconds'),
+            'FormulaError': mean_error('FormulaSeconds')
+        }
+
+
+def _get_batch_start(success_flag):
+    """
+    :return: epoch seconds of pipeline scheduled start, taken from the backup directory name
+    """
+    try:
+        return _to_epoch(datetime.strptime(success_flag['Key'].split('/')[-2], BACKUP_TIMESTAMP_FORMAT))
+    except (IndexError, ValueError):
+        return None
+
+
+def _to_epoch(date):
+    return calendar.timegm(date.utctimetuple())
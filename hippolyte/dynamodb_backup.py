@@ -1,14 +1,25 @@
 from __future__ import print_function
+import json
 import logging
 import re
-
+import time
+from urllib import unquote_plus
 from botocore.exceptions import ClientError
-from hippolyte.aws_utils import DataPipelineUtil, DynamoDBUtil
-from hippolyte.config_util import ConfigUtil
-from hippolyte.monitor import Monitor
-from hippolyte.pipeline_scheduler import Scheduler
+
+from hippolyte.aws_utils import DataPipelineUtil, DynamoDBUtil, S3Util, configure_clients
+from hippolyte.client_config import build_client_settings
+from hippolyte.config_util import ConfigUtil, reset_metadata_cache
+from hippolyte.description_cache import TableDescriptionCache, refresh_descriptions
+from hippolyte.duration_model import DurationModel
+from hippolyte.instrumentation import emit_record, get_record_key, get_recorder, phase, start_invocation
+from hippolyte.pipeline_states import reset_pipeline_state_poller
+from hippolyte.rate_limiter import get_rate_limiter_metrics
+from hippolyte.table_packing import DEFAULT_PACKING_STRATEGY
 from hippolyte.dynamodb_booster import DynamoDbBooster
-from hippolyte.utils import MAX_DURATION_SINGLE_PIPELINE, INITIAL_READ_THROUGHPUT_PERCENT, list_tables_in_definition
+from hippolyte.utils import MAX_DURATION_SINGLE_PIPELINE, INITIAL_READ_THROUGHPUT_PERCENT, DESCRIBE_TABLE_WORKERS, \
+    DEPLOY_PIPELINE_WORKERS, DATA_PIPELINE_CALLS_PER_SECOND, DESCRIPTION_CACHE_TTL, CAPACITY_CHANGE_WORKERS, \
+    MAX_DURATION_SEC, VERIFY_BACKUP_WORKERS, DESCRIBE_PIPELINE_WORKERS, MAX_CARRY_FORWARD_AGE, \
+    IN_PROCESS_EXPORT_WORKERS, SCAN_SEGMENTS, get_date_suffix
 from hippolyte.project_config import ACCOUNT_CONFIGS
 
 logger = logging.getLogger()
@@ -27,15 +38,44 @@ def _extract_from_arn(arn, position):
     return re.findall("(.*?):", arn)[position]
 
 
-def get_table_descriptions(exclude_from_backup, always_backup):
+def get_table_descriptions(exclude_from_backup, always_backup, workers=DESCRIBE_TABLE_WORKERS,
+                           description_cache=None):
     """
     Decides which tables should be backed up, based on their names.
     :param exclude_from_backup: list of regexp., matching tables will be skipped from backup
     :param always_backup: those tables will always be backed up, despite exclude_from_backup matching
-    :return: list of table names to backup
+    :param workers: how many tables to describe concurrently
+    :param description_cache: TableDescriptionCache, if given only new and stale tables are described
+    :return: list of table descriptions to backup, sorted by table name
     """
     dynamo_db_util = DynamoDBUtil()
-    table_names = dynamo_db_util.list_tables()
+    table_names = filter_table_names(dynamo_db_util.list_tables(), exclude_from_backup, always_backup)
+
+    if description_cache:
+        return description_cache.refresh(table_names, workers)
+
+    return dynamo_db_util.describe_tables(table_names, workers)
+
+
+def get_cached_table_descriptions(exclude_from_backup, always_backup, description_cache):
+    """
+    Same as get_table_descriptions, but only uses descriptions from the cache, without calling DynamoDB.
+    :return: list of table descriptions to backup, sorted by table name, empty if there is nothing cached
+    """
+    descriptions = {}
+
+    for description in description_cache.snapshot():
+        descriptions[description['Table']['TableName']] = description
+
+    table_names = filter_table_names(descriptions.keys(), exclude_from_backup, always_backup)
+
+    return [descriptions[table_name] for table_name in table_names]
+
+
+def filter_table_names(table_names, exclude_from_backup, always_backup):
+    """
+    :return: sorted table names, which are either in always_backup or not matching exclude_from_backup
+    """
     tables_filtered = set()
     patterns = map(lambda x: re.compile(x), exclude_from_backup)
 
@@ -43,7 +83,7 @@ def get_table_descriptions(exclude_from_backup, always_backup):
         if table_name in always_backup or _not_excluded(table_name, patterns):
             tables_filtered.add(table_name)
 
-    return dynamo_db_util.describe_tables(tables_filtered)
+    return sorted(tables_filtered)
 
 
 def _not_excluded(table_name, patterns):
@@ -77,65 +117,210 @@ def detect_action(event):
 
 
 def backup(**kwargs):
+    # imported here, as monitor runs, which are most of the invocations, don't need them
+    from hippolyte.backup_planner import BackupPlanner, format_plan, get_account_read_capacity_units
+    from hippolyte.change_detection import ChangeDetector, record_exports
+    from hippolyte.monitor import Monitor
+    from hippolyte.pipeline_deployer import PipelineDeployer
+    from hippolyte.pipeline_scheduler import Scheduler, route_tables
+    from hippolyte.table_exporter import get_export_location
+
     logger.info("Performing full DynamoDB backup task.")
+    plan = None
+    target_duration = MAX_DURATION_SEC
+    table_descriptions = kwargs['table_descriptions']
+
+    if kwargs['change_detection']:
+        logger.info("Looking for tables unchanged since their last backup.")
+
+        with phase('detect_changes'):
+            last_configuration = ConfigUtil().load_configuration(kwargs['backup_bucket'], sections=('Exports',))
+            change_detector = ChangeDetector(kwargs['backup_bucket'], (last_configuration or {}).get('Exports', []),
+                                             kwargs['max_carry_forward_age'])
+            table_descriptions, exports = change_detector.detect(table_descriptions)
+    else:
+        exports = record_exports(table_descriptions, time.time())
+
+    in_process_descriptions = []
+
+    if kwargs['in_process_export_max_size']:
+        table_descriptions, in_process_descriptions = route_tables(table_descriptions,
+                                                                   kwargs['in_process_export_max_size'],
+                                                                   kwargs['duration_model'])
+        # exported after pipelines are deployed, so their locations are recorded up front
+        export_timestamp = get_date_suffix()
+        in_process_tables = set(x['Table']['TableName'] for x in in_process_descriptions)
+
+        for export in exports:
+            if export['TableName'] in in_process_tables:
+                export.update(Backend='scan', Location=get_export_location(kwargs['backup_bucket'],
+                                                                           export['TableName'], export_timestamp))
+
+    with phase('refresh_descriptions'):
+        # throughput of backed up tables is kept in backup metadata and set back after the backup, so it can't come
+        # from descriptions cached hours ago
+        refresh_descriptions(table_descriptions)
+
+    # tables carried forward or exported in-process are neither boosted, nor is their auto scaling disabled
+    kwargs['dynamodb_booster'].table_descriptions = table_descriptions
+
+    if kwargs['joint_planning'] or kwargs['dry_run']:
+        logger.info("Planning pipelines and read capacity for {}s recovery window.".format(kwargs['recovery_window']))
+
+        with phase('plan_backup'):
+            limits = DynamoDBUtil().describe_limits()
+            account_read_capacity_units = get_account_read_capacity_units(kwargs['table_descriptions'], limits)
+            plan = BackupPlanner(table_descriptions, kwargs['recovery_window'], limits, kwargs['duration_model'],
+                                 account_read_capacity_units=account_read_capacity_units).plan()
+
+        target_duration = kwargs['recovery_window']
+        logger.info(format_plan(plan))
+
+        if kwargs['dry_run']:
+            logger.info("Dry run, no pipelines created and no throughputs changed.")
+            return plan
+
+        if not plan['Feasible']:
+            # boosts of such plan would fail over account read limit, while tables are packed as if boosted
+            logger.warn("Falling back to {} packing, as no plan meets recovery window within read capacity "
+                        "limits.".format(kwargs['packing_strategy']))
+            plan = None
+            target_duration = MAX_DURATION_SEC
+
     logger.info("Building pipeline definitions")
-    scheduler = Scheduler(kwargs['table_descriptions'], 'multiple.template', kwargs['emr_subnet'],
-                          kwargs['region'], kwargs['backup_bucket'], kwargs['log_bucket'])
-    pipeline_definitions = scheduler.build_pipeline_definitions()
+    scheduler = Scheduler(table_descriptions, 'multiple.template', kwargs['emr_subnet'],
+                          kwargs['region'], kwargs['backup_bucket'], kwargs['log_bucket'],
+                          packing_strategy=kwargs['packing_strategy'], duration_model=kwargs['duration_model'],
+                          target_duration=target_duration, plan=plan)
+    with phase('build_definitions'):
+        pipeline_definitions = scheduler.build_pipeline_definitions()
+
+    deployer = PipelineDeployer(kwargs['pipeline_util'], kwargs['deploy_workers'], kwargs['data_pipeline_rate'])
 
     logger.info("Creating pipelines.")
-    pipeline_descriptions = []
-    for definition in pipeline_definitions:
-        created = True
-
-        try:
-            response = kwargs['pipeline_util'].create_pipeline()
-        except ClientError as e:
-            if e.message == 'LimitExceededException':
-                logger.warn("Can't create more pipelines, as account limit exceeded. Details: {}"
-                      .format(e.message))
-
-            created = False
-            logger.warn("Can't create more pipelines. Details: {}".format(e.message))
-
-        if created:
-            pipeline_descriptions.append(
-                {
-                    'pipeline_id': response.get("pipelineId"),
-                    'backed_up_tables': list_tables_in_definition(definition),
-                    'definition': definition
-                }
-            )
+    with phase('create_pipelines'):
+        pipeline_descriptions = deployer.create_pipelines(pipeline_definitions)
 
     logger.info("Updating throughputs, to meet Time Point Objective.")
-    kwargs['dynamodb_booster'].boost_throughput(pipeline_descriptions, MAX_DURATION_SINGLE_PIPELINE)
+    with phase('boost_throughput'):
+        kwargs['dynamodb_booster'].boost_throughput(pipeline_descriptions, MAX_DURATION_SINGLE_PIPELINE, plan,
+                                                    exports)
 
-    for description in pipeline_descriptions:
-        pipeline_id = description["pipeline_id"]
-        pipeline_definition = description["definition"]
+    with phase('deploy_pipelines'):
+        summary = deployer.deploy_pipelines(pipeline_descriptions)
 
-        logger.info("Deploying pipeline definition to {}".format(pipeline_id))
-        kwargs['pipeline_util'].put_pipeline_definition(pipeline_id, pipeline_definition)
+    if summary['failed']:
+        with phase('remove_failed_pipelines'):
+            remove_failed_pipelines(deployer, kwargs['dynamodb_booster'], pipeline_descriptions, summary['failed'],
+                                    Monitor(kwargs['account'], kwargs['log_bucket'], kwargs['backup_bucket'],
+                                            kwargs['sns_endpoint']))
 
-        logger.info("Activating pipeline: {}".format(pipeline_id))
-        kwargs['pipeline_util'].activate_pipeline(pipeline_id, pipeline_definition)
+    if in_process_descriptions:
+        with phase('export_in_process'):
+            export_in_process(kwargs['backup_bucket'], in_process_descriptions, export_timestamp,
+                              kwargs['in_process_export_max_size'], kwargs['duration_model'], exports)
 
     logger.info("Finished dynamo db backup.")
 
 
+def remove_failed_pipelines(deployer, booster, pipeline_descriptions, failures, monitor):
+    """
+    Pipelines, which failed to deploy, never finish, so the monitor would neither restore their tables, nor delete
+    them. They're deleted, dropped from backup metadata and their tables restored straight away instead.
+    :param failures: as in summary returned from PipelineDeployer.deploy_pipelines()
+    """
+    failed_ids = set(x['pipeline_id'] for x in failures)
+    failed_descriptions = filter(lambda x: x['pipeline_id'] in failed_ids, pipeline_descriptions)
+
+    deployer.delete_pipelines(list(failed_ids))
+    booster.config_util.save_pipelines(booster.backup_bucket,
+                                       filter(lambda x: x['pipeline_id'] not in failed_ids, pipeline_descriptions))
+    booster.restore_tables_throughput([x for pipeline in failed_descriptions for x in pipeline['backed_up_tables']])
+    monitor.notify_about_failed_deployments(failures, failed_descriptions)
+
+
+def export_in_process(backup_bucket, table_descriptions, timestamp, max_size, duration_model, exports):
+    """
+    Exports tables routed away from pipelines, with whatever time is left in the invocation. Tables, which no
+    longer fit or fail to export, are marked as failed in the Exports section of backup metadata, so the monitor
+    notifies about them, and change detection exports them again with the next backup.
+    :param exports: Exports section of backup metadata, as saved before the export
+    """
+    from hippolyte.pipeline_scheduler import route_tables
+    from hippolyte.table_exporter import TableExporter
+
+    skipped_descriptions, table_descriptions = route_tables(table_descriptions, max_size, duration_model)
+    _, failed_descriptions = TableExporter(backup_bucket).export_tables(table_descriptions, timestamp)
+
+    for description in skipped_descriptions:
+        logger.error("Table {} wasn't backed up, as its in-process export didn't fit in the time left."
+                     .format(description['Table']['TableName']))
+
+    for description in failed_descriptions:
+        logger.error("Table {} wasn't backed up, as its in-process export failed."
+                     .format(description['Table']['TableName']))
+
+    failed_tables = set(x['Table']['TableName'] for x in skipped_descriptions + failed_descriptions)
+
+    if failed_tables:
+        for export in exports:
+            if export['TableName'] in failed_tables:
+                export['Failed'] = True
+
+        ConfigUtil().save_exports(backup_bucket, exports)
+
+
 def monitor(**kwargs):
+    from hippolyte.monitor import Monitor
+
     logger.info("Performing monitoring only this time.")
     logger.info("Restoring original throughputs.")
-    kwargs['dynamodb_booster'].restore_throughput()
+    with phase('restore_throughput'):
+        kwargs['dynamodb_booster'].restore_throughput()
 
-    finished_pipelines = ConfigUtil().list_finished_pipelines(kwargs['backup_bucket'])
-    for pipeline_id in finished_pipelines:
-        logger.info("Deleting finished pipeline: {}".format(pipeline_id))
-        kwargs['pipeline_util'].delete_pipeline(pipeline_id)
+    with phase('delete_pipelines'):
+        finished_pipelines = ConfigUtil().list_finished_pipelines(kwargs['backup_bucket'])
+        for pipeline_id in finished_pipelines:
+            logger.info("Deleting finished pipeline: {}".format(pipeline_id))
+            kwargs['pipeline_util'].delete_pipeline(pipeline_id)
 
     logger.info("Looking for failed backups.")
     monitor = Monitor(kwargs['account'], kwargs['log_bucket'], kwargs['backup_bucket'], kwargs['sns_endpoint'])
-    monitor.notify_about_failures(finished_pipelines)
+    with phase('notify_about_failures'):
+        monitor.notify_about_failures(finished_pipelines)
+
+    with phase('update_duration_model'):
+        update_duration_model(kwargs['duration_model'], monitor, finished_pipelines, kwargs['backup_bucket'])
+
+
+def update_duration_model(duration_model, monitor, finished_pipelines, backup_bucket):
+    """
+    Learns backup durations from pipelines, which finished since the last monitor run.
+    """
+    if not monitor.configuration or not finished_pipelines:
+        return
+
+    config_util = ConfigUtil()
+    configuration = dict(monitor.configuration,
+                         **(config_util.load_configuration(backup_bucket, sections=('Tables',)) or {}))
+
+    duration_model.observe_backups(configuration, config_util.load_boosts(backup_bucket), finished_pipelines,
+                                   monitor.success_flags)
+    logger.info("Backup duration model accuracy: {}".format(json.dumps(duration_model.accuracy_report(),
+                                                                       sort_keys=True)))
+    duration_model.save(backup_bucket)
+
+
+def publish_invocation_metrics(backup_bucket, store_in_bucket, **properties):
+    """
+    Logs phase durations and API call statistics of this invocation as a single CloudWatch Embedded Metric Format
+    record and optionally keeps it in backup_bucket, for trending.
+    """
+    record = get_recorder().record(RateLimiters=get_rate_limiter_metrics(), **properties)
+    emit_record(record)
+
+    if store_in_bucket:
+        S3Util().put_json(backup_bucket, get_record_key(record), record)
 
 
 def lambda_handler(event, context):
@@ -148,24 +333,137 @@ def lambda_handler(event, context):
     account_config = ACCOUNT_CONFIGS[account_id]
     exclude_from_backup = account_config.get('exclude_from_backup', [])
     always_backup = account_config.get('always_backup', [])
+    describe_table_workers = account_config.get('describe_table_workers', DESCRIBE_TABLE_WORKERS)
+    deploy_workers = account_config.get('deploy_workers', DEPLOY_PIPELINE_WORKERS)
+    capacity_change_workers = account_config.get('capacity_change_workers', CAPACITY_CHANGE_WORKERS)
+    description_cache = None
+    table_descriptions = None
+    action = detect_action(event)
+    start_invocation(context, Account=account_id, Action=action.__name__)
+    reset_pipeline_state_poller()
+    reset_metadata_cache()
+    configure_clients(build_client_settings(account_config.get('client_config'), max(
+        describe_table_workers, deploy_workers, capacity_change_workers, VERIFY_BACKUP_WORKERS,
+        DESCRIBE_PIPELINE_WORKERS, IN_PROCESS_EXPORT_WORKERS * SCAN_SEGMENTS)))
+
+    with phase('load_duration_model'):
+        duration_model = DurationModel.load(account_config['backup_bucket'])
+
+    if account_config.get('use_description_cache', True):
+        description_cache = TableDescriptionCache(account_config['backup_bucket'],
+                                                  account_config.get('description_cache_ttl', DESCRIPTION_CACHE_TTL))
+
+        if event.get('invalidate_description_cache'):
+            description_cache.invalidate()
+
+        if action == monitor:
+            logger.info("Using cached table descriptions.")
+            table_descriptions = get_cached_table_descriptions(exclude_from_backup, always_backup, description_cache)
+
+    if not table_descriptions:
+        logger.info("Describing tables in the account.")
+        with phase('describe_tables'):
+            table_descriptions = get_table_descriptions(exclude_from_backup, always_backup, describe_table_workers,
+                                                        description_cache)
+
+    try:
+        result = action(**{
+            'table_descriptions': table_descriptions,
+            'pipeline_util': DataPipelineUtil(),
+            'dynamodb_booster': DynamoDbBooster(table_descriptions,
+                                                account_config['backup_bucket'],
+                                                INITIAL_READ_THROUGHPUT_PERCENT,
+                                                capacity_change_workers,
+                                                duration_model),
+            'duration_model': duration_model,
+            'account': account_id,
+            'log_bucket': account_config['log_bucket'],
+            'sns_endpoint': get_sns_endpoint(context),
+            'backup_bucket': account_config['backup_bucket'],
+            'emr_subnet': account_config['emr_subnet'],
+            'packing_strategy': account_config.get('packing_strategy', DEFAULT_PACKING_STRATEGY),
+            'deploy_workers': deploy_workers,
+            'data_pipeline_rate': account_config.get('data_pipeline_rate', DATA_PIPELINE_CALLS_PER_SECOND),
+            'joint_planning': account_config.get('joint_planning', False),
+            'recovery_window': account_config.get('recovery_window', MAX_DURATION_SEC),
+            'change_detection': account_config.get('change_detection', False),
+            'max_carry_forward_age': account_config.get('max_carry_forward_age', MAX_CARRY_FORWARD_AGE),
+            'in_process_export_max_size': account_config.get('in_process_export_max_size', 0),
+            'dry_run': event.get('dry_run', False),
+            'region': _extract_from_arn(context.invoked_function_arn, 3)
+        })
+    finally:
+        # boosted throughput is kept in cached descriptions, even if the action failed half way
+        if description_cache:
+            with phase('save_description_cache'):
+                description_cache.save()
+
+    publish_invocation_metrics(account_config['backup_bucket'], account_config.get('store_invocation_metrics', False),
+                               Tables=len(table_descriptions))
+
+    return result
+
+
+def restore_handler(event, context):
+    """
+    Restores throughput of each table as soon as its export finished, on S3 object created events of _SUCCESS flags
+    in the backup bucket. Tables missed here are still restored by the monitor.
+    """
+    account_id = get_account(context)
 
-    logger.info("Describing tables in the account.")
-    table_descriptions = get_table_descriptions(exclude_from_backup, always_backup)
+    if account_id not in ACCOUNT_CONFIGS:
+        logger.error("Couldn't find configuration for {} in project_config.py.".format(account_id))
+        return
 
-    action = detect_action(event)
-    action(**{
-        'table_descriptions': table_descriptions,
-        'pipeline_util': DataPipelineUtil(),
-        'dynamodb_booster': DynamoDbBooster(table_descriptions,
-                                            account_config['backup_bucket'],
-                                            INITIAL_READ_THROUGHPUT_PERCENT),
-        'account': account_id,
-        'log_bucket': account_config['log_bucket'],
-        'sns_endpoint': get_sns_endpoint(context),
-        'backup_bucket': account_config['backup_bucket'],
-        'emr_subnet': account_config['emr_subnet'],
-        'region': _extract_from_arn(context.invoked_function_arn, 3)
-    })
+    account_config = ACCOUNT_CONFIGS[account_id]
+    start_invocation(context, Account=account_id, Action='restore_table')
+    reset_metadata_cache()
+    configure_clients(build_client_settings(account_config.get('client_config')))
+    results = []
+
+    for bucket, table_name, timestamp in get_finished_tables(event):
+        if bucket != account_config['backup_bucket']:
+            logger.warn("Ignoring {} backup in {}, as it's not the backup bucket.".format(table_name, bucket))
+            continue
+
+        logger.info("Backup of {} finished, restoring its throughput.".format(table_name))
+
+        with phase('describe_tables'):
+            try:
+                table_description = DynamoDBUtil().describe_table(table_name)
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'ResourceNotFoundException':
+                    raise
+
+                logger.warn("Can't restore throughput of {}, table was deleted".format(table_name))
+                continue
+
+        with phase('restore_throughput'):
+            booster = DynamoDbBooster([table_description], bucket, INITIAL_READ_THROUGHPUT_PERCENT)
+            results += booster.restore_table_throughput(table_name, timestamp)
+
+    publish_invocation_metrics(account_config['backup_bucket'], account_config.get('store_invocation_metrics', False),
+                               Tables=len(results))
+
+    return results
+
+
+def get_finished_tables(event):
+    """
+    :param event: S3 object created event
+    :return: list of (bucket, table_name, timestamp) of _SUCCESS flags in the event, written to
+        <table_name>/<timestamp>/
+    """
+    finished_tables = []
+
+    for record in event.get('Records', []):
+        bucket = record['s3']['bucket']['name']
+        key = unquote_plus(record['s3']['object']['key'])
+
+        if key.endswith('/_SUCCESS'):
+            finished_tables.append((bucket, key.split('/')[0], key.split('/')[1]))
+
+    return finished_tables
 
 # Uncomment to test monitor phase:
 # class Context(object):
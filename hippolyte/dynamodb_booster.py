@@ -2,108 +2,248 @@ from __future__ import print_function
 import logging
 from botocore.exceptions import ClientError
 from hippolyte.aws_utils import ApplicationAutoScalingUtil, DataPipelineUtil, DynamoDBUtil
+from hippolyte.capacity_executor import CapacityChangeExecutor, SUCCESSFUL_STATUSES, DECREASE_QUOTA_EXHAUSTED, \
+    capacity_change
 from hippolyte.config_util import ConfigUtil
+from hippolyte.description_cache import refresh_descriptions
+from hippolyte.duration_model import DurationModel
+from hippolyte.instrumentation import phase
 from hippolyte.utils import ACTIVITY_BOOTSTRAP_TIME, EMR_BOOTSTRAP_TIME, MAX_DURATION_SEC, \
-    MAX_ALLOWED_PROVISIONED_READ_THROUGHPUT, INITIAL_READ_THROUGHPUT_PERCENT, \
-    estimate_backup_duration, compute_required_throughput, get_first_element_in_the_list_with
+    MAX_ALLOWED_PROVISIONED_READ_THROUGHPUT, INITIAL_READ_THROUGHPUT_PERCENT, CAPACITY_CHANGE_WORKERS, \
+    compute_required_throughput
+
+READ_CAPACITY_DIMENSIONS = ('dynamodb:table:ReadCapacityUnits', 'dynamodb:index:ReadCapacityUnits')
+MAX_TARGETED_SCALING_POLICY_LOOKUPS = 20
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 
 class DynamoDbBooster(object):
-    def __init__(self, table_descriptions, backup_bucket, read_throughput_percent):
+    def __init__(self, table_descriptions, backup_bucket, read_throughput_percent,
+                 capacity_change_workers=CAPACITY_CHANGE_WORKERS, duration_model=None):
         self.table_descriptions = table_descriptions
         self.backup_bucket = backup_bucket
         self.read_throughput_percent = read_throughput_percent
+        self.duration_model = duration_model or DurationModel()
         self.dynamo_db_util = DynamoDBUtil()
         self.config_util = ConfigUtil()
         self.data_pipeline_util = DataPipelineUtil()
         self.application_auto_scaling_util = ApplicationAutoScalingUtil()
-
-    def boost_throughput(self, pipeline_descriptions, desired_backup_duration):
-        scaling_policies = self.list_dynamodb_scaling_policies()
-        scalable_targets = self.list_dynamodb_scalable_targets()
-        self.config_util.save_configuration(pipeline_descriptions, self.backup_bucket, self.table_descriptions,
-                                            scaling_policies, scalable_targets)
-        self.disable_auto_scaling(scaling_policies, scalable_targets)
+        self.capacity_executor = CapacityChangeExecutor(self.dynamo_db_util, capacity_change_workers)
+
+    def boost_throughput(self, pipeline_descriptions, desired_backup_duration, plan=None, exports=None):
+        """
+        :param plan: as returned from BackupPlanner.plan(), if given read capacity of tables is set as planned,
+        instead of being computed for each pipeline
+        :param exports: kept in backup metadata, as returned from ChangeDetector.detect()
+        :return: capacity change results, as returned from CapacityChangeExecutor.apply()
+        """
+        with phase('boost_throughput.list_auto_scaling'):
+            scalable_targets = self.list_dynamodb_scalable_targets()
+            scaling_policies = self.list_dynamodb_scaling_policies(scalable_targets)
+
+        with phase('boost_throughput.save_configuration'):
+            self.config_util.save_configuration(pipeline_descriptions, self.backup_bucket, self.table_descriptions,
+                                                scaling_policies, scalable_targets, exports)
+
+        with phase('boost_throughput.disable_auto_scaling'):
+            self.disable_auto_scaling(scaling_policies, scalable_targets)
 
         limits = self.dynamo_db_util.describe_limits()
-        total_increase = 0
+        descriptions_by_name = index_by_table_name(self.table_descriptions)
+        planned_boosts = []
 
         pipeline_definitions = map(lambda x: x['definition'], pipeline_descriptions)
 
         for nodes in pipeline_definitions:
-            total_increase += self._boost_single_pipeline(nodes.get('objects'), desired_backup_duration, limits)
+            if plan:
+                planned_boosts += self._apply_plan(nodes.get('objects'), plan, descriptions_by_name)
+            else:
+                planned_boosts += self._plan_pipeline_boost(nodes.get('objects'), desired_backup_duration, limits,
+                                                            descriptions_by_name)
+
+        with phase('boost_throughput.apply'):
+            results = self.capacity_executor.apply(map(lambda x: x[2], planned_boosts))
+
+        total_increase = 0
+        boosts = {}
+
+        for (node, throughput_percent, change), result in zip(planned_boosts, results):
+            if result['status'] in SUCCESSFUL_STATUSES:
+                self._set_read_capacity(change['description'], result['read_capacity_units'])
+                total_increase += result['read_capacity_units'] - result['previous_read_capacity_units']
+                boosts[node['tableName']] = {
+                    'ReadCapacityUnits': result['read_capacity_units'],
+                    'ReadThroughputPercent': float(node['readThroughputPercent'])
+                }
+                continue
+
+            node['readThroughputPercent'] = throughput_percent
+
+            if result['error_code'] == 'LimitExceededException':
+                logger.error("Can't meet RTO for {} as max account read capacity limit exceeded. Details: {}"
+                             .format(node['tableName'], result['error']))
+            else:
+                logger.error("Failed to increase table {} read capacity limit. Details: {}"
+                             .format(node['tableName'], result['error']))
 
         logger.info("Total throughput increase: {}".format(total_increase))
+        self.config_util.save_boosts(self.backup_bucket, boosts)
+
+        return results
 
     def restore_throughput(self):
-        last_configuration = self.config_util.load_configuration(self.backup_bucket)
+        with phase('restore_throughput.load_configuration'):
+            last_configuration = self.config_util.load_configuration(self.backup_bucket)
 
         if not last_configuration:
             logger.error("Couldn't find configuration file. Stopping throughput restore process.")
             return
 
-        self._restore_all_tables(last_configuration)
+        with phase('restore_throughput.restore_tables'):
+            self._restore_all_tables(last_configuration)
+
+        with phase('restore_throughput.reenable_auto_scaling'):
+            self.reenable_auto_scaling(last_configuration)
+
+    def restore_table_throughput(self, table_name, backup_timestamp=None):
+        """
+        Restores throughput and auto scaling of a single table as soon as its backup finished, instead of waiting
+        for the rest of its pipeline. Restored tables are left as they are by restore_throughput(), so it's safe
+        to call both, more than once.
+        :param backup_timestamp: directory the finished export was written to, in BACKUP_TIMESTAMP_FORMAT, exports
+            older than the latest backup metadata are left alone, as it doesn't describe throughput from before them
+        :return: capacity change results, as returned from CapacityChangeExecutor.apply()
+        """
+        with phase('restore_throughput.load_configuration'):
+            last_configuration = self.config_util.load_configuration(self.backup_bucket)
+            metadata_timestamp = self.config_util.load_backup_timestamp(self.backup_bucket)
+
+        if not last_configuration:
+            logger.error("Couldn't find configuration file. Stopping throughput restore process.")
+            return []
+
+        if backup_timestamp and metadata_timestamp and backup_timestamp < metadata_timestamp:
+            logger.info("Export of {} from {} is older than the last backup from {}, skipping throughput restore."
+                        .format(table_name, backup_timestamp, metadata_timestamp))
+            return []
 
-        self.reenable_auto_scaling(last_configuration)
+        if any(x['TableName'] == table_name and x.get('Backend') == 'scan' for x in last_configuration['Exports']):
+            logger.info("Table {} was exported in process, without a boost, skipping throughput restore."
+                        .format(table_name))
+            return []
+
+        backed_up_tables = set(x for pipeline in last_configuration['Pipelines'] for x in pipeline['backed_up_tables'])
+
+        if table_name not in backed_up_tables:
+            logger.info("Table {} is not part of the last backup, skipping throughput restore.".format(table_name))
+            return []
+
+        with phase('restore_throughput.restore_tables'):
+            results = self._restore_tables(last_configuration['Tables'], {table_name})
+
+        with phase('restore_throughput.reenable_auto_scaling'):
+            self.reenable_auto_scaling(last_configuration, {table_name})
+
+        return results
+
+    def restore_tables_throughput(self, table_names):
+        """
+        Restores throughput and auto scaling of tables left out of the backup after they were boosted, ex. as their
+        pipeline failed to deploy.
+        :return: capacity change results, as returned from CapacityChangeExecutor.apply()
+        """
+        last_configuration = self.config_util.load_configuration(self.backup_bucket)
+
+        if not last_configuration:
+            logger.error("Couldn't find configuration file. Stopping throughput restore process.")
+            return []
+
+        results = self._restore_tables(last_configuration['Tables'], set(table_names))
+        self.reenable_auto_scaling(last_configuration, set(table_names))
+
+        return results
 
     def _restore_all_tables(self, last_configuration):
         pipelines = last_configuration['Pipelines']
-        tables = last_configuration['Tables']
+        backed_up_tables = set(self.config_util.list_backed_up_tables(pipelines, self.backup_bucket))
 
-        backed_up_tables = self.config_util.list_backed_up_tables(pipelines, self.backup_bucket)
+        # cached descriptions may predate the boost, or a restore done since, so throughput is compared to current one
+        refresh_descriptions(filter(lambda x: x.get('Table', {}).get('TableName') in backed_up_tables,
+                                    self.table_descriptions),
+                             max_age=0, workers=self.capacity_executor.workers, dynamo_db_util=self.dynamo_db_util)
+
+        return self._restore_tables(last_configuration['Tables'], backed_up_tables)
+
+    def _restore_tables(self, tables, backed_up_tables):
+        """
+        :param tables: table descriptions from before the boost, as kept in backup metadata
+        :param backed_up_tables: names of tables to restore, other tables are left boosted
+        """
         previous_table_state = filter(lambda x: 'TableArn' in x['Table'], tables)
-        current_table_state = filter(lambda x: 'TableArn' in x['Table'], self.table_descriptions)
+        current_table_state = index_by_table_name(filter(lambda x: 'TableArn' in x['Table'], self.table_descriptions))
+        changes = []
 
-        logger.debug("Previous table state: {}".format(str(previous_table_state)))
-        logger.debug("Current table state: {}".format(str(current_table_state)))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Previous table state: {}".format(str(previous_table_state)))
+            logger.debug("Current table state: {}".format(str(current_table_state.values())))
 
         for previous_state in previous_table_state:
             previous_name, previous_throughput = self._get_name_and_capacity(previous_state)
+            current_state = current_table_state.get(previous_name)
 
-            if previous_name not in backed_up_tables:
+            if previous_name not in backed_up_tables or current_state is None:
                 continue
 
-            for current_state in current_table_state:
-                current_name, current_throughput = self._get_name_and_capacity(current_state)
-                logger.debug("current_name:{}, current_throughput:{}, previous_name:{}, previous_throughput:{}"
-                             .format(current_name, current_throughput, previous_name, previous_throughput))
-
-                if current_name == previous_name and current_throughput != previous_throughput:
-                    logger.info("Decreasing throughput of {} from {} to {}.".format(
-                        current_name, current_throughput, previous_throughput))
-
-                    try:
-                        self.dynamo_db_util.change_capacity_units(current_name, previous_throughput)
-                    except ClientError as e:
-                        if 'decreased' in e.message:
-                            logger.error("Can't decrease throughput of {}, max number of decreases for 24h reached."
-                                         .format(current_name))
-                        else:
-                            logger.error("Can't decrease throughput of {}, reason: ".format(e.message))
-
-    def _boost_single_pipeline(self, nodes, desired_backup_duration, limits):
+            current_name, current_throughput = self._get_name_and_capacity(current_state)
+            logger.debug("current_name:{}, current_throughput:{}, previous_name:{}, previous_throughput:{}"
+                         .format(current_name, current_throughput, previous_name, previous_throughput))
+
+            if current_throughput != previous_throughput:
+                logger.info("Decreasing throughput of {} from {} to {}.".format(
+                    current_name, current_throughput, previous_throughput))
+                changes.append(capacity_change(current_state, previous_throughput))
+
+        results = self.capacity_executor.apply(changes)
+
+        for change, result in zip(changes, results):
+            if result['status'] in SUCCESSFUL_STATUSES:
+                self._set_read_capacity(change['description'], result['read_capacity_units'])
+            elif result['status'] == DECREASE_QUOTA_EXHAUSTED:
+                logger.error("Can't decrease throughput of {}, max number of decreases for 24h reached."
+                             .format(result['table_name']))
+            else:
+                logger.error("Can't decrease throughput of {}, reason: {}".format(result['table_name'],
+                                                                                   result['error']))
+
+        return results
+
+    def _plan_pipeline_boost(self, nodes, desired_backup_duration, limits, descriptions_by_name):
+        """
+        Sets readThroughputPercent of pipeline nodes, without changing any tables yet.
+        :param descriptions_by_name: table descriptions, as returned from index_by_table_name()
+        :return: list of (node, previous readThroughputPercent, capacity change) for tables, which need a boost
+        """
         dynamo_db_nodes = filter(lambda x: 'tableName' in x, nodes)
         bootstrap_duration = EMR_BOOTSTRAP_TIME + ACTIVITY_BOOTSTRAP_TIME * len(dynamo_db_nodes)
         max_backup_duration = MAX_DURATION_SEC - bootstrap_duration
         total_backup_duration = 0
         table_durations = []
-        total_increase = 0
+        planned_boosts = []
 
         for node in dynamo_db_nodes:
-            table_description = filter(lambda x: x.get('Table', {}).get('TableName') == node['tableName'],
-                                       self.table_descriptions)[0]
+            table_description = descriptions_by_name[node['tableName']]
             table_size = table_description.get('Table', {}).get('TableSizeBytes')
             read_capacity_units = table_description.get('Table', {}).get('ProvisionedThroughput', {}) \
                 .get('ReadCapacityUnits', {})
-            duration = estimate_backup_duration(self.read_throughput_percent, table_size, read_capacity_units)
+            duration = self.duration_model.estimate(node['tableName'], table_size, read_capacity_units,
+                                                    self.read_throughput_percent)
             table_durations.append((node, table_description, read_capacity_units, duration))
             total_backup_duration += duration
 
         if total_backup_duration <= max_backup_duration:
-            return total_increase
+            return planned_boosts
 
         for node, description, read_capacity_units, duration in table_durations:
             target_duration = float(duration) * desired_backup_duration / total_backup_duration
@@ -111,31 +251,52 @@ class DynamoDbBooster(object):
                 duration, target_duration, read_capacity_units, INITIAL_READ_THROUGHPUT_PERCENT)
 
             read_limit = min(MAX_ALLOWED_PROVISIONED_READ_THROUGHPUT, limits['TableMaxReadCapacityUnits'])
+            capped = new_read_capacity_units > read_limit
 
-            if new_read_capacity_units > read_limit:
+            if capped:
                 logger.error("Can't meet RTO for {} as max table read capacity limit is {}, conntact aws support, "
                              "to increase it. ".format(node['tableName'], read_limit))
                 new_read_capacity_units = read_limit
 
+            if new_read_capacity_units <= read_capacity_units:
+                continue
+
             logger.info("Increasing throughput of {} from {} to {}.".format(
                 node['tableName'], read_capacity_units, new_read_capacity_units))
+            planned_boosts.append((node, node.get('readThroughputPercent'),
+                                   capacity_change(description, new_read_capacity_units, capped)))
             node['readThroughputPercent'] = str(new_throughput_percent)
 
-            try:
-                self.dynamo_db_util.change_capacity_units(node['tableName'], new_read_capacity_units)
-            except ClientError as e:
-                if e.message == 'LimitExceededException':
-                    logger.error("Can't meet RTO for {} as max account read capacity limit exceeded. Details: {}"
-                                 .format(node['tableName'], e.message))
-                else:
-                    logger.error("Failed to increase table {} read capacity limit. Details: {}"
-                                 .format(node['tableName'], e.message))
+        return planned_boosts
+
+    def _apply_plan(self, nodes, plan, descriptions_by_name):
+        """
+        Same as _plan_pipeline_boost, but read capacity comes from the plan. Pipeline nodes already have planned
+        readThroughputPercent, which is set back to read_throughput_percent if boost fails.
+        :return: list of (node, previous readThroughputPercent, capacity change) for tables, which need a boost
+        """
+        planned_boosts = []
 
-                new_read_capacity_units = read_capacity_units
+        for node in filter(lambda x: 'tableName' in x, nodes):
+            table_plan = plan['Tables'].get(node['tableName'])
+            description = descriptions_by_name[node['tableName']]
+            _, read_capacity_units = self._get_name_and_capacity(description)
 
-            total_increase += new_read_capacity_units - read_capacity_units
+            if not table_plan or table_plan['ReadCapacityUnits'] <= read_capacity_units:
+                continue
 
-        return total_increase
+            if table_plan['Capped']:
+                logger.error("Can't meet RTO for {} as max table read capacity limit is {}, conntact aws support, "
+                             "to increase it. ".format(node['tableName'], table_plan['ReadCapacityUnits']))
+
+            logger.info("Increasing throughput of {} from {} to {}.".format(
+                node['tableName'], read_capacity_units, table_plan['ReadCapacityUnits']))
+            planned_boosts.append((node, str(self.read_throughput_percent),
+                                   capacity_change(description, table_plan['ReadCapacityUnits'],
+                                                   table_plan['Capped'])))
+            node['readThroughputPercent'] = str(table_plan['ReadThroughputPercent'])
+
+        return planned_boosts
 
     def _get_name_and_capacity(self, state):
         table = state.get('Table', {})
@@ -144,22 +305,26 @@ class DynamoDbBooster(object):
 
         return name, throughput
 
+    def _set_read_capacity(self, state, read_capacity_units):
+        """
+        Keeps table descriptions in line with throughput changes made here,
+        as they are cached in between invocations.
+        """
+        state['Table']['ProvisionedThroughput']['ReadCapacityUnits'] = read_capacity_units
+
     def disable_auto_scaling(self, scaling_policies, scalable_targets):
         logger.info("Disabling autoscaling on backed up tables, for backup duration.")
+        policies_by_resource = index_by_resource_id(scaling_policies)
+        targets_by_resource = index_by_resource_id(scalable_targets)
 
-        for table in self.table_descriptions:
-            table_name = table.get('Table', {}).get('TableName')
-            resource_id = "table/{}".format(table_name)
-
-            read_scaling_policy = get_first_element_in_the_list_with(scaling_policies, 'ResourceId', resource_id)
-
-            if read_scaling_policy:
+        for table_name, resource_id in self._read_scaling_resource_ids():
+            for read_scaling_policy in policies_by_resource.get(resource_id, []):
                 logger.info("Removing scaling policy: {}".format(read_scaling_policy['PolicyName']))
 
                 try:
                     self.application_auto_scaling_util. \
                         delete_scaling_policy(read_scaling_policy['PolicyName'], "dynamodb",
-                                              resource_id, "dynamodb:table:ReadCapacityUnits")
+                                              resource_id, read_scaling_policy['ScalableDimension'])
                 except ClientError as e:
                     if 'No scaling policy found for service namespace' in e.message:
                         logger.warn("Can't delete scaling policy for: {}, as it does not exist".format(table_name))
@@ -167,13 +332,11 @@ class DynamoDbBooster(object):
                         logger.warn(
                             "Can't delete scaling policy for: {}, error: {}".format(table_name, e.message))
 
-            read_scalable_target = get_first_element_in_the_list_with(scalable_targets, 'ResourceId', resource_id)
-
-            if read_scalable_target:
+            for read_scalable_target in targets_by_resource.get(resource_id, []):
                 logger.info("Removing scalable target for: {}".format(resource_id))
                 try:
                     self.application_auto_scaling_util. \
-                        deregister_scalable_target("dynamodb", resource_id, "dynamodb:table:ReadCapacityUnits")
+                        deregister_scalable_target("dynamodb", resource_id, read_scalable_target['ScalableDimension'])
                 except ClientError as e:
                     if 'No scalable target found for service namespace' in e.message:
                         logger.warn("Can't delete scalable target for: {}, as it does not exist".format(table_name))
@@ -181,11 +344,18 @@ class DynamoDbBooster(object):
                         logger.warn(
                             "Can't delete scalable target for: {}, error: {}".format(table_name, e.message))
 
-    def reenable_auto_scaling(self, last_configuration):
+    def reenable_auto_scaling(self, last_configuration, table_names=None):
+        """
+        :param table_names: if given, auto scaling is only reenabled for those tables and their indexes
+        """
         logger.info("Reenabling autoscaling tables after backup.")
         scalable_targets = last_configuration['ScalableTargets']
         scaling_policies = last_configuration['ScalingPolicies']
 
+        if table_names is not None:
+            scalable_targets = filter(lambda x: get_table_name(x['ResourceId']) in table_names, scalable_targets)
+            scaling_policies = filter(lambda x: get_table_name(x['ResourceId']) in table_names, scaling_policies)
+
         for target in scalable_targets:
             logger.info("Adding scalable target for: {}".format(target['ResourceId']))
 
@@ -222,14 +392,79 @@ class DynamoDbBooster(object):
                         "Can't restore scaling policy for: {}, error: {}".format(target['ResourceId'], e.message))
 
     def list_dynamodb_scalable_targets(self):
+        """
+        :return: read capacity scalable targets of backed up tables and their global secondary indexes
+        """
+        resource_ids = map(lambda x: x[1], self._read_scaling_resource_ids())
         targets = self.application_auto_scaling_util \
-            .describe_scalable_targets("dynamodb").get('ScalableTargets', [])
+            .describe_scalable_targets("dynamodb", resource_ids).get('ScalableTargets', [])
         return self._only_return_rcu_dimension(targets)
 
-    def list_dynamodb_scaling_policies(self):
-        policies = self.application_auto_scaling_util \
-            .describe_scaling_policies("dynamodb").get('ScalingPolicies', [])
+    def list_dynamodb_scaling_policies(self, scalable_targets):
+        """
+        Scaling policies only exist for registered scalable targets, so only resources of scalable_targets are looked
+        up. One by one, if there are few of them, otherwise with a single scan of the namespace.
+        :param scalable_targets: as returned from list_dynamodb_scalable_targets()
+        :return: read capacity scaling policies of backed up tables and their global secondary indexes
+        """
+        if len(scalable_targets) <= MAX_TARGETED_SCALING_POLICY_LOOKUPS:
+            policies = []
+
+            for target in scalable_targets:
+                policies += self.application_auto_scaling_util.describe_scaling_policies(
+                    "dynamodb", target['ResourceId'], target['ScalableDimension']).get('ScalingPolicies', [])
+        else:
+            policies = self.application_auto_scaling_util \
+                .describe_scaling_policies("dynamodb").get('ScalingPolicies', [])
+
+        targets_by_resource = index_by_resource_id(scalable_targets)
+        policies = filter(lambda x: x['ResourceId'] in targets_by_resource, policies)
+
         return self._only_return_rcu_dimension(policies)
 
     def _only_return_rcu_dimension(self, _list):
-        return filter(lambda x: x.get('ScalableDimension') == 'dynamodb:table:ReadCapacityUnits', _list)
+        return filter(lambda x: x.get('ScalableDimension') in READ_CAPACITY_DIMENSIONS, _list)
+
+    def _read_scaling_resource_ids(self):
+        """
+        :return: list of (table_name, resource_id) of backed up tables and their global secondary indexes
+        """
+        resource_ids = []
+
+        for description in self.table_descriptions:
+            table = description.get('Table', {})
+            table_name = table.get('TableName')
+            resource_ids.append((table_name, "table/{}".format(table_name)))
+
+            for index in table.get('GlobalSecondaryIndexes', []):
+                resource_ids.append((table_name, "table/{}/index/{}".format(table_name, index['IndexName'])))
+
+        return resource_ids
+
+
+def index_by_table_name(table_descriptions):
+    """
+    :param table_descriptions: describe_table outputs
+    :return: {table_name: table_description}
+    """
+    return dict((x.get('Table', {}).get('TableName'), x) for x in table_descriptions)
+
+
+def index_by_resource_id(scaling_items):
+    """
+    :param scaling_items: scalable targets or scaling policies
+    :return: {resource_id: [items of that resource]}
+    """
+    index = {}
+
+    for item in scaling_items:
+        index.setdefault(item['ResourceId'], []).append(item)
+
+    return index
+
+
+def get_table_name(resource_id):
+    """
+    :param resource_id: application auto scaling resource id of a table or of its index, ex. table/name/index/index
+    """
+    return resource_id.split('/')[1]
@@ -0,0 +1,215 @@
+from __future__ import print_function
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+from hippolyte.rate_limiter import is_throttling_error_code
+from hippolyte.utils import BACKUP_TIMESTAMP_FORMAT
+
+METRICS_NAMESPACE = 'Hippolyte'
+INVOCATION_METRICS_PREFIX = 'invocation_metrics'
+
+_recorder = None
+_recorder_lock = threading.Lock()
+
+
+def get_recorder():
+    """
+    :return: InvocationRecorder of the current invocation, shared by all modules and threads
+    """
+    global _recorder
+
+    with _recorder_lock:
+        if _recorder is None:
+            _recorder = InvocationRecorder()
+
+        return _recorder
+
+
+def start_invocation(context=None, **dimensions):
+    """
+    Starts recording a new invocation, dropping whatever was recorded before, as Lambda reuses the process.
+    :param context: Lambda context of the invocation, if given its remaining time is known to get_remaining_seconds()
+    :param dimensions: CloudWatch dimensions of the invocation, ex. Account, Action
+    :return: InvocationRecorder of the new invocation
+    """
+    global _recorder
+
+    with _recorder_lock:
+        _recorder = InvocationRecorder(dimensions, getattr(context, 'get_remaining_time_in_millis', None))
+
+        return _recorder
+
+
+def get_remaining_seconds():
+    """
+    :return: seconds left before the current invocation times out, None if not known, ex. outside of Lambda
+    """
+    return get_recorder().remaining_seconds()
+
+
+def phase(name):
+    """
+    Context manager timing a phase of the current invocation, ex. with phase('describe_tables'): ...
+    Names aren't nested automatically, by convention phases inside other phases are given the outer phase name
+    as prefix at the call site, ex. phase('boost_throughput.apply') inside phase('boost_throughput').
+    """
+    return get_recorder().phase(name)
+
+
+def instrument_client(client):
+    """
+    Records count, latency, retries, throttles and errors of every API call made by a boto3 client,
+    including each page fetched by its paginators, in the recorder of the current invocation.
+    """
+    client.meta.events.register('before-call', _before_call)
+    client.meta.events.register('needs-retry', _needs_retry)
+    client.meta.events.register('after-call', _after_call)
+
+    return client
+
+
+def _before_call(context=None, **kwargs):
+    if context is not None:
+        context['instrumentation_started'] = time.time()
+
+
+def _needs_retry(event_name=None, response=None, caught_exception=None, **kwargs):
+    parsed = response[1] if response else {}
+    get_recorder().record_attempt(event_name.split('.', 1)[1], parsed, caught_exception)
+
+
+def _after_call(model=None, parsed=None, context=None, **kwargs):
+    started = (context or {}).get('instrumentation_started')
+    api = '{}.{}'.format(model.service_model.endpoint_prefix, model.name)
+    get_recorder().record_call(api, parsed, time.time() - started if started else 0.0)
+
+
+class InvocationRecorder(object):
+    def __init__(self, dimensions=None, get_remaining_time_in_millis=None):
+        """
+        Phase durations and AWS API call statistics of a single Lambda invocation.
+        :param dimensions: CloudWatch dimensions, ex. {'Account': '123456789012', 'Action': 'backup'}
+        :param get_remaining_time_in_millis: method of the Lambda context, telling how long the invocation can run
+        """
+        self.dimensions = dimensions or {}
+        self.get_remaining_time_in_millis = get_remaining_time_in_millis
+        self.started = time.time()
+        self.phases = {}
+        self.api = {}
+        self._lock = threading.Lock()
+
+    def remaining_seconds(self):
+        if self.get_remaining_time_in_millis is None:
+            return None
+
+        return self.get_remaining_time_in_millis() / 1000.0
+
+    @contextmanager
+    def phase(self, name):
+        started = time.time()
+
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.phases[name] = self.phases.get(name, 0.0) + time.time() - started
+
+    def record_attempt(self, api, parsed, caught_exception):
+        """
+        Called after every attempt of a call, including the ones botocore retries.
+        """
+        error = (parsed or {}).get('Error', {})
+
+        with self._lock:
+            stats = self._get_api_stats(api)
+            stats['Attempts'] += 1
+
+            if is_throttling_error_code(error.get('Code'), error.get('Message')):
+                stats['Throttles'] += 1
+
+            if caught_exception is not None:
+                stats['ConnectionErrors'] += 1
+
+    def record_call(self, api, parsed, seconds):
+        """
+        Called once per call, after botocore gave up retrying it.
+        """
+        with self._lock:
+            stats = self._get_api_stats(api)
+            stats['Calls'] += 1
+            stats['Seconds'] += seconds
+            stats['MaxSeconds'] = max(stats['MaxSeconds'], seconds)
+
+            if 'Error' in (parsed or {}):
+                stats['Errors'] += 1
+
+    def _get_api_stats(self, api):
+        if api not in self.api:
+            self.api[api] = {'Calls': 0, 'Attempts': 0, 'Throttles': 0, 'Errors': 0, 'ConnectionErrors': 0,
+                             'Seconds': 0.0, 'MaxSeconds': 0.0}
+
+        return self.api[api]
+
+    def record(self, **properties):
+        """
+        :param properties: additional properties of the record, not published as metrics
+        :return: invocation summary in CloudWatch Embedded Metric Format, metrics are total duration,
+            API call totals and duration of each phase
+        """
+        with self._lock:
+            phases = dict((name, round(seconds, 3)) for name, seconds in self.phases.items())
+            api = {}
+
+            for name, stats in self.api.items():
+                api[name] = dict(stats, Seconds=round(stats['Seconds'], 3),
+                                 MaxSeconds=round(stats['MaxSeconds'], 3),
+                                 Retries=max(stats['Attempts'] - stats['Calls'], 0))
+
+        metrics = {
+            'Duration': round(time.time() - self.started, 3),
+            'ApiCalls': sum(x['Calls'] for x in api.values()),
+            'ApiRetries': sum(x['Retries'] for x in api.values()),
+            'ApiThrottles': sum(x['Throttles'] for x in api.values()),
+            'ApiErrors': sum(x['Errors'] for x in api.values())
+        }
+        units = dict((name, 'Count') for name in metrics)
+        units['Duration'] = 'Seconds'
+
+        for name, seconds in phases.items():
+            metrics['Phase.{}'.format(name)] = seconds
+            units['Phase.{}'.format(name)] = 'Seconds'
+
+        record = dict(properties)
+        record.update(self.dimensions)
+        record.update(metrics)
+        record['Phases'] = phases
+        record['Api'] = api
+        record['_aws'] = {
+            'Timestamp': int(self.started * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': METRICS_NAMESPACE,
+                'Dimensions': [sorted(self.dimensions)],
+                'Metrics': [{'Name': name, 'Unit': units[name]} for name in sorted(metrics)]
+            }]
+        }
+
+        return record
+
+
+def emit_record(record):
+    """
+    Prints record as a single line, as CloudWatch only extracts metrics from log events, which are pure JSON.
+    """
+    print(json.dumps(record, sort_keys=True))
+
+
+def get_record_key(record):
+    """
+    :return: S3 key, under which record is kept for trending, ex. invocation_metrics/backup/2018-01-01-00-10-00.json
+    """
+    started = time.gmtime(record['_aws']['Timestamp'] / 1000)
+
+    return '{}/{}/{}.json'.format(INVOCATION_METRICS_PREFIX, record.get('Action', 'unknown'),
+                                  time.strftime(BACKUP_TIMESTAMP_FORMAT, started))
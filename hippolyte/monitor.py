@@ -1,16 +1,24 @@
 from __future__ import print_function
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 import logging
+import math
+import re
 from hippolyte.aws_utils import S3Util, SnsUtil
 from hippolyte.config_util import ConfigUtil
-from hippolyte.utils import TIME_IN_BETWEEN_BACKUPS
+from hippolyte.instrumentation import phase
+from hippolyte.utils import TIME_IN_BETWEEN_BACKUPS, VERIFY_BACKUP_WORKERS
+
+BACKUP_TIMESTAMP_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}-\d{2}-\d{2}-\d{2}$')
+# listed in place of pipeline id, for tables exported by the backup function itself
+IN_PROCESS_EXPORTS = 'in-process exports'
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 
 class Monitor(object):
-    def __init__(self, account, log_bucket, backup_bucket, sns_endpoint):
+    def __init__(self, account, log_bucket, backup_bucket, sns_endpoint, workers=VERIFY_BACKUP_WORKERS):
         self.account = account
         self.log_bucket = log_bucket
         self.backup_bucket = backup_bucket
@@ -18,9 +26,20 @@ class Monitor(object):
         self.config_util = ConfigUtil()
         self.s3_util = S3Util()
         self.sns_util = SnsUtil()
+        self.workers = workers
+        self.configuration = None
+        self.success_flags = {}
 
     def notify_about_failures(self, pipelines):
-        configuration = self.config_util.load_configuration(self.backup_bucket)
+        with phase('notify_about_failures.load_configuration'):
+            configuration = self.config_util.load_configuration(self.backup_bucket, sections=('Pipelines', 'Exports'))
+
+        self.configuration = configuration
+
+        if configuration:
+            # tables carried forward weren't exported by any pipeline, their last backup is still valid
+            carried_forward = filter(lambda x: x['CarriedForward'], configuration['Exports'])
+            logger.info("{} tables unchanged since their last backup.".format(len(carried_forward)))
 
         if not configuration:
             logger.info("Couldn't find configuration file. Stopping throughput restore process, sending email.")
@@ -43,6 +62,11 @@ class Monitor(object):
             if failed_tables:
                 pipeline_failed_tables[finished_pipeline[0]['pipeline_id']] = failed_tables
 
+        in_process_failed_tables = self.extract_failed_exports(configuration['Exports']) if configuration else []
+
+        if in_process_failed_tables:
+            pipeline_failed_tables[IN_PROCESS_EXPORTS] = in_process_failed_tables
+
         if pipeline_failed_tables:
             logger.info('Some tables were not backed up properly: {}'.format(str(pipeline_failed_tables)))
             logger.info('Sending sns notification about failures.')
@@ -54,48 +78,118 @@ class Monitor(object):
             )
             self.send_notification_email(email_body)
 
+    def notify_about_failed_deployments(self, failures, pipeline_descriptions):
+        """
+        :param failures: as in summary returned from PipelineDeployer.deploy_pipelines()
+        :param pipeline_descriptions: descriptions of failed pipelines, with tables they were to back up
+        """
+        tables_by_pipeline = dict((x['pipeline_id'], x['backed_up_tables']) for x in pipeline_descriptions)
+        description = ''
+
+        for failure in failures:
+            description += "{}: {}\n    failed at {}: {}\n".format(
+                failure['pipeline_id'], ",".join(tables_by_pipeline.get(failure['pipeline_id'], [])),
+                failure['stage'], failure['error'])
+
+        logger.info('Sending sns notification about {} pipelines, which failed to deploy.'.format(len(failures)))
+        email_body = failed_pipeline_deployment_email_template.format(
+            account=self.account,
+            description=description,
+            log_bucket=self.log_bucket
+        )
+        self.send_notification_email(email_body)
+
     def extract_failed_tables(self, pipeline):
         objects = pipeline.get('definition', {'objects': []}).get('objects', [])
         s3_attributes = filter(lambda x: 'directoryPath' in x, objects)
-        failed_tables = []
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+
+        try:
+            with phase('notify_about_failures.verify_backups'):
+                verified = list(executor.map(self.verify_backup, s3_attributes))
+        finally:
+            executor.shutdown()
 
-        for s3_attribute in s3_attributes:
+        return [table_name for table_name, succeeded in verified if not succeeded]
 
-            protocol, _, bucket, table_name, timestamp = s3_attribute['directoryPath'].split('/')
+    def extract_failed_exports(self, exports):
+        """
+        Verifies tables exported in-process by the last backup, which weren't verified yet. They're marked as verified
+        in backup metadata, so each failure is notified about once.
+        :param exports: Exports section of backup metadata
+        :return: names of tables, which failed to export in-process
+        """
+        unverified = filter(lambda x: x.get('Backend') == 'scan' and not x['CarriedForward'] and not x.get('Verified'),
+                            exports)
 
-            backup_archive = self.s3_util.list_objects(
-                bucket, table_name
-            ).get("Contents", [])
+        if not unverified:
+            return []
 
-            backup_archive = sorted(backup_archive, key=lambda x: x['LastModified'], reverse=True)
+        executor = ThreadPoolExecutor(max_workers=self.workers)
 
-            if not backup_archive:
-                failed_tables.append(table_name)
-                continue
+        try:
+            with phase('notify_about_failures.verify_exports'):
+                verified = list(executor.map(self.verify_export, unverified))
+        finally:
+            executor.shutdown()
 
-            success_flag = get_first_success_flag(backup_archive)
+        for export in unverified:
+            export['Verified'] = True
 
-            if not success_flag:
-                failed_tables.append(table_name)
-                continue
+        self.config_util.save_exports(self.backup_bucket, exports)
 
-            if not is_backup_from_current_batch(success_flag):
-                failed_tables.append(table_name)
-                continue
+        return [table_name for table_name, succeeded in verified if not succeeded]
 
-        return failed_tables
+    def verify_export(self, export):
+        """
+        :param export: entry of Exports section of backup metadata, of a table exported in-process
+        :return: (table_name, True if table was backed up successfully)
+        """
+        if export.get('Failed'):
+            return export['TableName'], False
+
+        protocol, _, bucket, prefix = export['Location'].split('/', 3)
+        success_flag = self.s3_util.find_object_with_suffix(bucket, prefix, '_SUCCESS')
+
+        return export['TableName'], bool(success_flag and is_backup_from_current_batch(success_flag))
+
+    def verify_backup(self, s3_attribute):
+        """
+        Looks for _SUCCESS flag of the current batch, listing only prefixes the current batch could have written to.
+        Flags found are kept in success_flags.
+        :param s3_attribute: S3DataNode of the backed up table
+        :return: (table_name, True if table was backed up successfully)
+        """
+        protocol, _, bucket, table_name, timestamp = s3_attribute['directoryPath'].split('/')
+
+        for prefix in get_backup_batch_prefixes(table_name, timestamp):
+            success_flag = self.s3_util.find_object_with_suffix(bucket, prefix, '_SUCCESS')
+
+            if success_flag and is_backup_from_current_batch(success_flag):
+                self.success_flags[table_name] = success_flag
+                return table_name, True
+
+        return table_name, False
 
     def send_notification_email(self, email_body):
         email_subject = email_subject_template.format(account=self.account)
         self.sns_util.publish(self.sns_endpoint, email_subject, email_body)
 
 
-def get_first_success_flag(backup_dir_contents):
-    for content in backup_dir_contents:
-        if content['Key'].endswith('_SUCCESS'):
-            return content
+def get_backup_batch_prefixes(table_name, timestamp):
+    """
+    :param table_name: backed up table
+    :param timestamp: last part of directoryPath, either a timestamp or a
+        #{format(@scheduledStartTime, ...)} expression, evaluated by data pipeline at runtime
+    :return: S3 prefixes, which could hold backup from the current batch, newest first
+    """
+    if BACKUP_TIMESTAMP_PATTERN.match(timestamp):
+        return ['{}/{}/'.format(table_name, timestamp)]
+
+    now = datetime.utcnow()
+    days = int(math.ceil(TIME_IN_BETWEEN_BACKUPS / 86400.0))
 
-    return None
+    return ['{}/{}'.format(table_name, (now - timedelta(days=day)).strftime('%Y-%m-%d')) for day in range(days + 1)]
 
 
 failed_table_backup_email_template = """
@@ -114,6 +208,23 @@ Best regards,
 Hippolyte
 """
 
+failed_pipeline_deployment_email_template = """
+Hello
+
+You have been notified, as some of tables in {account} account won't be backed up today, because their pipelines
+failed to deploy. Pipelines were deleted and throughput of their tables restored.
+Please find details below:
+
+Pipeline Id: Tables
+
+{description}
+
+Please check logs in: {log_bucket} for details.
+
+Best regards,
+Hippolyte
+"""
+
 email_subject_template = "Failed to backup DynamoDB tables in {account} account."
 
 all_failed_backup_email_template = """
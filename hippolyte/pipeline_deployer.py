@@ -0,0 +1,130 @@
+from __future__ import print_function
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+from hippolyte.rate_limiter import get_rate_limiter
+from hippolyte.utils import DEPLOY_PIPELINE_WORKERS, DATA_PIPELINE_CALLS_PER_SECOND, list_tables_in_definition
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+class PipelineDeployer(object):
+    def __init__(self, pipeline_util, workers=DEPLOY_PIPELINE_WORKERS, rate_budget=DATA_PIPELINE_CALLS_PER_SECOND):
+        """
+        Creates, defines and activates data pipelines concurrently.
+        :param pipeline_util: DataPipelineUtil used for API calls
+        :param workers: how many pipelines to work on at the same time
+        :param rate_budget: max number of DataPipeline API calls per second, shared by all workers
+        """
+        self.pipeline_util = pipeline_util
+        self.workers = workers
+        get_rate_limiter('datapipeline').set_max_rate(rate_budget)
+
+    def create_pipelines(self, pipeline_definitions):
+        """
+        :param pipeline_definitions: definitions, as returned from Scheduler.build_pipeline_definitions()
+        :return: pipeline descriptions of successfully created pipelines, in definitions order
+        """
+        results = self._map(self._create_pipeline, pipeline_definitions)
+        failed = len(filter(lambda x: x is None, results))
+
+        if failed:
+            logger.warn("Failed to create {} out of {} pipelines.".format(failed, len(pipeline_definitions)))
+
+        return filter(lambda x: x is not None, results)
+
+    def deploy_pipelines(self, pipeline_descriptions):
+        """
+        Uploads definitions and activates pipelines. Failure of a single pipeline doesn't stop the others.
+        :param pipeline_descriptions: as returned from create_pipelines()
+        :return: summary: {'succeeded': [pipeline_id], 'failed': [{'pipeline_id', 'stage', 'error'}]}
+        """
+        summary = {
+            'succeeded': [],
+            'failed': []
+        }
+
+        for pipeline_id, failure in self._map(self._deploy_pipeline, pipeline_descriptions):
+            if failure:
+                summary['failed'].append(failure)
+            else:
+                summary['succeeded'].append(pipeline_id)
+
+        logger.info("Deployed {} pipelines, {} failed.".format(len(summary['succeeded']), len(summary['failed'])))
+
+        for failure in summary['failed']:
+            logger.error("Pipeline {} failed at {}: {}".format(failure['pipeline_id'], failure['stage'],
+                                                               failure['error']))
+
+        return summary
+
+    def delete_pipelines(self, pipeline_ids):
+        """
+        Deletes pipelines concurrently, ex. ones which failed to deploy. Failure of a single pipeline is only logged.
+        """
+        def delete_pipeline(pipeline_id):
+            try:
+                logger.info("Deleting pipeline: {}".format(pipeline_id))
+                self.pipeline_util.delete_pipeline(pipeline_id)
+            except ClientError as e:
+                logger.error("Failed to delete pipeline {}: {}".format(pipeline_id, e.message))
+
+        self._map(delete_pipeline, pipeline_ids)
+
+    def _create_pipeline(self, definition):
+        try:
+            response = self.pipeline_util.create_pipeline()
+        except ClientError as e:
+            if 'LimitExceeded' in e.message:
+                logger.warn("Can't create more pipelines, as account limit exceeded. Details: {}".format(e.message))
+            else:
+                logger.warn("Can't create more pipelines. Details: {}".format(e.message))
+
+            return None
+
+        return {
+            'pipeline_id': response.get("pipelineId"),
+            'backed_up_tables': list_tables_in_definition(definition),
+            'definition': definition
+        }
+
+    def _deploy_pipeline(self, description):
+        pipeline_id = description["pipeline_id"]
+        pipeline_definition = description["definition"]
+        stage = 'put_pipeline_definition'
+
+        try:
+            logger.info("Deploying pipeline definition to {}".format(pipeline_id))
+            response = self.pipeline_util.put_pipeline_definition(pipeline_id, pipeline_definition)
+
+            if response and response.get('errored'):
+                raise PipelineDeploymentError(response.get('validationErrors'))
+
+            stage = 'activate_pipeline'
+            logger.info("Activating pipeline: {}".format(pipeline_id))
+            self.pipeline_util.activate_pipeline(pipeline_id, pipeline_definition)
+        except (ClientError, PipelineDeploymentError) as e:
+            return pipeline_id, {
+                'pipeline_id': pipeline_id,
+                'stage': stage,
+                'error': e.message
+            }
+
+        return pipeline_id, None
+
+    def _map(self, func, items):
+        executor = ThreadPoolExecutor(max_workers=max(self.workers, 1))
+
+        try:
+            return list(executor.map(func, items))
+        finally:
+            executor.shutdown()
+
+
+class PipelineDeploymentError(Exception):
+    def __init__(self, validation_errors):
+        message = "Pipeline definition has validation errors: {}".format(validation_errors)
+        super(PipelineDeploymentError, self).__init__(message)
+        self.message = message
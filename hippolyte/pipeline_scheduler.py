@@ -1,56 +1,28 @@
 from __future__ import print_function
 
-import json
+import heapq
 import logging
 import math
-import os
-import pystache
 
+from hippolyte.cluster_sizing import choose_cluster
+from hippolyte.duration_model import DurationModel
+from hippolyte.instrumentation import get_remaining_seconds, phase
+from hippolyte.pipeline_template import load_pipeline_template
+from hippolyte.table_packing import DEFAULT_PACKING_STRATEGY, get_packing_strategy
 from hippolyte.utils import EMR_BOOTSTRAP_TIME, MAX_DURATION_SEC, ACTIVITY_BOOTSTRAP_TIME, \
-    MAX_TABLES_PER_PIPELINE, INITIAL_READ_THROUGHPUT_PERCENT, estimate_backup_duration, get_date_suffix
+    MAX_TABLES_PER_PIPELINE, INITIAL_READ_THROUGHPUT_PERCENT, IN_PROCESS_EXPORT_BUDGET, IN_PROCESS_EXPORT_WORKERS, \
+    IN_PROCESS_EXPORT_OVERHEAD, INVOCATION_SAFETY_MARGIN, get_date_suffix
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 
-CLUSTER_CONFIGS = [
-    {
-        'masterInstanceType': 'm1.medium',
-        'coreInstanceType': 'm1.medium',
-        'coreInstanceCount': 1,
-        'clusterMemory': '--yarn-key-value,yarn.nodemanager.resource.memory-mb=2048,'
-                         '--yarn-key-value,yarn.scheduler.maximum-allocation-mb=2048,'
-                         '--yarn-key-value,yarn.scheduler.minimum-allocation-mb=256,'
-                         '--yarn-key-value,yarn.app.mapreduce.am.resource.mb=1024,'
-                         '--mapred-key-value,mapreduce.map.memory.mb=768,'
-                         '--mapred-key-value,mapreduce.map.java.opts=-Xmx512M,'
-                         '--mapred-key-value,mapreduce.reduce.memory.mb=1024,'
-                         '--mapred-key-value,mapreduce.reduce.java.opts=-Xmx768m,'
-                         '--mapred-key-value,mapreduce.map.speculative=false',
-        'maxTotalDynamoDbSizeBytes': 597688320  # 570MB
-    },
-    {
-        'masterInstanceType': 'm3.xlarge',
-        'coreInstanceType': 'm3.xlarge',
-        'coreInstanceCount': 1,
-        'clusterMemory': '--yarn-key-value,yarn.nodemanager.resource.memory-mb=11520,'
-                         '--yarn-key-value,yarn.scheduler.maximum-allocation-mb=11520,'
-                         '--yarn-key-value,yarn.scheduler.minimum-allocation-mb=1440,'
-                         '--yarn-key-value,yarn.app.mapreduce.am.resource.mb=2880,'
-                         '--mapred-key-value,mapreduce.map.memory.mb=5760,'
-                         '--mapred-key-value,mapreduce.map.java.opts=-Xmx4608M,'
-                         '--mapred-key-value,mapreduce.reduce.memory.mb=2880,'
-                         '--mapred-key-value,mapreduce.reduce.java.opts=-Xmx2304m,'
-                         '--mapred-key-value,mapreduce.map.speculative=false',
-        'maxTotalDynamoDbSizeBytes': 1099511627776000  # 1PB
-    }
-]
-
-
 class Scheduler(object):
     def __init__(self, table_descriptions, template_file, subnet_id, region,
                  s3_backup_bucket, s3_pipeline_log_bucket, max_retries=2,
-                 read_throughput_percent=INITIAL_READ_THROUGHPUT_PERCENT):
+                 read_throughput_percent=INITIAL_READ_THROUGHPUT_PERCENT,
+                 packing_strategy=DEFAULT_PACKING_STRATEGY, duration_model=None,
+                 target_duration=MAX_DURATION_SEC, plan=None):
         """
         :param table_descriptions: descriptions, as returned from DynamoDBUtil.describe_tables()
         :param template_file: path to template file
@@ -60,6 +32,12 @@ class Scheduler(object):
         :param s3_backup_bucket: S3 location, where backup files go
         :param s3_pipeline_log_bucket: S3 location, where pipeline logs go
         :param max_retries: how many times to retry pipeline execution on error, before giving up
+        :param packing_strategy: how to assign tables to pipelines, one of table_packing.PACKING_STRATEGIES
+        :param duration_model: DurationModel learned from past backups, estimates come from table size only if not given
+        :param target_duration: how long may backing up tables of a single pipeline take, clusters are sized to
+        keep up with the estimated duration of each pipeline, if it's shorter
+        :param plan: as returned from BackupPlanner.plan(), if given tables are assigned to pipelines and read
+        with readThroughputPercent as planned, instead of using packing_strategy
         :return:
         """
         self.table_descriptions = table_descriptions
@@ -72,6 +50,10 @@ class Scheduler(object):
         self.max_retries = max_retries
         self.s3_log_location = '{}/logs/{}'.format(s3_pipeline_log_bucket, get_date_suffix())
         self.terminate_after = int(math.ceil(MAX_DURATION_SEC / 3600.0)) + 1
+        self.pack_tables = get_packing_strategy(packing_strategy)
+        self.duration_model = duration_model or DurationModel()
+        self.target_duration = target_duration
+        self.plan = plan
 
     def build_pipeline_definitions(self):
         """
@@ -79,20 +61,13 @@ class Scheduler(object):
         Does it by combining template with parameter list.
         :return: list of pipeline definitions
         """
-        data_pipelines = []
-
-        template = self.read_template()
-        dp_parameters = self.build_parameters()
+        template = load_pipeline_template(self.template_file)
 
-        for parameters in dp_parameters:
-            data_pipelines.append(json.loads(pystache.render(template, parameters)))
+        with phase('build_definitions.schedule_tables'):
+            parameters = self.build_parameters()
 
-        return data_pipelines
-
-    def read_template(self):
-        template_file = os.path.join(os.path.dirname(__file__), self.template_file)
-        with open(template_file, "r") as f:
-            return f.read()
+        with phase('build_definitions.render'):
+            return [template.render(x) for x in parameters]
 
     def build_parameters(self):
         """
@@ -102,34 +77,39 @@ class Scheduler(object):
         :return: list of parameters for single data pipeline
         """
         data_pipeline_parameters = []
-        total_duration = EMR_BOOTSTRAP_TIME
-        backups = []
-        table_counter = 0
-        table_index = 0
-        total_table_size = 0
-        table_backup_durations = self.build_table_backup_durations()
-
-        for table_name, backup_duration, table_size_bytes in table_backup_durations:
-            total_duration += backup_duration
+        read_capacity_units = dict((x['Table']['TableName'], x['Table']['ProvisionedThroughput']['ReadCapacityUnits'])
+                                   for x in self.table_descriptions)
+        read_throughput_percents = {}
 
-            backups.append(self.create_backup_parameters(table_counter, table_name))
-            table_counter += 1
-            total_table_size += table_size_bytes
+        if self.plan:
+            pipelines = self.build_planned_pipelines()
 
-            if not self.should_add_more_tables(table_index, total_duration,
-                                               table_backup_durations, backups):
-                backups = self.normalize_backup_parameters(backups)
+            for table_name, table in self.plan['Tables'].items():
+                read_capacity_units[table_name] = table['ReadCapacityUnits']
+                read_throughput_percents[table_name] = table['ReadThroughputPercent']
+        else:
+            pipelines = self.pack_tables(self.build_table_backup_durations(), EMR_BOOTSTRAP_TIME,
+                                         MAX_DURATION_SEC, MAX_TABLES_PER_PIPELINE)
 
-                data_pipeline_parameters.append(self.create_pipeline_parameters(backups, total_table_size))
+        for pipeline in pipelines:
+            backups = []
+            total_duration = EMR_BOOTSTRAP_TIME
+            total_table_size = 0
+            peak_read_capacity_units = 0
 
-                logger.info('Total estimated duration of pipeline execution: {}'.format(total_duration))
+            for table_counter, (table_name, backup_duration, table_size_bytes) in enumerate(pipeline):
+                read_throughput_percent = read_throughput_percents.get(table_name, self.read_throughput_percent)
+                backups.append(self.create_backup_parameters(table_counter, table_name, read_throughput_percent))
+                total_duration += backup_duration
+                total_table_size += table_size_bytes
+                peak_read_capacity_units = max(peak_read_capacity_units,
+                                               read_capacity_units[table_name] * read_throughput_percent)
 
-                total_duration = EMR_BOOTSTRAP_TIME
-                backups = []
-                table_counter = 0
-                total_table_size = 0
+            data_pipeline_parameters.append(self.create_pipeline_parameters(
+                backups, total_table_size, peak_read_capacity_units,
+                min(self.target_duration, total_duration - EMR_BOOTSTRAP_TIME)))
 
-            table_index += 1
+            logger.info('Total estimated duration of pipeline execution: {}'.format(total_duration))
 
         return data_pipeline_parameters
 
@@ -151,18 +131,28 @@ class Scheduler(object):
 
         return sorted(table_backup_duration, key=lambda x: x[1])
 
-    def create_pipeline_parameters(self, backups, total_table_size):
+    def build_planned_pipelines(self):
+        """
+        :return: tables assigned to pipelines by the plan, in the format returned from packing strategies
+        """
+        table_sizes = dict((x['Table']['TableName'], x['Table']['TableSizeBytes']) for x in self.table_descriptions)
+
+        return [[(table_name, self.plan['Tables'][table_name]['EstimatedDuration'], table_sizes[table_name])
+                 for table_name in table_names]
+                for table_names in self.plan['Pipelines']]
+
+    def create_pipeline_parameters(self, backups, total_table_size, peak_read_capacity_units=0,
+                                   target_duration=None):
         """
         :param backups: list of elements, as returned from create_backup_parameters
-        :param max_table_size: sizew in bytes of the biggest table currently backed up
+        :param total_table_size: size in bytes of all tables backed up by the pipeline
+        :param peak_read_capacity_units: highest read capacity units consumed by the backup of a single table
+        :param target_duration: how long exporting tables of the pipeline should take, defaults to target_duration
+        of the scheduler
         :return: list of parameters needed for data pipeline Config and EMRCluster nodes
         """
-        cluster_config = None
-
-        for config in CLUSTER_CONFIGS:
-            if total_table_size < config['maxTotalDynamoDbSizeBytes']:
-                cluster_config = config
-                break
+        cluster_config = choose_cluster(total_table_size, peak_read_capacity_units,
+                                        target_duration or self.target_duration)
 
         return {
             'subnetId': '{}'.format(self.subnet_id),
@@ -177,13 +167,17 @@ class Scheduler(object):
             'backups': backups
         }
 
-    def create_backup_parameters(self, table_counter, table_name):
+    def create_backup_parameters(self, table_counter, table_name, read_throughput_percent=None):
         """
         :param table_counter:
         :param table_name:
+        :param read_throughput_percent: defaults to read_throughput_percent of the scheduler
         :return: list of parameters, needed for backing up single dynamo db table.
         """
-        return {'dbSourceTableReadThroughputPercent': '{}'.format(self.read_throughput_percent),
+        if read_throughput_percent is None:
+            read_throughput_percent = self.read_throughput_percent
+
+        return {'dbSourceTableReadThroughputPercent': '{}'.format(read_throughput_percent),
                 'dbSourceTableName': 'DDBSourceTable{}'.format(table_counter),
                 'dbSourceTableId': 'DDBSourceTable{}'.format(table_counter),
                 'dynamoDBTableName': table_name,
@@ -192,36 +186,7 @@ class Scheduler(object):
                 'tableBackupActivityMaximumRetries': '{}'.format(self.max_retries),
                 'tableBackupActivityName': 'TableBackupActivity{}'.format(table_counter),
                 'tableBackupActivityId': 'TableBackupActivity{}'.format(table_counter),
-                'region': '{}'.format(self.region),
-                'comma': True}
-
-    def normalize_backup_parameters(self, backups):
-        if backups:
-            backups[-1]['comma'] = False
-
-        return backups
-
-    def should_add_more_tables(self, table_index, total_duration, table_backup_durations, backups):
-        """
-        Checks whether or not more tables should be backed up on current data pipeline
-        :param table_index:
-        :param total_duration:
-        :param table_backup_durations:
-        :param backups:
-        :return:
-        """
-        add_more_tables = True
-
-        if table_index + 1 < len(table_backup_durations):
-            if total_duration + table_backup_durations[table_index + 1][1] >= MAX_DURATION_SEC:
-                add_more_tables = False
-
-            if len(backups) >= MAX_TABLES_PER_PIPELINE:
-                add_more_tables = False
-        else:
-            add_more_tables = False
-
-        return add_more_tables
+                'region': '{}'.format(self.region)}
 
     def estimate_duration(self, data):
         """
@@ -232,5 +197,65 @@ class Scheduler(object):
         table_size_bytes = data.get('TableSizeBytes', 0)
         read_capacity_units = data['ProvisionedThroughput']['ReadCapacityUnits']
 
-        return estimate_backup_duration(self.read_throughput_percent, table_size_bytes,
-                                        read_capacity_units) + ACTIVITY_BOOTSTRAP_TIME
+        return self.duration_model.estimate(data.get('TableName'), table_size_bytes, read_capacity_units,
+                                            self.read_throughput_percent) + ACTIVITY_BOOTSTRAP_TIME
+
+
+def route_tables(table_descriptions, max_size, duration_model=None,
+                 read_throughput_percent=INITIAL_READ_THROUGHPUT_PERCENT, budget=None,
+                 workers=IN_PROCESS_EXPORT_WORKERS):
+    """
+    Picks tables small enough to export in-process, so they don't pay for EMR cluster bootstrap. Smallest tables
+    are assigned first, each to the least loaded worker, while that worker's exports fit the budget.
+    :param max_size: tables up to that many bytes may be exported in-process, 0 disables in-process exports
+    :param duration_model: DurationModel learned from past backups, estimates come from table size only if not given
+    :param budget: seconds in-process exports may take on each worker, get_in_process_export_budget() if not given
+    :param workers: how many tables are exported in-process concurrently
+    :return: (descriptions of tables to back up with pipelines, descriptions of tables to export in-process, in the
+        order they were assigned, so a pool of workers picks them up the same way)
+    """
+    duration_model = duration_model or DurationModel()
+    budget = get_in_process_export_budget() if budget is None else budget
+    candidates = []
+
+    for index, description in enumerate(table_descriptions):
+        table = description['Table']
+
+        if not 0 < table['TableSizeBytes'] <= max_size:
+            continue
+
+        duration = duration_model.estimate(table['TableName'], table['TableSizeBytes'],
+                                           table['ProvisionedThroughput']['ReadCapacityUnits'],
+                                           read_throughput_percent) + IN_PROCESS_EXPORT_OVERHEAD
+        candidates.append((duration, index))
+
+    loads = [0] * workers
+    in_process = []
+
+    for duration, index in sorted(candidates):
+        # candidates are sorted, so once the least loaded worker can't fit one, no worker fits the rest
+        if loads[0] + duration > budget:
+            break
+
+        heapq.heapreplace(loads, loads[0] + duration)
+        in_process.append(index)
+
+    logger.info("Exporting {} tables in-process, estimated to take {} seconds on the busiest worker.".format(
+        len(in_process), max(loads)))
+    routed = set(in_process)
+
+    return ([x for index, x in enumerate(table_descriptions) if index not in routed],
+            [table_descriptions[x] for x in in_process])
+
+
+def get_in_process_export_budget():
+    """
+    :return: seconds in-process exports may take on each worker, IN_PROCESS_EXPORT_BUDGET at most, so they finish
+        INVOCATION_SAFETY_MARGIN before the invocation times out
+    """
+    remaining = get_remaining_seconds()
+
+    if remaining is None:
+        return IN_PROCESS_EXPORT_BUDGET
+
+    return max(min(IN_PROCESS_EXPORT_BUDGET, remaining - INVOCATION_SAFETY_MARGIN), 0)
@@ -0,0 +1,68 @@
+import logging
+import threading
+
+from hippolyte.aws_utils import DataPipelineUtil
+from hippolyte.utils import DESCRIBE_PIPELINE_WORKERS
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+_poller = None
+_poller_lock = threading.Lock()
+
+
+def get_pipeline_state_poller():
+    """
+    :return: PipelineStatePoller of the current invocation, shared by booster and monitor
+    """
+    global _poller
+
+    with _poller_lock:
+        if _poller is None:
+            _poller = PipelineStatePoller()
+
+        return _poller
+
+
+def reset_pipeline_state_poller():
+    """
+    Forgets states polled so far, as Lambda reuses the process for the next invocation.
+    """
+    global _poller
+
+    with _poller_lock:
+        _poller = None
+
+
+class PipelineStatePoller(object):
+    def __init__(self, data_pipeline_util=None, workers=DESCRIBE_PIPELINE_WORKERS):
+        self.data_pipeline_util = data_pipeline_util or DataPipelineUtil()
+        self.workers = workers
+        self.states = {}
+        self.lock = threading.Lock()
+
+    def get_states(self, pipeline_ids):
+        """
+        Describes only pipelines, which weren't polled yet.
+        :param pipeline_ids: pipelines to get states of
+        :return: {pipeline_id: @pipelineState}, None for pipelines, which don't exist anymore
+        """
+        with self.lock:
+            new_pipeline_ids = sorted(set(pipeline_ids) - set(self.states))
+
+            if new_pipeline_ids:
+                logger.info("Polling states of {} pipelines.".format(len(new_pipeline_ids)))
+                self.states.update(dict.fromkeys(new_pipeline_ids))
+
+                for description in self.data_pipeline_util.describe_pipelines(new_pipeline_ids, self.workers):
+                    self.states[description['pipelineId']] = get_pipeline_state(description)
+
+            return dict((x, self.states[x]) for x in pipeline_ids)
+
+
+def get_pipeline_state(pipeline_description):
+    for field in pipeline_description.get('fields', []):
+        if field['key'] == '@pipelineState':
+            return field.get('stringValue')
+
+    return None
@@ -0,0 +1,212 @@
+import json
+import os
+import re
+import threading
+from cgi import escape
+
+SECTION_PATTERN = re.compile(r'\{\{#(\w+)\}\}(.*?)\{\{/\1\}\}', re.S)
+SEPARATOR_PATTERN = re.compile(r'\{\{#comma\}\}\s*,\s*\{\{/comma\}\}')
+TAG_PATTERN = re.compile(r'\{\{(.*?)\}\}')
+VARIABLE_PATTERN = re.compile(r'^\w+$')
+ESCAPED_CHARACTERS_PATTERN = re.compile(u'[&<>"\\\\]')
+SECTION_MARKER = u'{{#%s}}'
+
+_templates = {}
+_templates_lock = threading.Lock()
+
+
+def load_pipeline_template(template_file):
+    """
+    :param template_file: template file name, relative to hippolyte package
+    :return: PipelineTemplate, parsed only once per template file
+    """
+    with _templates_lock:
+        if template_file not in _templates:
+            path = os.path.join(os.path.dirname(__file__), template_file)
+
+            with open(path, "r") as f:
+                _templates[template_file] = PipelineTemplate(f.read())
+
+        return _templates[template_file]
+
+
+class PipelineTemplate(object):
+    def __init__(self, template):
+        """
+        Mustache pipeline template, parsed into JSON structure up front, so that rendering a definition
+        only fills in variables, instead of rendering text and parsing it again.
+        Supports {{variable}} tags in string values and {{#list}} sections, each being a comma separated list
+        of objects placed inside of a JSON array, optionally followed by {{#comma}},{{/comma}} separator.
+        Rendered definitions are the same as json.loads(pystache.render(template, parameters)).
+        :param template: template text
+        :raises ValueError: if template doesn't fit the above
+        """
+        sections = {}
+
+        def extract_section(match):
+            body = SEPARATOR_PATTERN.sub('', match.group(2))
+
+            try:
+                objects = json.loads('[{}]'.format(body))
+            except ValueError as e:
+                raise ValueError("Invalid {} section in pipeline template: {}".format(match.group(1), e))
+
+            sections[match.group(1)] = self._compile(objects)
+            return json.dumps(SECTION_MARKER % match.group(1))
+
+        text = SECTION_PATTERN.sub(extract_section, template)
+
+        try:
+            self.definition = self._compile(json.loads(text), sections)
+        except ValueError as e:
+            raise ValueError("Invalid pipeline template: {}".format(e))
+
+    def render(self, parameters):
+        """
+        :param parameters: template parameters, as returned from Scheduler.create_pipeline_parameters()
+        :return: pipeline definition
+        """
+        return self.definition.render((parameters,))
+
+    def _compile(self, node, sections=None):
+        if isinstance(node, dict):
+            for key in node:
+                if TAG_PATTERN.search(key):
+                    raise ValueError("Tags are not supported in keys: {}".format(key))
+
+            return _Object([(key, self._compile(value, sections)) for key, value in node.items()])
+
+        if isinstance(node, list):
+            items = []
+
+            for item in node:
+                section = _section_name(item)
+
+                if section is not None:
+                    if not sections or section not in sections:
+                        raise ValueError("Section {} can only be used inside of a list".format(section))
+
+                    items.append(_Section(section, sections[section]))
+                else:
+                    items.append(self._compile(item, sections))
+
+            return _List(items)
+
+        if isinstance(node, basestring):
+            return _compile_text(node)
+
+        return _Literal(node)
+
+
+def _section_name(node):
+    if isinstance(node, basestring) and node.startswith(u'{{#') and node.endswith(u'}}'):
+        return node[3:-2]
+
+    return None
+
+
+def _compile_text(text):
+    parts = []
+    position = 0
+
+    for match in TAG_PATTERN.finditer(text):
+        if not VARIABLE_PATTERN.match(match.group(1)):
+            raise ValueError("Unsupported tag {} in: {}".format(match.group(0), text))
+
+        parts.append((text[position:match.start()], match.group(1)))
+        position = match.end()
+
+    if not parts:
+        return _Literal(text)
+
+    return _Text(parts, text[position:])
+
+
+def _lookup(context, name):
+    for scope in context:
+        if name in scope:
+            return scope[name]
+
+    return u''
+
+
+def _to_text(value):
+    """
+    Same conversion and HTML escaping pystache does, followed by JSON string decoding,
+    as rendered values used to end up inside of JSON string literals.
+    """
+    if not isinstance(value, basestring):
+        value = str(value)
+
+    text = unicode(value)
+
+    if not ESCAPED_CHARACTERS_PATTERN.search(text):
+        return text
+
+    text = escape(text, quote=True)
+
+    if u'\\' in text:
+        text = json.loads(u'"{}"'.format(text))
+
+    return text
+
+
+class _Literal(object):
+    def __init__(self, value):
+        self.value = value
+
+    def render(self, context):
+        return self.value
+
+
+class _Text(object):
+    def __init__(self, parts, tail):
+        self.parts = parts
+        self.tail = tail
+
+    def render(self, context):
+        return u''.join(literal + _to_text(_lookup(context, name)) for literal, name in self.parts) + self.tail
+
+
+class _Object(object):
+    def __init__(self, items):
+        self.constants = dict((key, value.value) for key, value in items if isinstance(value, _Literal))
+        self.items = [(key, value) for key, value in items if not isinstance(value, _Literal)]
+
+    def render(self, context):
+        rendered = dict(self.constants)
+
+        for key, value in self.items:
+            rendered[key] = value.render(context)
+
+        return rendered
+
+
+class _List(object):
+    def __init__(self, items):
+        self.items = items
+
+    def render(self, context):
+        rendered = []
+
+        for item in self.items:
+            if isinstance(item, _Section):
+                rendered += item.render(context)
+            else:
+                rendered.append(item.render(context))
+
+        return rendered
+
+
+class _Section(object):
+    def __init__(self, name, objects):
+        self.name = name
+        self.objects = objects
+
+    def render(self, context):
+        rendered = []
+
+        for scope in _lookup(context, self.name) or []:
+            rendered += self.objects.render((scope,) + context)
+
+        return rendered
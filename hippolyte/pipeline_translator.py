@@ -1,5 +1,4 @@
 import json
-from copy import deepcopy
 
 # Copyright 2014 Amazon.com, Inc. or its affiliates. All Rights Reserved.
 #
@@ -23,69 +22,80 @@ class PipelineDefinitionError(Exception):
         self.msg = msg
 
 
+def translate_definition(definition):
+    """
+    Converts definition to API structures in a single pass, without copying or modifying it.
+    :return: {'objects': pipeline objects, 'parameters': parameter objects or None,
+        'values': parameter values or None}
+    """
+    return {
+        'objects': definition_to_api_objects(definition),
+        'parameters': definition_to_api_parameters(definition),
+        'values': definition_to_parameter_values(definition)
+    }
+
+
 def definition_to_api_objects(definition):
-    definition_copy = deepcopy(definition)
-    if 'objects' not in definition_copy:
+    if 'objects' not in definition:
         raise PipelineDefinitionError('Missing "objects" key')
     api_elements = []
     # To convert to the structure expected by the service,
     # we convert the existing structure to a list of dictionaries.
     # Each dictionary has a 'fields', 'id', and 'name' key.
-    for element in definition_copy['objects']:
-        try:
-            element_id = element.pop('id')
-        except KeyError:
-            raise PipelineDefinitionError('Missing "id" key of element: %s' %
-                                          json.dumps(element))
-        api_object = {'id': element_id}
+    for element in definition['objects']:
+        element_id = _get_id(element, 'element')
         # If a name is provided, then we use that for the name,
         # otherwise the id is used for the name.
-        name = element.pop('name', element_id)
-        api_object['name'] = name
-        # Now we need the field list.  Each element in the field list is a dict
-        # with a 'key', 'stringValue'|'refValue'
-        fields = []
-        for key, value in sorted(element.items()):
-            fields.extend(_parse_each_field(key, value))
-        api_object['fields'] = fields
-        api_elements.append(api_object)
+        api_elements.append({
+            'id': element_id,
+            'name': element.get('name', element_id),
+            'fields': _parse_fields(element, ('id', 'name'))
+        })
     return api_elements
 
 
 def definition_to_api_parameters(definition):
-    definition_copy = deepcopy(definition)
-    if 'parameters' not in definition_copy:
+    if 'parameters' not in definition:
         return None
     parameter_objects = []
-    for element in definition_copy['parameters']:
-        try:
-            parameter_id = element.pop('id')
-        except KeyError:
-            raise PipelineDefinitionError('Missing "id" key of parameter: %s' %
-                                          json.dumps(element))
-        parameter_object = {'id': parameter_id}
-        # Now we need the attribute list.  Each element in the attribute list
-        # is a dict with a 'key', 'stringValue'
-        attributes = []
-        for key, value in sorted(element.items()):
-            attributes.extend(_parse_each_field(key, value))
-        parameter_object['attributes'] = attributes
-        parameter_objects.append(parameter_object)
+    for element in definition['parameters']:
+        # Each element in the attribute list is a dict with a 'key', 'stringValue'
+        parameter_objects.append({
+            'id': _get_id(element, 'parameter'),
+            'attributes': _parse_fields(element, ('id',))
+        })
     return parameter_objects
 
 
 def definition_to_parameter_values(definition):
-    definition_copy = deepcopy(definition)
-    if 'values' not in definition_copy:
+    if 'values' not in definition:
         return None
     parameter_values = []
-    for key in definition_copy['values']:
+    for key in definition['values']:
         parameter_values.extend(
-            _convert_single_parameter_value(key, definition_copy['values'][key]))
+            _convert_single_parameter_value(key, definition['values'][key]))
 
     return parameter_values
 
 
+def _get_id(element, element_type):
+    try:
+        return element['id']
+    except KeyError:
+        raise PipelineDefinitionError('Missing "id" key of %s: %s' %
+                                      (element_type, json.dumps(element)))
+
+
+def _parse_fields(element, skipped_keys):
+    # Each element in the field list is a dict
+    # with a 'key', 'stringValue'|'refValue'
+    fields = []
+    for key, value in sorted(element.items()):
+        if key not in skipped_keys:
+            fields.extend(_parse_each_field(key, value))
+    return fields
+
+
 def _parse_each_field(key, value):
     values = []
     if isinstance(value, list):
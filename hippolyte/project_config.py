@@ -9,6 +9,24 @@ ACCOUNT_CONFIGS = {
         ],
         'always_backup': [
             'this-is-not-an-example-table-1'
-        ]
+        ],
+        'describe_table_workers': 5,
+        'packing_strategy': 'balanced',
+        'deploy_workers': 5,
+        'data_pipeline_rate': 5,
+        'capacity_change_workers': 10,
+        'joint_planning': True,
+        'recovery_window': 12 * 3600,
+        'use_description_cache': True,
+        'description_cache_ttl': 6 * 3600,
+        'store_invocation_metrics': True,
+        'change_detection': False,
+        'max_carry_forward_age': 7 * 86400,
+        'in_process_export_max_size': 50 * 1024 ** 2,
+        'client_config': {
+            'connect_timeout': 5,
+            'read_timeout': 60,
+            'max_attempts': 5
+        }
     }
 }
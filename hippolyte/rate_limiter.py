@@ -0,0 +1,184 @@
+import threading
+import time
+
+from botocore.exceptions import ClientError
+
+DEFAULT_INITIAL_RATE = 10.0
+DEFAULT_MIN_RATE = 0.5
+DEFAULT_MAX_RATE = 50.0
+DEFAULT_MAX_ATTEMPTS = 5
+
+THROTTLING_ERROR_CODES = frozenset([
+    'Throttling',
+    'ThrottlingException',
+    'ThrottledException',
+    'RequestThrottled',
+    'RequestThrottledException',
+    'TooManyRequestsException',
+    'RequestLimitExceeded',
+    'SlowDown'
+])
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def is_throttling_error_code(error_code, error_message=''):
+    return error_code in THROTTLING_ERROR_CODES or 'Rate exceeded' in (error_message or '')
+
+
+def is_throttling_error(exception):
+    if isinstance(exception, ClientError):
+        error = exception.response.get('Error', {})
+        return is_throttling_error_code(error.get('Code'), error.get('Message'))
+
+    return False
+
+
+def get_rate_limiter(name):
+    """
+    :param name: usually name of AWS service, all clients of which share the same rate
+    :return: AdaptiveRateLimiter shared by all callers asking for the same name
+    """
+    with _rate_limiters_lock:
+        if name not in _rate_limiters:
+            _rate_limiters[name] = AdaptiveRateLimiter()
+
+        return _rate_limiters[name]
+
+
+def get_rate_limiter_metrics():
+    """
+    :return: {name: metrics} of all rate limiters used so far
+    """
+    with _rate_limiters_lock:
+        return dict((name, rate_limiter.metrics()) for name, rate_limiter in _rate_limiters.items())
+
+
+class AdaptiveRateLimiter(object):
+    def __init__(self, initial_rate=DEFAULT_INITIAL_RATE, min_rate=DEFAULT_MIN_RATE, max_rate=DEFAULT_MAX_RATE,
+                 increase=0.5, decrease=0.5, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        """
+        Token bucket shared by every worker calling the same AWS API. Refill rate follows AIMD:
+        it grows additively after each successful call and is cut multiplicatively on throttling,
+        so the whole group backs off together instead of each caller retrying on its own.
+        :param initial_rate: starting rate, in calls per second
+        :param min_rate: rate will never be decreased below this value
+        :param max_rate: rate will never be increased above this value
+        :param increase: calls per second added after each successful call
+        :param decrease: factor applied to the rate after each throttling error
+        :param max_attempts: how many times call() attempts a single call, before throttling error is re-raised
+        """
+        self.rate = float(min(initial_rate, max_rate))
+        self.min_rate = float(min_rate)
+        self.max_rate = float(max_rate)
+        self.increase = increase
+        self.decrease = decrease
+        self.max_attempts = max_attempts
+        self.calls = 0
+        self.throttles = 0
+        self.waited_seconds = 0.0
+        self._tokens = 1.0
+        self._last_refill = time.time()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Blocks until a single call is allowed by the current rate.
+        """
+        while True:
+            with self._lock:
+                now = time.time()
+                self._tokens = min(max(self.rate, 1.0), self._tokens + (now - self._last_refill) * self.rate)
+                self._last_refill = now
+
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    self.calls += 1
+                    return
+
+                wait = (1.0 - self._tokens) / self.rate
+                self.waited_seconds += wait
+
+            time.sleep(wait)
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttle(self):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self.throttles += 1
+            self._tokens = 0.0
+
+    def set_max_rate(self, max_rate):
+        with self._lock:
+            self.max_rate = float(max_rate)
+            self.rate = min(self.rate, self.max_rate)
+
+    def metrics(self):
+        with self._lock:
+            return {
+                'rate': round(self.rate, 2),
+                'calls': self.calls,
+                'throttles': self.throttles,
+                'waited_seconds': round(self.waited_seconds, 3)
+            }
+
+    def call(self, func, *args, **kwargs):
+        """
+        Calls func, once the rate allows it, retrying throttled calls at the reduced rate.
+        If func is an operation of a client attached with attach(), pacing and rate changes are left to the client.
+        :return: whatever func returns
+        """
+        attached = getattr(getattr(func, '__self__', None), 'rate_limiter', None) is self
+        attempt = 1
+
+        while True:
+            if not attached:
+                self.acquire()
+
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                if not is_throttling_error(e) or attempt >= self.max_attempts:
+                    raise
+
+                if not attached:
+                    self.on_throttle()
+
+                attempt += 1
+                continue
+
+            if not attached:
+                self.on_success()
+
+            return result
+
+    def attach(self, client):
+        """
+        Paces every API call made by a boto3 client, including each page fetched by its paginators,
+        and adjusts the rate based on responses, including those retried by botocore itself.
+        """
+        client.rate_limiter = self
+        client.meta.events.register('before-call', self._before_call)
+        client.meta.events.register('needs-retry', self._needs_retry)
+        client.meta.events.register('after-call', self._after_call)
+
+        return client
+
+    def _before_call(self, **kwargs):
+        self.acquire()
+
+    def _needs_retry(self, response=None, **kwargs):
+        if response and self._is_throttled(response[1]):
+            self.on_throttle()
+
+    def _after_call(self, parsed=None, **kwargs):
+        if not self._is_throttled(parsed) and 'Error' not in (parsed or {}):
+            self.on_success()
+
+    def _is_throttled(self, parsed):
+        error = (parsed or {}).get('Error', {})
+        return is_throttling_error_code(error.get('Code'), error.get('Message'))
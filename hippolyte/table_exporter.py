@@ -0,0 +1,203 @@
+import base64
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from uuid import uuid4
+
+from hippolyte.aws_utils import DynamoDBUtil, S3Util
+from hippolyte.utils import INITIAL_READ_THROUGHPUT_PERCENT, IN_PROCESS_EXPORT_WORKERS, SCAN_SEGMENTS, \
+    EXPORT_PART_SIZE_BYTES, get_date_suffix
+
+# separators used by DynamoDbExport in between attributes, and in between attribute name and value
+ATTRIBUTE_SEPARATOR = '\x03'
+NAME_SEPARATOR = '\x02'
+# names of attribute value types, as serialized by DynamoDbExport
+EXPORT_TYPE_NAMES = {
+    'S': 's',
+    'N': 'n',
+    'B': 'b',
+    'SS': 'sS',
+    'NS': 'nS',
+    'BS': 'bS',
+    'M': 'm',
+    'L': 'l',
+    'NULL': 'nULLValue',
+    'BOOL': 'bOOL'
+}
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+class TableExporter(object):
+    def __init__(self, backup_bucket, read_throughput_percent=INITIAL_READ_THROUGHPUT_PERCENT,
+                 workers=IN_PROCESS_EXPORT_WORKERS, segments=SCAN_SEGMENTS):
+        """
+        Exports small tables without data pipelines, with a parallel scan, to the same S3 layout DynamoDbExport
+        writes: data files, manifest and _SUCCESS flag under <table_name>/<timestamp>/.
+        :param read_throughput_percent: how much of the table read capacity the scan may consume, ex. 0.5 - 50%
+        :param workers: how many tables to export concurrently
+        :param segments: how many segments of each table to scan concurrently
+        """
+        self.backup_bucket = backup_bucket
+        self.read_throughput_percent = read_throughput_percent
+        self.workers = workers
+        self.segments = segments
+        self.dynamo_db_util = DynamoDBUtil()
+        self.s3_util = S3Util()
+
+    def export_tables(self, table_descriptions, timestamp=None):
+        """
+        :param timestamp: name of backup directories, so their locations can be recorded before the export,
+            current time by default
+        :return: ({table_name: s3 location of the export}, descriptions of tables, which failed to export)
+        """
+        timestamp = timestamp or get_date_suffix()
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+
+        try:
+            results = list(executor.map(lambda x: self._try_export_table(x, timestamp), table_descriptions))
+        finally:
+            executor.shutdown()
+
+        locations = {}
+        failed = []
+
+        for description, location in zip(table_descriptions, results):
+            if location:
+                locations[description['Table']['TableName']] = location
+            else:
+                failed.append(description)
+
+        logger.info("Exported {} tables in-process, {} failed.".format(len(locations), len(failed)))
+
+        return locations, failed
+
+    def _try_export_table(self, table_description, timestamp):
+        try:
+            return self.export_table(table_description, timestamp)
+        except Exception as e:
+            logger.error("Failed to export {}: {}".format(table_description['Table']['TableName'], e))
+            return None
+
+    def export_table(self, table_description, timestamp):
+        """
+        :param timestamp: name of the backup directory
+        :return: s3 location of the export
+        """
+        table = table_description['Table']
+        prefix = '{}/{}/'.format(table['TableName'], timestamp)
+        pacer = ReadCapacityPacer(table['ProvisionedThroughput']['ReadCapacityUnits'] * self.read_throughput_percent)
+        executor = ThreadPoolExecutor(max_workers=self.segments)
+
+        try:
+            keys = executor.map(lambda x: self._export_segment(table['TableName'], x, prefix, pacer),
+                                range(self.segments))
+            keys = [key for segment_keys in keys for key in segment_keys]
+        finally:
+            executor.shutdown()
+
+        self.s3_util.put_object(self.backup_bucket, prefix + 'manifest', create_manifest(self.backup_bucket, keys))
+        self.s3_util.put_object(self.backup_bucket, prefix + '_SUCCESS', '')
+
+        return get_export_location(self.backup_bucket, table['TableName'], timestamp)
+
+    def _export_segment(self, table_name, segment, prefix, pacer):
+        """
+        Writes items of the segment as data files of up to EXPORT_PART_SIZE_BYTES.
+        :return: keys of data files written
+        """
+        keys = []
+        lines = []
+        size = 0
+
+        for page in self.dynamo_db_util.iter_scan_pages(table_name, segment, self.segments):
+            for item in page.get('Items', []):
+                line = to_export_line(item)
+                lines.append(line)
+                size += len(line)
+
+            if size >= EXPORT_PART_SIZE_BYTES:
+                keys.append(self._put_data_file(prefix, lines))
+                lines = []
+                size = 0
+
+            pacer.consume(page.get('ConsumedCapacity', {}).get('CapacityUnits', 0))
+
+        if lines:
+            keys.append(self._put_data_file(prefix, lines))
+
+        return keys
+
+    def _put_data_file(self, prefix, lines):
+        key = prefix + str(uuid4())
+        self.s3_util.put_object(self.backup_bucket, key, ''.join(lines))
+
+        return key
+
+
+class ReadCapacityPacer(object):
+    def __init__(self, read_capacity_units):
+        """
+        Keeps read capacity consumed by all segments of a scan within read_capacity_units per second, on average.
+        """
+        self.read_capacity_units = max(float(read_capacity_units), 1.0)
+        self.started = time.time()
+        self.consumed = 0.0
+        self.lock = threading.Lock()
+
+    def consume(self, capacity_units):
+        """
+        Waits until capacity_units, consumed by the last request, are within the rate.
+        """
+        with self.lock:
+            self.consumed += capacity_units
+            delay = self.started + self.consumed / self.read_capacity_units - time.time()
+
+        if delay > 0:
+            time.sleep(delay)
+
+
+def get_export_location(backup_bucket, table_name, timestamp):
+    """
+    :return: s3 location of the table export written to the timestamp directory
+    """
+    return 's3://{}/{}/{}/'.format(backup_bucket, table_name, timestamp)
+
+
+def to_export_line(item):
+    """
+    :param item: item, as returned from scan
+    :return: line of a DynamoDbExport data file
+    """
+    attributes = ['{}{}{}'.format(name.encode('utf-8'), NAME_SEPARATOR,
+                                  json.dumps(to_export_value(value), sort_keys=True, separators=(',', ':')))
+                  for name, value in sorted(item.items())]
+
+    return ATTRIBUTE_SEPARATOR.join(attributes) + '\n'
+
+
+def to_export_value(value):
+    (type_name, type_value), = value.items()
+
+    if type_name == 'B':
+        type_value = base64.b64encode(type_value)
+    elif type_name == 'BS':
+        type_value = map(base64.b64encode, type_value)
+    elif type_name == 'M':
+        type_value = dict((name, to_export_value(x)) for name, x in type_value.items())
+    elif type_name == 'L':
+        type_value = map(to_export_value, type_value)
+
+    return {EXPORT_TYPE_NAMES[type_name]: type_value}
+
+
+def create_manifest(bucket, keys):
+    """
+    :return: manifest listing data files of the export, as written by DynamoDbExport
+    """
+    entries = ',\n'.join('{{"url":"s3://{}/{}","mandatory":true}}'.format(bucket, key) for key in keys)
+
+    return '{{"name":"DynamoDB-export","version":3,\n"entries":[\n{}\n]}}\n'.format(entries)
@@ -0,0 +1,198 @@
+import heapq
+
+GREEDY = 'greedy'
+BALANCED = 'balanced'
+DEFAULT_PACKING_STRATEGY = BALANCED
+MAX_LOCAL_SEARCH_ITERATIONS = 1000
+# pipelines a table of the longest pipeline may be moved to or swapped with, least loaded first
+MAX_LOCAL_SEARCH_CANDIDATES = 4
+
+
+def pack_greedy(table_backup_durations, bootstrap_duration, max_duration, max_tables):
+    """
+    Fills pipelines one after another, in the given order, until either duration or table limit is reached.
+    :param table_backup_durations: list of (table_name, backup_duration, table_size_bytes), sorted by duration
+    :param bootstrap_duration: fixed duration of every pipeline, on top of its tables durations
+    :param max_duration: max duration of a single pipeline
+    :param max_tables: max number of tables on a single pipeline
+    :return: list of pipelines, each being a list of (table_name, backup_duration, table_size_bytes)
+    """
+    pipelines = []
+    pipeline = []
+    total_duration = bootstrap_duration
+
+    for table_index, table in enumerate(table_backup_durations):
+        total_duration += table[1]
+        pipeline.append(table)
+
+        add_more_tables = True
+
+        if table_index + 1 < len(table_backup_durations):
+            if total_duration + table_backup_durations[table_index + 1][1] >= max_duration:
+                add_more_tables = False
+
+            if len(pipeline) >= max_tables:
+                add_more_tables = False
+        else:
+            add_more_tables = False
+
+        if not add_more_tables:
+            pipelines.append(pipeline)
+            pipeline = []
+            total_duration = bootstrap_duration
+
+    return pipelines
+
+
+def pack_balanced(table_backup_durations, bootstrap_duration, max_duration, max_tables):
+    """
+    Packs tables into as few pipelines as limits allow, spreading them so that the longest pipeline is as short
+    as possible. Pipeline count comes from first-fit-decreasing, tables are then assigned longest first to the
+    least loaded pipeline (LPT) and finally rebalanced by moving or swapping tables out of the longest pipeline.
+    Tables too long to share a pipeline with anything else are given a pipeline of their own.
+    :param table_backup_durations: list of (table_name, backup_duration, table_size_bytes)
+    :param bootstrap_duration: fixed duration of every pipeline, on top of its tables durations
+    :param max_duration: max duration of a single pipeline
+    :param max_tables: max number of tables on a single pipeline
+    :return: list of pipelines, each being a list of (table_name, backup_duration, table_size_bytes),
+        sorted by ascending duration
+    """
+    capacity = max_duration - bootstrap_duration
+    tables = sorted(table_backup_durations, key=lambda x: (-x[1], x[0]))
+    oversized = [table for table in tables if table[1] >= capacity]
+    tables = [table for table in tables if table[1] < capacity]
+
+    pipelines = [[table] for table in oversized]
+
+    if tables:
+        first_fit = _first_fit_decreasing(tables, capacity, max_tables)
+        pipeline_count = _lower_bound(tables, capacity, max_tables)
+        balanced = None
+
+        while balanced is None and pipeline_count <= len(first_fit):
+            balanced = _longest_processing_time(tables, pipeline_count, capacity, max_tables)
+            pipeline_count += 1
+
+        if balanced is None:
+            balanced = first_fit
+
+        pipelines += _rebalance(balanced, capacity, max_tables)
+
+    return [sorted(pipeline, key=lambda x: (x[1], x[0])) for pipeline in pipelines if pipeline]
+
+
+PACKING_STRATEGIES = {
+    GREEDY: pack_greedy,
+    BALANCED: pack_balanced
+}
+
+
+def get_packing_strategy(name):
+    if name not in PACKING_STRATEGIES:
+        raise ValueError("Unknown packing strategy: {}, expected one of: {}".format(
+            name, ", ".join(sorted(PACKING_STRATEGIES))))
+
+    return PACKING_STRATEGIES[name]
+
+
+def _load(pipeline):
+    return sum(table[1] for table in pipeline)
+
+
+def _lower_bound(tables, capacity, max_tables):
+    by_count = -(-len(tables) // max_tables)
+    by_duration = int(_load(tables) // capacity) + 1
+
+    return max(by_count, by_duration, 1)
+
+
+def _first_fit_decreasing(tables, capacity, max_tables):
+    pipelines = []
+    loads = []
+
+    for table in tables:
+        for index, pipeline in enumerate(pipelines):
+            if len(pipeline) < max_tables and loads[index] + table[1] < capacity:
+                pipeline.append(table)
+                loads[index] += table[1]
+                break
+        else:
+            pipelines.append([table])
+            loads.append(table[1])
+
+    return pipelines
+
+
+def _longest_processing_time(tables, pipeline_count, capacity, max_tables):
+    pipelines = [[] for _ in range(pipeline_count)]
+    # least loaded pipeline first, full pipelines are left out of the heap
+    loads = [(0, index) for index in range(pipeline_count)]
+
+    for table in tables:
+        if not loads or loads[0][0] + table[1] >= capacity:
+            return None
+
+        load, index = heapq.heappop(loads)
+        pipelines[index].append(table)
+
+        if len(pipelines[index]) < max_tables:
+            heapq.heappush(loads, (load + table[1], index))
+
+    return pipelines
+
+
+def _rebalance(pipelines, capacity, max_tables):
+    """
+    Local search, lowering the longest pipeline duration by moving a table out of it,
+    or swapping one of its tables with a shorter one, as long as that gives strict improvement.
+    Only the least loaded pipelines are tried, as they leave the most room, so that each step doesn't
+    go through every pair of tables in the account.
+    """
+    loads = [_load(pipeline) for pipeline in pipelines]
+
+    for _ in range(MAX_LOCAL_SEARCH_ITERATIONS):
+        longest = max(range(len(pipelines)), key=lambda x: loads[x])
+        candidates = heapq.nsmallest(MAX_LOCAL_SEARCH_CANDIDATES + 1, range(len(pipelines)), key=lambda x: loads[x])
+        best = None
+        best_peak = loads[longest]
+
+        for index in candidates:
+            if index == longest:
+                continue
+
+            pipeline = pipelines[index]
+
+            for table in pipelines[longest]:
+                if len(pipeline) < max_tables and loads[index] + table[1] < capacity:
+                    peak = max(loads[longest] - table[1], loads[index] + table[1])
+
+                    if peak < best_peak:
+                        best, best_peak = (index, table, None), peak
+
+                for other in pipeline:
+                    difference = table[1] - other[1]
+
+                    if difference <= 0 or loads[index] + difference >= capacity:
+                        continue
+
+                    peak = max(loads[longest] - difference, loads[index] + difference)
+
+                    if peak < best_peak:
+                        best, best_peak = (index, table, other), peak
+
+        if best is None:
+            break
+
+        index, table, other = best
+        pipelines[longest].remove(table)
+        pipelines[index].append(table)
+        loads[longest] -= table[1]
+        loads[index] += table[1]
+
+        if other is not None:
+            pipelines[index].remove(other)
+            pipelines[longest].append(other)
+            loads[index] -= other[1]
+            loads[longest] += other[1]
+
+    return pipelines
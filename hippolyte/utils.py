@@ -1,4 +1,6 @@
 import datetime
+import time
+from email.utils import parsedate_tz, mktime_tz
 
 MAX_TABLES_PER_PIPELINE = 32
 READ_BLOCK_SIZE_BYTES = 4096
@@ -11,6 +13,29 @@ ACTIVITY_BOOTSTRAP_TIME = 60
 EMR_BOOTSTRAP_TIME = 600
 INITIAL_READ_THROUGHPUT_PERCENT = 0.5
 TIME_IN_BETWEEN_BACKUPS = 86400
+DESCRIBE_TABLE_WORKERS = 5
+DEPLOY_PIPELINE_WORKERS = 5
+DESCRIPTION_CACHE_TTL = 6 * 3600
+VERIFY_BACKUP_WORKERS = 10
+DESCRIBE_PIPELINE_WORKERS = 5
+MAX_CARRY_FORWARD_AGE = 7 * 86400
+IN_PROCESS_EXPORT_WORKERS = 4
+# in-process exports run after pipelines are deployed, this leaves most of the backup timeout to deployment
+IN_PROCESS_EXPORT_BUDGET = 120
+IN_PROCESS_EXPORT_OVERHEAD = 2
+SCAN_SEGMENTS = 4
+EXPORT_PART_SIZE_BYTES = 16 * 1024 ** 2
+DATA_PIPELINE_CALLS_PER_SECOND = 5
+CAPACITY_CHANGE_WORKERS = 10
+FRESH_DESCRIPTION_MAX_AGE = 300
+TABLE_ACTIVE_POLL_DELAY = 5
+TABLE_ACTIVE_MAX_POLLS = 60
+INVOCATION_SAFETY_MARGIN = 30
+DURATION_MODEL_SMOOTHING = 0.3
+BACKUP_TIMESTAMP_FORMAT = '%Y-%m-%d-%H-%M-%S'
+MAX_CORE_INSTANCE_COUNT = 10
+MAP_SLOT_BYTES_PER_SECOND = 4 * 1024 ** 2
+READ_CAPACITY_UNIT_HOURLY_PRICE = 0.00013
 
 
 def estimate_backup_duration(read_throughput_percent, table_size_bytes, read_capacity_units):
@@ -42,8 +67,22 @@ def compute_required_throughput(estimated_duration, target_duration, read_capaci
     return int(round(new_read_capacity_units)), round(new_read_throughput_percent, 2)
 
 
+def get_description_age(table_description):
+    """
+    :return: seconds since the table was described, taken from Date header of describe_table response, None if
+        it's not known
+    """
+    date = table_description.get('ResponseMetadata', {}).get('HTTPHeaders', {}).get('date')
+    parsed_date = parsedate_tz(date) if date else None
+
+    if not parsed_date:
+        return None
+
+    return time.time() - mktime_tz(parsed_date)
+
+
 def get_date_suffix():
-    return datetime.datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
+    return datetime.datetime.now().strftime(BACKUP_TIMESTAMP_FORMAT)
 
 
 def chunks(l, n):
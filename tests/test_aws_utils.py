@@ -0,0 +1,73 @@
+import unittest
+import boto3
+import sys
+import os
+from moto import mock_s3
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from hippolyte.aws_utils import S3Util, DynamoDBUtil, reset_clients
+import hippolyte.aws_utils
+
+BUCKET = 'euw1-dynamodb-backups-prd-480503113116'
+
+
+def set_fake_credentials():
+    # clients are signed even when moto intercepts their requests, so tests don't depend on developer's credentials
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+
+
+class TestS3Util(unittest.TestCase):
+    def setUp(self):
+        set_fake_credentials()
+        reset_clients()
+
+    def create_backups(self):
+        s3 = boto3.client('s3')
+        s3.create_bucket(Bucket=BUCKET)
+
+        for day in range(1, 4):
+            key = 'table/2017-05-0{}-00-10-38/'.format(day)
+            for file_name in range(0, 5):
+                s3.put_object(Bucket=BUCKET, Key=key + str(file_name), Body='')
+
+    @mock_s3
+    def test_list_objects_returns_all_contents(self):
+        self.create_backups()
+
+        contents = S3Util().list_objects(BUCKET, 'table/').get('Contents')
+
+        self.assertEqual(len(contents), 15)
+
+    @mock_s3
+    def test_iter_objects_is_lazy(self):
+        self.create_backups()
+
+        objects = S3Util().iter_objects(BUCKET, 'table/2017-05-02')
+
+        self.assertEqual(next(objects)['Key'], 'table/2017-05-02-00-10-38/0')
+
+    @mock_s3
+    def test_iter_common_prefixes(self):
+        self.create_backups()
+
+        prefixes = list(S3Util().iter_common_prefixes(BUCKET, 'table/'))
+
+        self.assertListEqual(prefixes, ['table/2017-05-01-00-10-38/', 'table/2017-05-02-00-10-38/',
+                                        'table/2017-05-03-00-10-38/'])
+
+
+class TestClientRegistry(unittest.TestCase):
+    def setUp(self):
+        set_fake_credentials()
+
+    def test_utils_share_lazily_created_clients(self):
+        reset_clients()
+        first = S3Util()
+        second = S3Util()
+
+        self.assertEqual(hippolyte.aws_utils._clients, {})
+        self.assertIs(first.client, second.client)
+        self.assertIsNot(first.client, DynamoDBUtil().client)
+        self.assertEqual(sorted(hippolyte.aws_utils._clients), ['dynamodb', 's3'])
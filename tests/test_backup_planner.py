@@ -0,0 +1,95 @@
+import unittest
+import sys
+import os
+from mock import Mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from hippolyte.backup_planner import BackupPlanner, format_plan, get_account_read_capacity_units
+from hippolyte.pipeline_scheduler import Scheduler
+from hippolyte.utils import MAX_DURATION_SEC, MAX_TABLES_PER_PIPELINE
+
+LIMITS = {
+    'AccountMaxReadCapacityUnits': 80000,
+    'TableMaxReadCapacityUnits': 40000
+}
+
+
+def create_descriptions(table_sizes, read_capacity_units=100):
+    return [{'Table': {'TableName': 'table-{}'.format(index), 'TableSizeBytes': size,
+                       'ProvisionedThroughput': {'ReadCapacityUnits': read_capacity_units,
+                                                 'WriteCapacityUnits': 10}}}
+            for index, size in enumerate(table_sizes)]
+
+
+class TestBackupPlanner(unittest.TestCase):
+    def test_small_tables_are_not_boosted(self):
+        descriptions = create_descriptions([1024 ** 2] * 40 + [0])
+
+        plan = BackupPlanner(descriptions, MAX_DURATION_SEC, LIMITS).plan()
+
+        self.assertTrue(plan['Feasible'])
+        self.assertEqual(len(plan['Pipelines']), 2)
+        self.assertTrue(all(len(x) <= MAX_TABLES_PER_PIPELINE for x in plan['Pipelines']))
+        self.assertNotIn('table-40', plan['Tables'])
+        self.assertEqual(plan['Cost']['ReadCapacityUnitHours'], 0)
+        self.assertTrue(all(x['ReadCapacityUnits'] == 100 for x in plan['Tables'].values()))
+
+    def test_boosts_big_tables_to_meet_recovery_window(self):
+        descriptions = create_descriptions([100 * 1024 ** 3, 10 * 1024 ** 3, 1024 ** 3])
+
+        plan = BackupPlanner(descriptions, MAX_DURATION_SEC, LIMITS).plan()
+
+        self.assertTrue(plan['Feasible'])
+        self.assertTrue(all(x <= MAX_DURATION_SEC for x in plan['PipelineDurations']))
+        self.assertGreater(plan['Tables']['table-0']['ReadCapacityUnits'],
+                           plan['Tables']['table-1']['ReadCapacityUnits'])
+        self.assertGreater(plan['Tables']['table-0']['ReadThroughputPercent'], 0.5)
+        self.assertGreater(plan['Cost']['ReadCapacityUnitHours'], 0)
+        self.assertIn('table-0', format_plan(plan))
+
+    def test_reports_unfeasible_plan_over_account_limit(self):
+        descriptions = create_descriptions([100 * 1024 ** 3, 100 * 1024 ** 3])
+        limits = dict(LIMITS, AccountMaxReadCapacityUnits=1000)
+
+        plan = BackupPlanner(descriptions, MAX_DURATION_SEC, limits).plan()
+
+        self.assertFalse(plan['Feasible'])
+
+    def test_read_capacity_of_whole_account_limits_boosts(self):
+        descriptions = create_descriptions([100 * 1024 ** 3, 10 * 1024 ** 3])
+
+        self.assertTrue(BackupPlanner(descriptions, MAX_DURATION_SEC, LIMITS).plan()['Feasible'])
+
+        plan = BackupPlanner(descriptions, MAX_DURATION_SEC, LIMITS, account_read_capacity_units=79900).plan()
+
+        self.assertFalse(plan['Feasible'])
+        self.assertFalse(plan['WithinAccountLimit'])
+        self.assertGreater(plan['ReadCapacityIncrease'], 100)
+
+    def test_account_read_capacity_comes_from_utilization_metric(self):
+        descriptions = create_descriptions([1024, 1024])
+        descriptions[0]['Table']['GlobalSecondaryIndexes'] = [{'ProvisionedThroughput': {'ReadCapacityUnits': 50}}]
+        cloud_watch_util = Mock()
+        cloud_watch_util.get_metric_maximum.return_value = 25.0
+
+        self.assertEqual(get_account_read_capacity_units(descriptions, LIMITS, cloud_watch_util), 20000)
+
+        cloud_watch_util.get_metric_maximum.return_value = None
+
+        self.assertEqual(get_account_read_capacity_units(descriptions, LIMITS, cloud_watch_util), 250)
+
+    def test_scheduler_follows_plan(self):
+        descriptions = create_descriptions([100 * 1024 ** 3, 10 * 1024 ** 3, 1024 ** 3])
+        plan = BackupPlanner(descriptions, MAX_DURATION_SEC, LIMITS).plan()
+        scheduler = Scheduler(descriptions, 'multiple.template', 'subnet', 'eu-west-1', 'backups', 'logs',
+                              target_duration=MAX_DURATION_SEC, plan=plan)
+
+        parameters = scheduler.build_parameters()
+
+        self.assertEqual([[x['dynamoDBTableName'] for x in pipeline['backups']] for pipeline in parameters],
+                         plan['Pipelines'])
+        read_throughput_percents = dict((x['dynamoDBTableName'], x['dbSourceTableReadThroughputPercent'])
+                                        for pipeline in parameters for x in pipeline['backups'])
+        self.assertEqual(read_throughput_percents['table-0'],
+                         str(plan['Tables']['table-0']['ReadThroughputPercent']))
@@ -0,0 +1,104 @@
+import unittest
+import sys
+import os
+from email.utils import formatdate
+from botocore.exceptions import ClientError
+from mock import Mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from hippolyte.capacity_executor import CapacityChangeExecutor, capacity_change
+from hippolyte.instrumentation import start_invocation
+
+
+def create_description(table_name, read_capacity_units, date=None):
+    description = {
+        'Table': {
+            'TableName': table_name,
+            'TableStatus': 'ACTIVE',
+            'ProvisionedThroughput': {'ReadCapacityUnits': read_capacity_units, 'WriteCapacityUnits': 5}
+        },
+        'ResponseMetadata': {'HTTPHeaders': {}}
+    }
+
+    if date:
+        description['ResponseMetadata']['HTTPHeaders']['date'] = date
+
+    return description
+
+
+def client_error(code, message):
+    return ClientError({'Error': {'Code': code, 'Message': message}}, 'UpdateTable')
+
+
+class TestCapacityChangeExecutor(unittest.TestCase):
+    def test_apply_returns_status_of_every_table_in_order(self):
+        def update_read_capacity(description, read_capacity_units):
+            table_name = description['Table']['TableName']
+
+            if table_name == 'failed':
+                raise client_error('LimitExceededException', 'Subscriber limit exceeded')
+            if table_name == 'quota':
+                raise client_error('LimitExceededException', 'Provisioned throughput can be decreased 4 times')
+
+            return True
+
+        dynamo_db_util = Mock()
+        dynamo_db_util.update_read_capacity.side_effect = update_read_capacity
+        dynamo_db_util.describe_table.side_effect = lambda x: create_description(x, 10)
+        dynamo_db_util.wait_until_active.return_value = True
+        executor = CapacityChangeExecutor(dynamo_db_util, workers=3, wait_for_active=True)
+
+        results = executor.apply([
+            capacity_change(create_description('boosted', 10), 100),
+            capacity_change(create_description('capped', 10), 1000, capped=True),
+            capacity_change(create_description('restored', 100), 10),
+            capacity_change(create_description('unchanged', 10), 10),
+            capacity_change(create_description('failed', 10), 100),
+            capacity_change(create_description('quota', 100), 10)
+        ])
+
+        self.assertListEqual(map(lambda x: (x['table_name'], x['status']), results), [
+            ('boosted', 'boosted'),
+            ('capped', 'capped'),
+            ('restored', 'restored'),
+            ('unchanged', 'unchanged'),
+            ('failed', 'failed'),
+            ('quota', 'decrease-quota-exhausted')
+        ])
+        self.assertEqual(results[0]['read_capacity_units'], 100)
+        self.assertEqual(results[4]['read_capacity_units'], 10)
+        self.assertEqual(results[4]['error_code'], 'LimitExceededException')
+        self.assertListEqual(sorted(x[0][0] for x in dynamo_db_util.wait_until_active.call_args_list),
+                             ['boosted', 'capped', 'restored'])
+
+    def test_only_stale_descriptions_are_described_again(self):
+        dynamo_db_util = Mock()
+        dynamo_db_util.describe_table.side_effect = lambda x: create_description(x, 10)
+        executor = CapacityChangeExecutor(dynamo_db_util, workers=2, wait_for_active=False)
+
+        executor.apply([
+            capacity_change(create_description('fresh', 10, formatdate(usegmt=True)), 100),
+            capacity_change(create_description('stale', 10, 'Mon, 01 Jan 2018 00:00:00 GMT'), 100)
+        ])
+
+        dynamo_db_util.describe_table.assert_called_once_with('stale')
+        # call_count of a mock called from many threads may miss a call, call_args_list does not
+        self.assertEqual(len(dynamo_db_util.update_read_capacity.call_args_list), 2)
+
+    def test_waits_for_active_only_if_asked_and_within_remaining_time(self):
+        dynamo_db_util = Mock()
+        dynamo_db_util.describe_table.side_effect = lambda x: create_description(x, 10)
+        context = Mock()
+        context.get_remaining_time_in_millis.return_value = 42000
+        start_invocation(context)
+
+        try:
+            CapacityChangeExecutor(dynamo_db_util).apply([capacity_change(create_description('a', 10), 100)])
+            self.assertEqual(dynamo_db_util.wait_until_active.call_count, 0)
+
+            CapacityChangeExecutor(dynamo_db_util, wait_for_active=True).apply(
+                [capacity_change(create_description('a', 10), 100)])
+            dynamo_db_util.wait_until_active.assert_called_once_with('a', max_polls=2)
+        finally:
+            start_invocation()
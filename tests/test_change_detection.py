@@ -0,0 +1,60 @@
+import unittest
+import boto3
+import sys
+import os
+import time
+from mock import Mock
+from moto import mock_s3
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from hippolyte.change_detection import ChangeDetector, record_exports
+
+BUCKET = 'backups'
+
+
+def describe(table_name, size=1024, item_count=10):
+    return {'Table': {'TableName': table_name, 'TableSizeBytes': size, 'ItemCount': item_count,
+                      'CreationDateTime': '2017-06-26 15:21:59.485000+01:00'}}
+
+
+class TestChangeDetector(unittest.TestCase):
+    def create_detector(self, previous_exports, written_tables=()):
+        detector = ChangeDetector(BUCKET, previous_exports, workers=2)
+        detector.cloud_watch_util = Mock()
+        detector.cloud_watch_util.get_metric_sum.side_effect = \
+            lambda namespace, metric, dimensions, start, end: 5.0 if dimensions['TableName'] in written_tables else 0
+
+        return detector
+
+    @mock_s3
+    def test_carries_forward_only_unchanged_tables_with_successful_backup(self):
+        s3 = boto3.client('s3')
+        s3.create_bucket(Bucket=BUCKET)
+        exported_at = time.time() - 3600
+
+        for table_name in ['unchanged', 'resized', 'written']:
+            s3.put_object(Bucket=BUCKET, Key='{}/2017-05-01-00-10-38/_SUCCESS'.format(table_name), Body='')
+
+        s3.put_object(Bucket=BUCKET, Key='failed/2017-05-01-00-10-38/part-0', Body='')
+        previous_exports = record_exports([describe(x) for x in ['unchanged', 'resized', 'written', 'failed']],
+                                          exported_at)
+        tables = [describe('unchanged'), describe('resized', size=2048), describe('written'), describe('failed'),
+                  describe('new')]
+
+        changed, exports = self.create_detector(previous_exports, ['written']).detect(tables)
+        carried_forward = filter(lambda x: x['CarriedForward'], exports)
+
+        self.assertEqual([x['Table']['TableName'] for x in changed], ['resized', 'written', 'failed', 'new'])
+        self.assertEqual(len(exports), 5)
+        self.assertEqual(carried_forward, [dict(previous_exports[0], CarriedForward=True,
+                                                Location='s3://backups/unchanged/2017-05-01-00-10-38/')])
+
+        changed, exports = self.create_detector(exports).detect([describe('unchanged')])
+
+        self.assertEqual(changed, [])
+        self.assertEqual(exports[0]['ExportedAt'], exported_at)
+
+        changed, _ = self.create_detector(exports).detect([describe('unchanged')], now=exported_at + 8 * 86400)
+
+        self.assertEqual(len(changed), 1)
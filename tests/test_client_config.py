@@ -0,0 +1,45 @@
+import unittest
+import boto3
+import sys
+import os
+from mock import Mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from hippolyte.aws_utils import create_client
+from hippolyte.client_config import RetryPolicy, build_client_settings
+
+
+def response(status_code, error_code=None, message=''):
+    parsed = {'Error': {'Code': error_code, 'Message': message}} if error_code else {}
+    return Mock(status_code=status_code), parsed
+
+
+class TestClientConfig(unittest.TestCase):
+    def test_pool_is_sized_for_concurrency(self):
+        self.assertEqual(build_client_settings(concurrency=20)['max_pool_connections'], 22)
+        self.assertEqual(build_client_settings(concurrency=1)['max_pool_connections'], 10)
+        self.assertEqual(build_client_settings({'max_pool_connections': 4}, 20)['max_pool_connections'], 4)
+
+    def test_retry_policy(self):
+        policy = RetryPolicy(max_attempts=3, base_delay=1.0, max_delay=20.0)
+
+        self.assertLessEqual(policy(1, response(400, 'ThrottlingException')), 1.0)
+        self.assertLessEqual(policy(2, response(500, 'InternalServerError')), 2.0)
+        self.assertIsNotNone(policy(1, response(400, 'LimitExceededException', 'Subscriber limit exceeded')))
+        self.assertIsNone(policy(3, response(400, 'ThrottlingException')))
+        self.assertIsNone(policy(1, response(400, 'ValidationException')))
+        self.assertIsNone(policy(1, response(200)))
+
+    def test_client_uses_settings_and_single_retry_policy(self):
+        settings = build_client_settings({'read_timeout': 7, 'max_attempts': 2}, 30)
+        client = create_client('dynamodb', boto3.session.Session(region_name='us-east-1'), settings)
+
+        self.assertEqual(client.meta.config.read_timeout, 7)
+        self.assertEqual(client.meta.config.max_pool_connections, 32)
+
+        delays = [x for _, x in client.meta.events.emit('needs-retry.dynamodb.DescribeTable', attempts=2,
+                                                        response=response(400, 'ThrottlingException'),
+                                                        caught_exception=None, endpoint=None, operation=None,
+                                                        request_dict={}) if x is not None]
+        self.assertEqual(delays, [])
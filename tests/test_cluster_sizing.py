@@ -0,0 +1,54 @@
+import unittest
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from hippolyte.cluster_sizing import choose_cluster, M1_MEDIUM_CLUSTER_MEMORY
+from hippolyte.utils import MAX_CORE_INSTANCE_COUNT, MAX_DURATION_SINGLE_PIPELINE, MAX_DURATION_SEC
+
+M3_XLARGE_CLUSTER_MEMORY = '--yarn-key-value,yarn.nodemanager.resource.memory-mb=11520,' \
+                           '--yarn-key-value,yarn.scheduler.maximum-allocation-mb=11520,' \
+                           '--yarn-key-value,yarn.scheduler.minimum-allocation-mb=1440,' \
+                           '--yarn-key-value,yarn.app.mapreduce.am.resource.mb=2880,' \
+                           '--mapred-key-value,mapreduce.map.memory.mb=5760,' \
+                           '--mapred-key-value,mapreduce.map.java.opts=-Xmx4608M,' \
+                           '--mapred-key-value,mapreduce.reduce.memory.mb=2880,' \
+                           '--mapred-key-value,mapreduce.reduce.java.opts=-Xmx2304m,' \
+                           '--mapred-key-value,mapreduce.map.speculative=false'
+
+
+class TestClusterSizing(unittest.TestCase):
+    def test_small_pipelines_stay_on_single_m1_medium(self):
+        cluster = choose_cluster(100 * 1024 ** 2, 50, MAX_DURATION_SINGLE_PIPELINE)
+
+        self.assertEqual(cluster, {
+            'masterInstanceType': 'm1.medium',
+            'coreInstanceType': 'm1.medium',
+            'coreInstanceCount': 1,
+            'clusterMemory': M1_MEDIUM_CLUSTER_MEMORY
+        })
+
+    def test_medium_pipelines_use_single_m3_xlarge(self):
+        cluster = choose_cluster(10 * 1024 ** 3, 500, MAX_DURATION_SINGLE_PIPELINE)
+
+        self.assertEqual(cluster, {
+            'masterInstanceType': 'm3.xlarge',
+            'coreInstanceType': 'm3.xlarge',
+            'coreInstanceCount': 1,
+            'clusterMemory': M3_XLARGE_CLUSTER_MEMORY
+        })
+
+    def test_big_pipelines_are_scaled_out(self):
+        medium = choose_cluster(100 * 1024 ** 3, 20000, MAX_DURATION_SINGLE_PIPELINE)
+        big = choose_cluster(10 * 1024 ** 4, 40000, MAX_DURATION_SINGLE_PIPELINE)
+
+        self.assertGreater(medium['coreInstanceCount'], 1)
+        self.assertEqual(big['coreInstanceCount'], MAX_CORE_INSTANCE_COUNT)
+        self.assertIn(big['coreInstanceType'], ('m3.2xlarge', 'r3.2xlarge'))
+
+    def test_read_bound_pipelines_are_not_scaled_out(self):
+        cluster = choose_cluster(100 * 1024 ** 3, 50, MAX_DURATION_SEC)
+
+        self.assertEqual(cluster['coreInstanceType'], 'm3.xlarge')
+        self.assertEqual(cluster['coreInstanceCount'], 1)
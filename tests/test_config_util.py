@@ -0,0 +1,104 @@
+import unittest
+import boto3
+import json
+import sys
+import os
+from mock import patch
+from moto import mock_s3
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from hippolyte.config_util import ConfigUtil, reset_metadata_cache
+from test_utils import load_backup_metadata
+
+BUCKET = 'euw1-dynamodb-backups-prd-480503113116'
+
+
+class TestConfigUtil(unittest.TestCase):
+    def setUp(self):
+        reset_metadata_cache()
+        self.backup_metadata = load_backup_metadata()
+        self.metadata = json.loads(self.backup_metadata)
+        self.pipelines = [{
+            'pipeline_id': 'df-1',
+            'backed_up_tables': ['table'],
+            'definition': {'objects': [
+                {'id': 'DDBSourceTable0', 'tableName': 'table', 'readThroughputPercent': '0.5',
+                 'type': 'DynamoDBDataNode'},
+                {'id': 'S3BackupLocation0', 'directoryPath': 's3://bucket/table/2017-05-01-00-10-38',
+                 'type': 'S3DataNode'},
+                {'id': 'EmrClusterForBackup', 'type': 'EmrCluster', 'releaseLabel': 'emr-5.23.0'}
+            ]}
+        }]
+
+    def tearDown(self):
+        reset_metadata_cache()
+
+    @mock_s3
+    def test_saves_compact_sections(self):
+        s3 = boto3.client('s3')
+        s3.create_bucket(Bucket=BUCKET)
+        config_util = ConfigUtil()
+
+        config_util.save_configuration(self.pipelines, BUCKET, self.metadata['Tables'],
+                                       self.metadata['ScalingPolicies'], self.metadata['ScalableTargets'])
+
+        pipelines_only = config_util.load_configuration(BUCKET, sections=('Pipelines',))
+        configuration = config_util.load_configuration(BUCKET)
+        table = configuration['Tables'][0]['Table']
+        stored = sum(x['Size'] for x in s3.list_objects(Bucket=BUCKET)['Contents'])
+
+        self.assertEqual(pipelines_only.keys(), ['Pipelines'])
+        self.assertEqual([x['id'] for x in pipelines_only['Pipelines'][0]['definition']['objects']],
+                         ['DDBSourceTable0', 'S3BackupLocation0'])
+        self.assertEqual(table['TableName'], self.metadata['Tables'][0]['Table']['TableName'])
+        self.assertIn('TableArn', table)
+        self.assertNotIn('KeySchema', table)
+        self.assertEqual(configuration['ScalableTargets'][0]['RoleARN'],
+                         self.metadata['ScalableTargets'][0]['RoleARN'])
+        self.assertEqual(len(configuration['ScalingPolicies']), len(self.metadata['ScalingPolicies']))
+        self.assertLess(stored, len(self.backup_metadata) / 2)
+
+    @mock_s3
+    def test_loads_legacy_metadata(self):
+        s3 = boto3.client('s3')
+        s3.create_bucket(Bucket=BUCKET)
+        s3.put_object(Bucket=BUCKET, Key='backup_metadata-2017-05-01-00-10-38', Body=self.backup_metadata)
+
+        configuration = ConfigUtil().load_configuration(BUCKET, sections=('Tables', 'Pipelines'))
+
+        self.assertEqual(sorted(configuration), ['Pipelines', 'Tables'])
+        self.assertEqual(configuration['Tables'], self.metadata['Tables'])
+
+    @mock_s3
+    def test_loads_latest_metadata_once_without_listing(self):
+        s3 = boto3.client('s3')
+        s3.create_bucket(Bucket=BUCKET)
+        s3.put_object(Bucket=BUCKET, Key='backup_metadata-2099-05-01-00-10-38', Body=self.backup_metadata)
+        ConfigUtil().save_configuration(self.pipelines, BUCKET, [], [], [])
+        reset_metadata_cache()
+
+        with patch('hippolyte.aws_utils.S3Util.list_objects') as list_objects:
+            with patch('hippolyte.aws_utils.S3Util.get_json', wraps=ConfigUtil().s3_util.get_json) as get_json:
+                pipelines = ConfigUtil().load_configuration(BUCKET, sections=('Pipelines',))['Pipelines']
+                ConfigUtil().load_configuration(BUCKET, sections=('Pipelines',))
+
+        self.assertEqual(pipelines[0]['pipeline_id'], 'df-1')
+        self.assertEqual(get_json.call_count, 2)
+        self.assertFalse(list_objects.called)
+
+    @mock_s3
+    def test_saves_pipelines_of_latest_metadata_in_place(self):
+        s3 = boto3.client('s3')
+        s3.create_bucket(Bucket=BUCKET)
+        ConfigUtil().save_configuration(self.pipelines + [dict(self.pipelines[0], pipeline_id='df-2')], BUCKET,
+                                        self.metadata['Tables'], [], [])
+        timestamp = ConfigUtil().load_backup_timestamp(BUCKET)
+
+        ConfigUtil().save_pipelines(BUCKET, self.pipelines)
+        reset_metadata_cache()
+        configuration = ConfigUtil().load_configuration(BUCKET, sections=('Tables', 'Pipelines'))
+
+        self.assertEqual([x['pipeline_id'] for x in configuration['Pipelines']], ['df-1'])
+        self.assertEqual(len(configuration['Tables']), len(self.metadata['Tables']))
+        self.assertEqual(ConfigUtil().load_backup_timestamp(BUCKET), timestamp)
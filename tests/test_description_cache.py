@@ -0,0 +1,71 @@
+import unittest
+import boto3
+import sys
+import os
+from email.utils import formatdate
+from mock import Mock
+from moto import mock_s3
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from hippolyte.description_cache import TableDescriptionCache, refresh_descriptions
+
+BUCKET = 'euw1-dynamodb-backups-prd-480503113116'
+
+
+def describe_tables(table_names, workers):
+    return [{'Table': {'TableName': table_name}} for table_name in table_names]
+
+
+class TestTableDescriptionCache(unittest.TestCase):
+    def create_cache(self, ttl=3600):
+        cache = TableDescriptionCache(BUCKET, ttl)
+        cache.dynamo_db_util = Mock()
+        cache.dynamo_db_util.describe_tables.side_effect = describe_tables
+
+        return cache
+
+    @mock_s3
+    def test_only_new_and_stale_tables_are_described(self):
+        boto3.client('s3').create_bucket(Bucket=BUCKET)
+
+        cache = self.create_cache()
+        cache.refresh(['a', 'b', 'c'])
+        cache.save()
+
+        cache = self.create_cache()
+        cache.load()['b']['CachedAt'] -= 7200
+        descriptions = cache.refresh(['a', 'b', 'd'])
+
+        cache.dynamo_db_util.describe_tables.assert_called_once_with(['b', 'd'], 5)
+        self.assertListEqual(map(lambda x: x['Table']['TableName'], descriptions), ['a', 'b', 'd'])
+        self.assertListEqual(sorted(cache.load().keys()), ['a', 'b', 'd'])
+
+    @mock_s3
+    def test_invalidate(self):
+        boto3.client('s3').create_bucket(Bucket=BUCKET)
+
+        cache = self.create_cache()
+        cache.refresh(['a'])
+        cache.save()
+        cache.invalidate()
+
+        cache = self.create_cache()
+        self.assertListEqual(cache.snapshot(), [])
+        cache.refresh(['a'])
+        cache.dynamo_db_util.describe_tables.assert_called_once_with(['a'], 5)
+
+    def test_refresh_descriptions_in_place(self):
+        now = formatdate(usegmt=True)
+        fresh = {'Table': {'TableName': 'fresh'}, 'ResponseMetadata': {'HTTPHeaders': {'date': now}}}
+        cached = {'Table': {'TableName': 'cached', 'ProvisionedThroughput': {'ReadCapacityUnits': 5}}}
+        dynamo_db_util = Mock()
+        dynamo_db_util.describe_table.return_value = {
+            'Table': {'TableName': 'cached', 'ProvisionedThroughput': {'ReadCapacityUnits': 50}},
+            'ResponseMetadata': {'HTTPHeaders': {'date': now}}
+        }
+
+        refresh_descriptions([fresh, cached], dynamo_db_util=dynamo_db_util)
+
+        dynamo_db_util.describe_table.assert_called_once_with('cached')
+        self.assertEqual(cached['Table']['ProvisionedThroughput']['ReadCapacityUnits'], 50)
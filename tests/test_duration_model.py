@@ -0,0 +1,78 @@
+import unittest
+import boto3
+import sys
+import os
+from datetime import datetime
+from dateutil.tz import tzutc
+from moto import mock_s3
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from hippolyte.duration_model import DurationModel
+from hippolyte.utils import EMR_BOOTSTRAP_TIME, ACTIVITY_BOOTSTRAP_TIME, estimate_backup_duration
+
+STARTED = datetime(2018, 1, 1, 0, 10, 0, tzinfo=tzutc())
+
+
+def create_configuration(table_sizes):
+    return {
+        'Tables': [{'Table': {'TableName': table_name, 'TableSizeBytes': size,
+                              'ProvisionedThroughput': {'ReadCapacityUnits': 100}}}
+                   for table_name, size in table_sizes],
+        'Pipelines': [{
+            'pipeline_id': 'df-1',
+            'backed_up_tables': [table_name for table_name, _ in table_sizes],
+            'definition': {'objects': [{'tableName': table_name, 'readThroughputPercent': '0.5'}
+                                       for table_name, _ in table_sizes]}
+        }]
+    }
+
+
+def create_success_flag(table_name, seconds_after_start):
+    return {
+        'Key': '{}/2018-01-01-00-10-00/_SUCCESS'.format(table_name),
+        'LastModified': datetime.fromtimestamp(
+            (STARTED - datetime(1970, 1, 1, tzinfo=tzutc())).total_seconds() + seconds_after_start, tzutc())
+    }
+
+
+class TestDurationModel(unittest.TestCase):
+    def test_learns_durations_of_tables_exported_one_after_another(self):
+        configuration = create_configuration([('a', 1024 ** 3), ('b', 1024 ** 3)])
+        a_duration = 1000
+        b_duration = 4000
+        a_end = EMR_BOOTSTRAP_TIME + ACTIVITY_BOOTSTRAP_TIME + a_duration
+        success_flags = {
+            'a': create_success_flag('a', a_end),
+            'b': create_success_flag('b', a_end + ACTIVITY_BOOTSTRAP_TIME + b_duration)
+        }
+        boosts = {'b': {'ReadCapacityUnits': 200, 'ReadThroughputPercent': 0.5}}
+
+        model = DurationModel()
+        model.observe_backups(configuration, boosts, ['df-1'], success_flags)
+
+        self.assertAlmostEqual(model.estimate('a', 1024 ** 3, 100, 0.5), a_duration)
+        self.assertAlmostEqual(model.estimate('b', 1024 ** 3, 200, 0.5), b_duration)
+        self.assertAlmostEqual(model.estimate('c', 1024 ** 3, 100, 0.5),
+                               estimate_backup_duration(0.5, 1024 ** 3, 100))
+        self.assertEqual(model.accuracy_report()['Tables'], 2)
+
+    def test_skips_pipelines_with_failed_tables(self):
+        configuration = create_configuration([('a', 1024 ** 3), ('b', 1024 ** 3)])
+
+        model = DurationModel()
+        model.observe_backups(configuration, {}, ['df-1'], {'a': create_success_flag('a', 3600)})
+
+        self.assertFalse(model.tables)
+        self.assertEqual(model.accuracy_report()['Tables'], 0)
+
+    @mock_s3
+    def test_save_and_load(self):
+        boto3.client('s3').create_bucket(Bucket='backups')
+        self.assertFalse(DurationModel.load('backups').tables)
+
+        model = DurationModel()
+        model.observe('a', 1024 ** 3, 100, 0.5, 1000)
+        model.save('backups')
+
+        self.assertEqual(DurationModel.load('backups').tables, model.tables)
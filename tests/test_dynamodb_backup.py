@@ -3,11 +3,14 @@ import boto3
 import json
 import sys
 import os
+from mock import Mock, patch
 from moto import mock_dynamodb2
 
 sys.path.append(os.path.join(os.getcwd() + '/../code'))
 
-from hippolyte.dynamodb_backup import get_table_descriptions
+from hippolyte.aws_utils import DynamoDBUtil
+from hippolyte.dynamodb_backup import get_finished_tables, get_table_descriptions, remove_failed_pipelines, \
+    export_in_process
 from test_utils import create_test_table, load_backup_metadata
 
 
@@ -62,3 +65,56 @@ class TestDynamoDbBackup(unittest.TestCase):
         expected_tables.sort()
 
         self.assertListEqual(included_tables, expected_tables)
+
+    @mock_dynamodb2
+    def test_describe_tables_concurrently_keeps_input_order(self):
+        dynamodb_client = boto3.client('dynamodb', region_name='eu-west-1')
+        table = json.loads(load_backup_metadata())['Tables'][0]['Table']
+        table_names = ['table-{}'.format(i) for i in reversed(range(20))]
+
+        for table_name in table_names:
+            create_test_table(dynamodb_client, table_name, table)
+
+        table_descriptions = DynamoDBUtil().describe_tables(table_names, workers=5)
+        described_tables = map(lambda x: x['Table']['TableName'], table_descriptions)
+
+        self.assertListEqual(described_tables, table_names)
+
+    def test_get_finished_tables_from_success_flags(self):
+        event = {'Records': [
+            {'s3': {'bucket': {'name': 'backups'}, 'object': {'key': 'my+table/2017-05-01-00-10-38/_SUCCESS'}}},
+            {'s3': {'bucket': {'name': 'backups'}, 'object': {'key': 'table/2017-05-01-00-10-38/part-0'}}}
+        ]}
+
+        self.assertListEqual(get_finished_tables(event), [('backups', 'my table', '2017-05-01-00-10-38')])
+
+    def test_remove_failed_pipelines(self):
+        deployer, booster, monitor = Mock(), Mock(), Mock()
+        pipelines = [{'pipeline_id': 'df-1', 'backed_up_tables': ['a', 'b']},
+                     {'pipeline_id': 'df-2', 'backed_up_tables': ['c']}]
+        failures = [{'pipeline_id': 'df-1', 'stage': 'activate_pipeline', 'error': 'InternalServiceError'}]
+
+        remove_failed_pipelines(deployer, booster, pipelines, failures, monitor)
+
+        deployer.delete_pipelines.assert_called_once_with(['df-1'])
+        booster.config_util.save_pipelines.assert_called_once_with(booster.backup_bucket, [pipelines[1]])
+        booster.restore_tables_throughput.assert_called_once_with(['a', 'b'])
+        monitor.notify_about_failed_deployments.assert_called_once_with(failures, [pipelines[0]])
+
+    @patch('hippolyte.config_util.ConfigUtil.save_exports')
+    @patch('hippolyte.table_exporter.TableExporter.export_tables')
+    @patch('hippolyte.pipeline_scheduler.get_remaining_seconds', return_value=45)
+    def test_export_in_process_records_failed_exports(self, remaining_mock, export_tables, save_exports):
+        duration_model = Mock()
+        duration_model.estimate.side_effect = lambda table_name, size, rcu, percent: size / 1000
+        tables = [{'Table': {'TableName': name, 'TableSizeBytes': size, 'ProvisionedThroughput': {
+            'ReadCapacityUnits': 10}}} for name, size in (('small', 1000), ('broken', 2000), ('late', 20000))]
+        exports = [{'TableName': x['Table']['TableName'], 'Backend': 'scan'} for x in tables]
+        export_tables.side_effect = lambda descriptions, timestamp: ({'small': 's3://bucket/small/'},
+                                                                     descriptions[1:])
+
+        export_in_process('bucket', tables, '2099-06-06-00-00-01', 10 ** 6, duration_model, exports)
+
+        export_tables.assert_called_once_with(tables[:2], '2099-06-06-00-00-01')
+        save_exports.assert_called_once_with('bucket', exports)
+        self.assertEqual([x.get('Failed', False) for x in exports], [False, True, True])
@@ -11,6 +11,7 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 
 import hippolyte.dynamodb_booster
 import hippolyte.aws_utils
+from hippolyte.config_util import reset_metadata_cache
 from test_utils import create_test_table, load_backup_metadata
 
 TABLE_NAME = 'prd-shd-euw1-scotty_audit-actions'
@@ -32,6 +33,7 @@ class FakeApplicationAutoscalingClient():
     def __init__(self):
         self.scalable_targets = []
         self.scaling_policies = []
+        self.requests = []
 
     def get_paginator(self, paginator_name):
         _list = []
@@ -43,10 +45,16 @@ class FakeApplicationAutoscalingClient():
             _list = self.scaling_policies
             _key = 'ScalingPolicies'
 
+        def paginate(ServiceNamespace, ResourceIds=None, ResourceId=None, ScalableDimension=None):
+            self.requests.append((paginator_name, ResourceIds or ResourceId))
+            items = filter(lambda x: ResourceIds is None or x['ResourceId'] in ResourceIds, _list)
+            items = filter(lambda x: ResourceId is None or x['ResourceId'] == ResourceId, items)
+            items = filter(lambda x: ScalableDimension is None or x['ScalableDimension'] == ScalableDimension, items)
+
+            return [{_key: items}]
+
         paginator = Mock()
-        paginator.paginate = Mock(return_value=[{
-            _key: _list
-        }])
+        paginator.paginate = Mock(side_effect=paginate)
 
         return paginator
 
@@ -114,10 +122,13 @@ class FakeApplicationAutoscalingClient():
 
 
 class TestDynamoDbBooster(unittest.TestCase):
+    def setUp(self):
+        reset_metadata_cache()
+
     @mock_dynamodb2
     @mock_datapipeline
     @mock_s3
-    @patch("hippolyte.config_util.ConfigUtil.list_backed_up_tables", return_value=TABLE_NAME)
+    @patch("hippolyte.config_util.ConfigUtil.list_backed_up_tables", return_value=[TABLE_NAME])
     @patch("hippolyte.aws_utils.ApplicationAutoScalingUtil._init_client",
            return_value=FakeApplicationAutoscalingClient())
     def test_restore_throughput(self, config_mock, autoscaling_mock):
@@ -138,6 +149,98 @@ class TestDynamoDbBooster(unittest.TestCase):
         table = dynamodb_client.describe_table(TableName=TABLE_NAME)
         self.assertEqual(table['Table']['ProvisionedThroughput']['ReadCapacityUnits'], old_rcu)
 
+    @mock_dynamodb2
+    @mock_datapipeline
+    @mock_s3
+    @patch("hippolyte.config_util.ConfigUtil.list_backed_up_tables", return_value=[TABLE_NAME])
+    @patch("hippolyte.aws_utils.ApplicationAutoScalingUtil._init_client",
+           return_value=FakeApplicationAutoscalingClient())
+    def test_restore_throughput_of_table_boosted_since_cached(self, config_mock, autoscaling_mock):
+        dynamodb_client = boto3.client('dynamodb', region_name='eu-west-1')
+        backup_metadata = load_backup_metadata()
+        table_descriptions = json.loads(backup_metadata)['Tables']
+        create_test_table(dynamodb_client, TABLE_NAME, table_descriptions[0]['Table'])
+        old_rcu = table_descriptions[0]['Table']['ProvisionedThroughput']['ReadCapacityUnits']
+        dynamodb_client.update_table(TableName=TABLE_NAME,
+                                     ProvisionedThroughput={'ReadCapacityUnits': 1000, 'WriteCapacityUnits': 1})
+
+        bucket = 'euw1-dynamodb-backups-prd-480503113116'
+        # cached description still has throughput from before the boost
+        booster = hippolyte.dynamodb_booster.DynamoDbBooster(table_descriptions[:1], bucket, 0.5)
+        create_backup_metadata(boto3.client('s3'), bucket, 'backup_metadata-2099-06-06-00-00-01', backup_metadata)
+
+        booster.restore_throughput()
+
+        table = dynamodb_client.describe_table(TableName=TABLE_NAME)
+        self.assertEqual(table['Table']['ProvisionedThroughput']['ReadCapacityUnits'], old_rcu)
+
+    @mock_dynamodb2
+    @mock_s3
+    @patch("hippolyte.aws_utils.ApplicationAutoScalingUtil._init_client",
+           return_value=FakeApplicationAutoscalingClient())
+    def test_restore_table_throughput(self, autoscaling_mock):
+        dynamodb_client = boto3.client('dynamodb', region_name='eu-west-1')
+        backup_metadata = load_backup_metadata()
+        table_descriptions = json.loads(backup_metadata)['Tables']
+        create_test_table(dynamodb_client, TABLE_NAME, table_descriptions[0]['Table'])
+        old_rcu = get_old_rcu_and_boost(table_descriptions, 1000)
+
+        bucket = 'euw1-dynamodb-backups-prd-480503113116'
+        booster = hippolyte.dynamodb_booster.DynamoDbBooster(table_descriptions, bucket, 0.5)
+        booster.application_auto_scaling_util.client = FakeApplicationAutoscalingClient()
+        create_backup_metadata(boto3.client('s3'), bucket, 'backup_metadata-2099-06-06-00-00-01', backup_metadata)
+
+        results = booster.restore_table_throughput(TABLE_NAME)
+        targets = booster.application_auto_scaling_util.describe_scalable_targets('dynamodb')['ScalableTargets']
+        repeated = booster.restore_table_throughput(TABLE_NAME)
+
+        table = dynamodb_client.describe_table(TableName=TABLE_NAME)
+        self.assertEqual(table['Table']['ProvisionedThroughput']['ReadCapacityUnits'], old_rcu)
+        self.assertEqual([x['status'] for x in results], ['restored'])
+        self.assertEqual(repeated, [])
+        self.assertEqual([x['ResourceId'] for x in targets], ['table/' + TABLE_NAME])
+        self.assertEqual(booster.restore_table_throughput('not-backed-up'), [])
+
+    @mock_dynamodb2
+    @mock_s3
+    @patch("hippolyte.aws_utils.ApplicationAutoScalingUtil._init_client",
+           return_value=FakeApplicationAutoscalingClient())
+    def test_restore_table_throughput_only_after_its_backup(self, autoscaling_mock):
+        dynamodb_client = boto3.client('dynamodb', region_name='eu-west-1')
+        backup_metadata = load_backup_metadata()
+        table_descriptions = json.loads(backup_metadata)['Tables']
+        create_test_table(dynamodb_client, TABLE_NAME, table_descriptions[0]['Table'])
+        get_old_rcu_and_boost(table_descriptions, 1000)
+
+        bucket = 'euw1-dynamodb-backups-prd-480503113116'
+        booster = hippolyte.dynamodb_booster.DynamoDbBooster(table_descriptions, bucket, 0.5)
+        booster.application_auto_scaling_util.client = FakeApplicationAutoscalingClient()
+        create_backup_metadata(boto3.client('s3'), bucket, 'backup_metadata-2099-06-06-00-00-01', backup_metadata)
+
+        self.assertEqual(booster.restore_table_throughput(TABLE_NAME, '2099-06-05-00-00-01'), [])
+        self.assertEqual([x['status'] for x in booster.restore_table_throughput(TABLE_NAME, '2099-06-06-00-00-01')],
+                         ['restored'])
+
+    @mock_dynamodb2
+    @mock_s3
+    @patch("hippolyte.aws_utils.ApplicationAutoScalingUtil._init_client",
+           return_value=FakeApplicationAutoscalingClient())
+    def test_restore_table_throughput_skips_in_process_exports(self, autoscaling_mock):
+        dynamodb_client = boto3.client('dynamodb', region_name='eu-west-1')
+        backup_metadata = json.loads(load_backup_metadata())
+        backup_metadata['Exports'] = [{'TableName': TABLE_NAME, 'Backend': 'scan'}]
+        table_descriptions = backup_metadata['Tables']
+        create_test_table(dynamodb_client, TABLE_NAME, table_descriptions[0]['Table'])
+        get_old_rcu_and_boost(table_descriptions, 1000)
+
+        bucket = 'euw1-dynamodb-backups-prd-480503113116'
+        booster = hippolyte.dynamodb_booster.DynamoDbBooster(table_descriptions, bucket, 0.5)
+        create_backup_metadata(boto3.client('s3'), bucket, 'backup_metadata-2099-06-06-00-00-01',
+                               json.dumps(backup_metadata))
+
+        self.assertEqual(booster.restore_table_throughput(TABLE_NAME, '2099-06-06-00-10-00'), [])
+        self.assertEqual(table_descriptions[0]['Table']['ProvisionedThroughput']['ReadCapacityUnits'], 1000)
+
     @mock_dynamodb2
     @mock_datapipeline
     @mock_s3
@@ -220,3 +323,41 @@ class TestDynamoDbBooster(unittest.TestCase):
 
         booster.disable_auto_scaling(scaling_policies, scalable_targets)
         self.assertEqual(logger_mock.warn.call_count, 2)
+
+    @mock_dynamodb2
+    @mock_datapipeline
+    @mock_s3
+    @patch("hippolyte.aws_utils.ApplicationAutoScalingUtil._init_client",
+           return_value=FakeApplicationAutoscalingClient())
+    def test_lists_autoscaling_of_backed_up_tables_and_indexes_only(self, autoscaling_mock):
+        backup_metadata_dict = json.loads(load_backup_metadata())
+        table_descriptions = backup_metadata_dict['Tables']
+        table = table_descriptions[0]['Table']
+        index_resource_id = 'table/{}/index/{}'.format(TABLE_NAME, table['GlobalSecondaryIndexes'][0]['IndexName'])
+
+        booster = hippolyte.dynamodb_booster.DynamoDbBooster(table_descriptions, 'foo', 0.5)
+        autoscaling_util = booster.application_auto_scaling_util
+        autoscaling_util.client = FakeApplicationAutoscalingClient()
+
+        for resource_id, dimension in [('table/' + TABLE_NAME, 'dynamodb:table:ReadCapacityUnits'),
+                                       ('table/' + TABLE_NAME, 'dynamodb:table:WriteCapacityUnits'),
+                                       (index_resource_id, 'dynamodb:index:ReadCapacityUnits'),
+                                       ('table/not-backed-up', 'dynamodb:table:ReadCapacityUnits')]:
+            autoscaling_util.register_scalable_target('dynamodb', resource_id, dimension, 1, 10, 'role')
+            autoscaling_util.put_scaling_policy(resource_id + dimension, 'dynamodb', resource_id, dimension,
+                                                'TargetTrackingScaling', {})
+
+        scalable_targets = booster.list_dynamodb_scalable_targets()
+        scaling_policies = booster.list_dynamodb_scaling_policies(scalable_targets)
+
+        expected = [('table/' + TABLE_NAME, 'dynamodb:table:ReadCapacityUnits'),
+                    (index_resource_id, 'dynamodb:index:ReadCapacityUnits')]
+        self.assertListEqual(map(lambda x: (x['ResourceId'], x['ScalableDimension']), scalable_targets), expected)
+        self.assertListEqual(map(lambda x: (x['ResourceId'], x['ScalableDimension']), scaling_policies), expected)
+        self.assertIn(('describe_scalable_targets', ['table/' + TABLE_NAME, index_resource_id]),
+                      autoscaling_util.client.requests)
+
+        booster.disable_auto_scaling(scaling_policies, scalable_targets)
+
+        self.assertEqual(len(autoscaling_util.client.scalable_targets), 2)
+        self.assertEqual(len(autoscaling_util.client.scaling_policies), 2)
@@ -0,0 +1,51 @@
+import unittest
+import boto3
+import sys
+import os
+from botocore.exceptions import ClientError
+from moto import mock_s3
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from hippolyte.aws_utils import S3Util
+from hippolyte.instrumentation import get_record_key, phase, start_invocation
+
+
+class TestInstrumentation(unittest.TestCase):
+    @mock_s3
+    def test_records_phases_and_api_calls(self):
+        boto3.client('s3').create_bucket(Bucket='backups')
+        recorder = start_invocation(Account='123456789012', Action='monitor')
+        s3_util = S3Util()
+
+        with phase('save'):
+            s3_util.put_json('backups', 'a', {})
+
+        with phase('load'):
+            s3_util.get_json('backups', 'a')
+            self.assertRaises(ClientError, s3_util.get_json, 'backups', 'missing')
+
+        recorder.record_attempt('s3.GetObject', {'Error': {'Code': 'SlowDown'}}, None)
+        record = recorder.record(Tables=2)
+
+        self.assertEqual(record['Api']['s3.PutObject']['Calls'], 1)
+        self.assertEqual(record['Api']['s3.GetObject']['Calls'], 2)
+        self.assertEqual(record['Api']['s3.GetObject']['Errors'], 1)
+        self.assertEqual(record['Api']['s3.GetObject']['Throttles'], 1)
+        self.assertEqual(record['Api']['s3.GetObject']['Retries'], 1)
+        self.assertEqual(record['ApiCalls'], 3)
+        self.assertEqual(sorted(record['Phases']), ['load', 'save'])
+        self.assertEqual(record['Tables'], 2)
+        self.assertEqual(record['Action'], 'monitor')
+
+        metrics = record['_aws']['CloudWatchMetrics'][0]
+        self.assertEqual(metrics['Dimensions'], [['Account', 'Action']])
+        self.assertTrue(all(x['Name'] in record for x in metrics['Metrics']))
+        self.assertIn('Phase.load', [x['Name'] for x in metrics['Metrics']])
+        self.assertTrue(get_record_key(record).startswith('invocation_metrics/monitor/'))
+
+    def test_new_invocation_starts_empty(self):
+        with phase('describe_tables'):
+            pass
+
+        self.assertEqual(start_invocation().record()['Phases'], {})
@@ -2,12 +2,13 @@ import unittest
 import boto3
 import sys
 import os
+from mock import Mock
 from moto import mock_s3, mock_datapipeline, mock_sns
 from datetime import datetime, timedelta
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from hippolyte.monitor import Monitor, is_backup_from_current_batch
+from hippolyte.monitor import Monitor, is_backup_from_current_batch, get_backup_batch_prefixes, IN_PROCESS_EXPORTS
 
 
 class TestESMonitor(unittest.TestCase):
@@ -20,8 +21,9 @@ class TestESMonitor(unittest.TestCase):
         s3 = boto3.client('s3', region_name='eu-west-1')
         s3.create_bucket(Bucket=bucket)
 
-        for day in range(1, 30):
-            key = 'prd-shd-euw1-scotty_audit-events/2099-05-{}-00-10-38/'.format(str(day).zfill(2))
+        for day in range(0, 30):
+            date = (datetime.utcnow() - timedelta(days=day)).strftime('%Y-%m-%d')
+            key = 'prd-shd-euw1-scotty_audit-events/{}-00-10-38/'.format(date)
             for file_name in range(0, 100):
                 s3.put_object(Bucket=bucket, Key=key + str(file_name), Body='')
 
@@ -42,10 +44,83 @@ class TestESMonitor(unittest.TestCase):
 
         self.assertFalse(failed_tables)
 
+    @mock_sns
+    @mock_datapipeline
+    @mock_s3
+    def test_failure_when_only_older_backups_exist(self):
+        bucket = 'euw1-dynamodb-backups-prd-480503113116'
+        s3 = boto3.client('s3', region_name='eu-west-1')
+        s3.create_bucket(Bucket=bucket)
+        s3.put_object(Bucket=bucket, Key='prd-shd-euw1-scotty_audit-events/2017-05-01-00-10-38/_SUCCESS', Body='')
+
+        dummy_pipeline = {
+            "definition": {
+                "objects": [
+                    {
+                        "directoryPath": "s3://euw1-dynamodb-backups-prd-480503113116/prd-shd-euw1-scotty_audit-events/#{format(@scheduledStartTime, 'YYYY-MM-dd-HH-mm-ss')}"
+                    }
+                ]
+            }
+        }
+
+        monitor = Monitor('480503113116', 'log_bucket', bucket, 'dummy_sns')
+        failed_tables = monitor.extract_failed_tables(dummy_pipeline)
+
+        self.assertListEqual(failed_tables, ['prd-shd-euw1-scotty_audit-events'])
+
+    def test_get_backup_batch_prefixes(self):
+        self.assertListEqual(get_backup_batch_prefixes('table', '2017-05-01-00-10-38'),
+                             ['table/2017-05-01-00-10-38/'])
+
+        prefixes = get_backup_batch_prefixes('table', "#{format(@scheduledStartTime, 'YYYY-MM-dd-HH-mm-ss')}")
+        self.assertEqual(prefixes[0], 'table/{}'.format(datetime.utcnow().strftime('%Y-%m-%d')))
+        self.assertEqual(len(prefixes), 2)
+
     def test_is_backup_from_current_batch_success(self):
         last_modified = datetime.utcnow()
         self.assertTrue(is_backup_from_current_batch({'LastModified': last_modified}))
 
     def test_is_backup_from_current_batch_failure(self):
         last_modified = datetime.utcnow() - timedelta(hours=26)
-        self.assertFalse(is_backup_from_current_batch({'LastModified': last_modified}))
\ No newline at end of file
+        self.assertFalse(is_backup_from_current_batch({'LastModified': last_modified}))
+    def test_notify_about_failed_deployments(self):
+        monitor = Monitor('480503113116', 'log_bucket', 'bucket', 'dummy_sns')
+        monitor.sns_util = Mock()
+
+        monitor.notify_about_failed_deployments(
+            [{'pipeline_id': 'df-1', 'stage': 'activate_pipeline', 'error': 'InternalServiceError'}],
+            [{'pipeline_id': 'df-1', 'backed_up_tables': ['a', 'b']}])
+
+        topic, subject, body = monitor.sns_util.publish.call_args[0]
+        self.assertEqual(topic, 'dummy_sns')
+        self.assertIn('df-1: a,b', body)
+        self.assertIn('activate_pipeline: InternalServiceError', body)
+
+    @mock_s3
+    def test_notifies_once_about_failed_in_process_exports(self):
+        bucket = 'euw1-dynamodb-backups-prd-480503113116'
+        s3 = boto3.client('s3', region_name='eu-west-1')
+        s3.create_bucket(Bucket=bucket)
+        s3.put_object(Bucket=bucket, Key='exported/2099-06-06-00-00-01/_SUCCESS', Body='')
+        exports = [
+            {'TableName': 'exported', 'Backend': 'scan', 'CarriedForward': False,
+             'Location': 's3://{}/exported/2099-06-06-00-00-01/'.format(bucket)},
+            {'TableName': 'missing', 'Backend': 'scan', 'CarriedForward': False,
+             'Location': 's3://{}/missing/2099-06-06-00-00-01/'.format(bucket)},
+            {'TableName': 'skipped', 'Backend': 'scan', 'CarriedForward': False, 'Failed': True,
+             'Location': 's3://{}/skipped/2099-06-06-00-00-01/'.format(bucket)},
+            {'TableName': 'pipeline', 'Backend': 'datapipeline', 'CarriedForward': False}
+        ]
+        monitor = Monitor('480503113116', 'log_bucket', bucket, 'dummy_sns')
+        monitor.sns_util = Mock()
+        monitor.config_util = Mock()
+        monitor.config_util.load_configuration.return_value = {'Pipelines': [], 'Exports': exports}
+
+        monitor.notify_about_failures([])
+        monitor.notify_about_failures([])
+
+        body = monitor.sns_util.publish.call_args[0][2]
+        self.assertEqual(monitor.sns_util.publish.call_count, 1)
+        self.assertIn('{}: missing,skipped'.format(IN_PROCESS_EXPORTS), body)
+        monitor.config_util.save_exports.assert_called_once_with(bucket, exports)
+        self.assertTrue(all(x.get('Verified') for x in exports[:3]))
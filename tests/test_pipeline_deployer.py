@@ -0,0 +1,63 @@
+import unittest
+import sys
+import os
+from botocore.exceptions import ClientError
+from mock import Mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from hippolyte.pipeline_deployer import PipelineDeployer
+
+
+def create_definition(table_name):
+    return {'objects': [{'id': 'DDBSourceTable0', 'tableName': table_name}]}
+
+
+def client_error(code, operation):
+    return ClientError({'Error': {'Code': code, 'Message': code}}, operation)
+
+
+class TestPipelineDeployer(unittest.TestCase):
+    def test_create_pipelines_skips_failures_and_keeps_order(self):
+        pipeline_util = Mock()
+        pipeline_util.create_pipeline.side_effect = [
+            {'pipelineId': 'df-1'},
+            client_error('LimitExceededException', 'CreatePipeline'),
+            {'pipelineId': 'df-3'}
+        ]
+        deployer = PipelineDeployer(pipeline_util, workers=1, rate_budget=100)
+
+        descriptions = deployer.create_pipelines([create_definition('a'), create_definition('b'),
+                                                  create_definition('c')])
+
+        self.assertListEqual(map(lambda x: x['pipeline_id'], descriptions), ['df-1', 'df-3'])
+        self.assertListEqual(descriptions[1]['backed_up_tables'], ['c'])
+
+    def test_deploy_pipelines_collects_failures(self):
+        def put_pipeline_definition(pipeline_id, definition):
+            if pipeline_id == 'df-2':
+                raise client_error('InvalidRequestException', 'PutPipelineDefinition')
+            return {'errored': False}
+
+        pipeline_util = Mock()
+        pipeline_util.put_pipeline_definition.side_effect = put_pipeline_definition
+        deployer = PipelineDeployer(pipeline_util, workers=4, rate_budget=100)
+        descriptions = [{'pipeline_id': 'df-{}'.format(i), 'definition': create_definition(str(i))}
+                        for i in range(1, 6)]
+
+        summary = deployer.deploy_pipelines(descriptions)
+
+        self.assertListEqual(summary['succeeded'], ['df-1', 'df-3', 'df-4', 'df-5'])
+        self.assertEqual(len(summary['failed']), 1)
+        self.assertEqual(summary['failed'][0]['pipeline_id'], 'df-2')
+        self.assertEqual(summary['failed'][0]['stage'], 'put_pipeline_definition')
+        self.assertEqual(len(pipeline_util.activate_pipeline.call_args_list), 4)
+
+    def test_delete_pipelines_continues_after_failure(self):
+        pipeline_util = Mock()
+        pipeline_util.delete_pipeline.side_effect = [client_error('InternalServiceError', 'DeletePipeline'), None]
+        deployer = PipelineDeployer(pipeline_util, workers=1, rate_budget=100)
+
+        deployer.delete_pipelines(['df-1', 'df-2'])
+
+        self.assertEqual([x[0][0] for x in pipeline_util.delete_pipeline.call_args_list], ['df-1', 'df-2'])
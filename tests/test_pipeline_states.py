@@ -0,0 +1,76 @@
+import unittest
+import boto3
+import sys
+import os
+from botocore.exceptions import ClientError
+from mock import Mock
+from moto import mock_datapipeline
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from hippolyte.aws_utils import DataPipelineUtil
+from hippolyte.pipeline_states import PipelineStatePoller
+
+
+def describe_pipelines(deleted):
+    def describe(pipelineIds):
+        if deleted & set(pipelineIds):
+            raise ClientError({'Error': {'Code': 'PipelineDeletedException', 'Message': 'Pipeline is deleted'}},
+                              'DescribePipelines')
+
+        return {'pipelineDescriptionList': [
+            {'pipelineId': x, 'fields': [{'key': '@pipelineState', 'stringValue': 'FINISHED'}]} for x in pipelineIds
+        ]}
+
+    return describe
+
+
+def list_pipelines(client, pipeline_ids):
+    client.get_paginator.return_value.paginate.return_value = [
+        {'pipelineIdList': [{'id': x, 'name': x} for x in pipeline_ids]}
+    ]
+
+
+class TestPipelineStatePoller(unittest.TestCase):
+    @mock_datapipeline
+    def test_polls_only_given_pipelines_once(self):
+        client = boto3.client('datapipeline', region_name='us-east-1')
+        pipeline_ids = [client.create_pipeline(name=str(x), uniqueId=str(x))['pipelineId'] for x in range(30)]
+        data_pipeline_util = DataPipelineUtil()
+        data_pipeline_util.client = Mock(wraps=client)
+        poller = PipelineStatePoller(data_pipeline_util, workers=2)
+
+        states = poller.get_states(pipeline_ids[:27])
+        poller.get_states(pipeline_ids[:27])
+
+        self.assertEqual(sorted(states), sorted(pipeline_ids[:27]))
+        self.assertEqual(set(states.values()), {'PENDING'})
+        self.assertEqual(len(data_pipeline_util.client.describe_pipelines.call_args_list), 2)
+        data_pipeline_util.client.get_paginator.assert_called_once_with('list_pipelines')
+
+    def test_skips_deleted_pipelines(self):
+        data_pipeline_util = DataPipelineUtil()
+        data_pipeline_util.client = Mock()
+        data_pipeline_util.client.describe_pipelines.side_effect = describe_pipelines({'df-3', 'df-20'})
+        pipeline_ids = ['df-{}'.format(x) for x in range(30)]
+        # df-3 is deleted in between listing and describing
+        list_pipelines(data_pipeline_util.client, [x for x in pipeline_ids if x != 'df-20'])
+
+        states = PipelineStatePoller(data_pipeline_util).get_states(pipeline_ids)
+
+        self.assertEqual(states['df-3'], None)
+        self.assertEqual(states['df-20'], None)
+        self.assertEqual(len([x for x in states.values() if x == 'FINISHED']), 28)
+
+    def test_describes_only_listed_pipelines(self):
+        data_pipeline_util = DataPipelineUtil()
+        data_pipeline_util.client = Mock()
+        pipeline_ids = ['df-{}'.format(x) for x in range(470)]
+        deleted = set(x for index, x in enumerate(pipeline_ids) if index % 10)
+        data_pipeline_util.client.describe_pipelines.side_effect = describe_pipelines(deleted)
+        list_pipelines(data_pipeline_util.client, [x for x in pipeline_ids if x not in deleted])
+
+        states = PipelineStatePoller(data_pipeline_util).get_states(pipeline_ids)
+
+        self.assertEqual(len([x for x in states.values() if x == 'FINISHED']), 47)
+        self.assertEqual(len(data_pipeline_util.client.describe_pipelines.call_args_list), 2)
@@ -0,0 +1,67 @@
+import unittest
+import copy
+import json
+import sys
+import os
+import pystache
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from hippolyte.pipeline_scheduler import Scheduler
+from hippolyte.pipeline_template import PipelineTemplate, load_pipeline_template
+
+GOLDEN_DEFINITIONS = os.path.join(os.path.dirname(__file__), 'resources', 'golden_pipeline_definitions.json')
+
+
+def create_scheduler():
+    table_descriptions = [{
+        'Table': {
+            'TableName': 'table-{}'.format(index),
+            'TableSizeBytes': (index + 1) * 1024 ** 3 / 4,
+            'ProvisionedThroughput': {'ReadCapacityUnits': 100, 'WriteCapacityUnits': 5}
+        }
+    } for index in range(12)]
+
+    scheduler = Scheduler(table_descriptions, 'multiple.template', 'subnet-1', 'eu-west-1', 'backup-bucket',
+                          'log-bucket')
+    scheduler.s3_log_location = 'log-bucket/logs/2018-01-01'
+
+    return scheduler
+
+
+def render_with_pystache(template, parameters):
+    parameters = copy.deepcopy(parameters)
+
+    for backup in parameters['backups']:
+        backup['comma'] = True
+
+    parameters['backups'][-1]['comma'] = False
+
+    return json.loads(pystache.render(template, parameters))
+
+
+def read_template():
+    with open(os.path.join(os.path.dirname(__file__), '..', 'hippolyte', 'multiple.template')) as f:
+        return f.read()
+
+
+class TestPipelineTemplate(unittest.TestCase):
+    def test_definitions_match_golden_file(self):
+        definitions = create_scheduler().build_pipeline_definitions()
+
+        with open(GOLDEN_DEFINITIONS) as f:
+            self.assertEqual(json.dumps(definitions, indent=2, sort_keys=True), f.read().strip())
+
+    def test_render_matches_pystache(self):
+        template = read_template()
+        parameters = create_scheduler().build_parameters()
+        parameters[0]['subnetId'] = 'subnet-"1" & <2> \\t'
+        parameters[0]['coreInstanceCount'] = 3
+
+        for pipeline_parameters in parameters:
+            self.assertEqual(load_pipeline_template('multiple.template').render(pipeline_parameters),
+                             render_with_pystache(template, pipeline_parameters))
+
+    def test_rejects_unsupported_templates(self):
+        self.assertRaises(ValueError, PipelineTemplate, '{"objects": [{{#backups}}{"a": 1}{"b": 2}{{/backups}}]}')
+        self.assertRaises(ValueError, PipelineTemplate, '{"objects": [{"a": "{{> partial}}"}]}')
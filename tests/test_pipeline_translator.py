@@ -0,0 +1,58 @@
+import unittest
+import copy
+import sys
+import os
+from mock import patch, Mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import hippolyte.pipeline_translator as pipeline_translator
+from hippolyte.aws_utils import DataPipelineUtil
+
+DEFINITION = {
+    'objects': [
+        {'id': 'Default', 'scheduleType': 'ONDEMAND'},
+        {'id': 'TableBackupActivity0', 'name': 'Backup', 'runsOn': {'ref': 'EmrClusterForBackup'},
+         'step': ['a', 'b']}
+    ],
+    'parameters': [{'id': 'myTable', 'type': 'String', 'name': 'Table'}],
+    'values': {'myTable': 'table-1'}
+}
+
+
+class TestPipelineTranslator(unittest.TestCase):
+    def test_translate_definition_without_modifying_it(self):
+        definition = copy.deepcopy(DEFINITION)
+
+        translation = pipeline_translator.translate_definition(definition)
+
+        self.assertEqual(definition, DEFINITION)
+        self.assertListEqual(translation['objects'], [
+            {'id': 'Default', 'name': 'Default', 'fields': [{'key': 'scheduleType', 'stringValue': 'ONDEMAND'}]},
+            {'id': 'TableBackupActivity0', 'name': 'Backup', 'fields': [
+                {'key': 'runsOn', 'refValue': 'EmrClusterForBackup'},
+                {'key': 'step', 'stringValue': 'a'},
+                {'key': 'step', 'stringValue': 'b'}
+            ]}
+        ])
+        self.assertListEqual(translation['parameters'], [{'id': 'myTable', 'attributes': [
+            {'key': 'name', 'stringValue': 'Table'},
+            {'key': 'type', 'stringValue': 'String'}
+        ]}])
+        self.assertListEqual(translation['values'], [{'id': 'myTable', 'stringValue': 'table-1'}])
+        self.assertIsNone(pipeline_translator.translate_definition({'objects': []})['values'])
+        self.assertRaises(pipeline_translator.PipelineDefinitionError,
+                          pipeline_translator.translate_definition, {'objects': [{'name': 'no id'}]})
+
+    @patch('hippolyte.aws_utils.pipeline_translator.translate_definition',
+           side_effect=pipeline_translator.translate_definition)
+    def test_put_and_activate_translate_definition_once(self, translate_mock):
+        pipeline_util = DataPipelineUtil()
+        pipeline_util.client = Mock()
+
+        pipeline_util.put_pipeline_definition('df-1', DEFINITION)
+        pipeline_util.activate_pipeline('df-1', DEFINITION)
+
+        self.assertEqual(translate_mock.call_count, 1)
+        self.assertEqual(pipeline_util.client.activate_pipeline.call_args[1]['parameterValues'],
+                         [{'id': 'myTable', 'stringValue': 'table-1'}])
@@ -0,0 +1,72 @@
+import unittest
+import boto3
+import sys
+import os
+from botocore.exceptions import ClientError
+from botocore.stub import Stubber
+from mock import Mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from hippolyte.rate_limiter import AdaptiveRateLimiter
+
+
+def throttling_error():
+    return ClientError({'Error': {'Code': 'ThrottlingException', 'Message': 'Rate exceeded'}}, 'DescribeTable')
+
+
+class TestAdaptiveRateLimiter(unittest.TestCase):
+    def test_retries_throttled_call_at_lower_rate(self):
+        rate_limiter = AdaptiveRateLimiter(initial_rate=100, min_rate=1, max_rate=100)
+        responses = [throttling_error(), throttling_error(), 'described']
+
+        def call():
+            response = responses.pop(0)
+            if isinstance(response, Exception):
+                raise response
+            return response
+
+        self.assertEqual(rate_limiter.call(call), 'described')
+        self.assertEqual(rate_limiter.rate, 25.5)
+        self.assertEqual(rate_limiter.metrics()['throttles'], 2)
+        self.assertEqual(rate_limiter.metrics()['calls'], 3)
+
+    def test_gives_up_after_max_attempts(self):
+        rate_limiter = AdaptiveRateLimiter(initial_rate=100, max_attempts=2)
+
+        def call():
+            raise throttling_error()
+
+        self.assertRaises(ClientError, rate_limiter.call, call)
+
+    def test_does_not_retry_other_errors(self):
+        rate_limiter = AdaptiveRateLimiter(initial_rate=100, max_rate=100)
+        calls = []
+
+        def call():
+            calls.append(1)
+            raise ValueError()
+
+        self.assertRaises(ValueError, rate_limiter.call, call)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(rate_limiter.rate, 100)
+
+    def test_attached_client_adapts_rate_to_responses(self):
+        rate_limiter = AdaptiveRateLimiter(initial_rate=20, max_rate=100)
+        client = rate_limiter.attach(boto3.client('dynamodb', region_name='eu-west-1'))
+        stubber = Stubber(client)
+        stubber.add_response('describe_table', {'Table': {'TableName': 'table'}}, {'TableName': 'table'})
+        stubber.add_client_error('describe_table', service_error_code='ResourceNotFoundException')
+
+        with stubber:
+            client.describe_table(TableName='table')
+            self.assertRaises(ClientError, client.describe_table, TableName='table')
+
+        self.assertEqual(rate_limiter.rate, 20.5)
+
+        client.meta.events.emit('needs-retry.dynamodb.DescribeTable',
+                                response=(Mock(status_code=400), {'Error': {'Code': 'ThrottlingException'}}), attempts=1,
+                                caught_exception=None)
+
+        self.assertEqual(rate_limiter.rate, 10.25)
+        self.assertEqual(rate_limiter.metrics()['throttles'], 1)
@@ -0,0 +1,95 @@
+import unittest
+import boto3
+import json
+import sys
+import os
+from mock import Mock, patch
+from moto import mock_s3
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from hippolyte.pipeline_scheduler import route_tables
+from hippolyte.table_exporter import TableExporter, to_export_line
+
+BUCKET = 'backups'
+
+
+def describe(table_name, size=1024, read_capacity_units=100):
+    return {'Table': {'TableName': table_name, 'TableSizeBytes': size,
+                      'ProvisionedThroughput': {'ReadCapacityUnits': read_capacity_units}}}
+
+
+def scan_pages(table_name, segment, total_segments):
+    if table_name == 'broken':
+        raise Exception('Scan failed')
+
+    return [{'Items': [{'id': {'S': '{}-{}'.format(segment, x)}}], 'ConsumedCapacity': {'CapacityUnits': 0.5}}
+            for x in range(2)]
+
+
+class TestTableExporter(unittest.TestCase):
+    def test_formats_items_as_data_pipeline_export(self):
+        item = {'id': {'S': 'a'}, 'count': {'N': '3'}, 'data': {'B': b'\x00\x01'},
+                'tags': {'L': [{'SS': ['x']}, {'NULL': True}]}, 'nested': {'M': {'flag': {'BOOL': False}}}}
+
+        self.assertEqual(to_export_line(item), '\x03'.join([
+            'count\x02{"n":"3"}',
+            'data\x02{"b":"AAE="}',
+            'id\x02{"s":"a"}',
+            'nested\x02{"m":{"flag":{"bOOL":false}}}',
+            'tags\x02{"l":[{"sS":["x"]},{"nULLValue":true}]}'
+        ]) + '\n')
+
+    @mock_s3
+    def test_exports_segments_with_manifest_and_success_flag(self):
+        s3 = boto3.client('s3')
+        s3.create_bucket(Bucket=BUCKET)
+        exporter = TableExporter(BUCKET, segments=2)
+        exporter.dynamo_db_util = Mock()
+        exporter.dynamo_db_util.iter_scan_pages.side_effect = scan_pages
+
+        locations, failed = exporter.export_tables([describe('small'), describe('broken')])
+
+        self.assertEqual(failed, [describe('broken')])
+        self.assertEqual(locations.keys(), ['small'])
+        prefix = locations['small'].split('/', 3)[3]
+        keys = [x['Key'] for x in s3.list_objects(Bucket=BUCKET, Prefix=prefix)['Contents']]
+        manifest = json.loads(s3.get_object(Bucket=BUCKET, Key=prefix + 'manifest')['Body'].read())
+        data_keys = [x['url'].split('/', 3)[3] for x in manifest['entries']]
+        lines = ''.join(s3.get_object(Bucket=BUCKET, Key=x)['Body'].read() for x in data_keys).splitlines()
+
+        self.assertIn(prefix + '_SUCCESS', keys)
+        self.assertEqual(len(data_keys), 2)
+        self.assertEqual(sorted(lines), ['id\x02{{"s":"{}-{}"}}'.format(x, y) for x in range(2) for y in range(2)])
+
+    def test_routes_smallest_tables_within_budget(self):
+        duration_model = Mock()
+        duration_model.estimate.side_effect = lambda table_name, size, rcu, percent: size / 1000
+        tables = [describe('empty', 0), describe('small', 30000), describe('medium', 60000),
+                  describe('large', 200000), describe('huge', 10 ** 9)]
+
+        pipeline_tables, in_process_tables = route_tables(tables, 10 ** 6, duration_model, budget=100, workers=1)
+
+        self.assertEqual([x['Table']['TableName'] for x in in_process_tables], ['small', 'medium'])
+        self.assertEqual([x['Table']['TableName'] for x in pipeline_tables], ['empty', 'large', 'huge'])
+
+    def test_routes_within_budget_of_each_worker(self):
+        duration_model = Mock()
+        duration_model.estimate.side_effect = lambda table_name, size, rcu, percent: size / 1000
+        tables = [describe('big', 90000), describe('first', 10000), describe('second', 10000)]
+
+        pipeline_tables, in_process_tables = route_tables(tables, 10 ** 6, duration_model, budget=100, workers=2)
+
+        self.assertEqual([x['Table']['TableName'] for x in in_process_tables], ['first', 'second'])
+        self.assertEqual([x['Table']['TableName'] for x in pipeline_tables], ['big'])
+
+    @patch('hippolyte.pipeline_scheduler.get_remaining_seconds', return_value=45)
+    def test_routes_within_time_left_in_invocation(self, remaining_mock):
+        duration_model = Mock()
+        duration_model.estimate.side_effect = lambda table_name, size, rcu, percent: size / 1000
+        tables = [describe('small', 10000), describe('medium', 20000)]
+
+        pipeline_tables, in_process_tables = route_tables(tables, 10 ** 6, duration_model, workers=2)
+
+        self.assertEqual([x['Table']['TableName'] for x in in_process_tables], ['small'])
+        self.assertEqual([x['Table']['TableName'] for x in pipeline_tables], ['medium'])
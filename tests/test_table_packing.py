@@ -0,0 +1,62 @@
+import unittest
+import random
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from hippolyte.table_packing import pack_balanced, pack_greedy, get_packing_strategy
+from hippolyte.utils import EMR_BOOTSTRAP_TIME, MAX_DURATION_SEC, MAX_TABLES_PER_PIPELINE
+
+
+def generate_tables(count, seed=1):
+    generator = random.Random(seed)
+    tables = [('table-{}'.format(i), generator.paretovariate(1.2) * 120, 1024) for i in range(count)]
+
+    return sorted(tables, key=lambda x: x[1])
+
+
+def makespan(pipelines):
+    return max(EMR_BOOTSTRAP_TIME + sum(table[1] for table in pipeline) for pipeline in pipelines)
+
+
+class TestTablePacking(unittest.TestCase):
+    def pack(self, strategy, tables):
+        return strategy(tables, EMR_BOOTSTRAP_TIME, MAX_DURATION_SEC, MAX_TABLES_PER_PIPELINE)
+
+    def test_balanced_respects_limits_and_keeps_every_table(self):
+        tables = generate_tables(500)
+        pipelines = self.pack(pack_balanced, tables)
+
+        packed = sorted(table for pipeline in pipelines for table in pipeline)
+        self.assertListEqual(packed, sorted(tables))
+
+        for pipeline in pipelines:
+            self.assertLessEqual(len(pipeline), MAX_TABLES_PER_PIPELINE)
+            if len(pipeline) > 1:
+                self.assertLess(EMR_BOOTSTRAP_TIME + sum(table[1] for table in pipeline), MAX_DURATION_SEC)
+
+    def test_balanced_is_not_worse_than_greedy(self):
+        for seed in range(5):
+            tables = generate_tables(300, seed)
+            greedy = self.pack(pack_greedy, tables)
+            balanced = self.pack(pack_balanced, tables)
+
+            self.assertLessEqual(len(balanced), len(greedy))
+            self.assertLessEqual(makespan(balanced), makespan(greedy))
+
+    def test_oversized_table_gets_own_pipeline(self):
+        tables = [('small', 100, 1), ('huge', MAX_DURATION_SEC * 2, 1)]
+        pipelines = self.pack(pack_balanced, tables)
+
+        self.assertIn([('huge', MAX_DURATION_SEC * 2, 1)], pipelines)
+        self.assertIn([('small', 100, 1)], pipelines)
+
+    def test_greedy_fills_pipelines_in_order(self):
+        tables = [('table-{}'.format(i), 10, 1) for i in range(MAX_TABLES_PER_PIPELINE + 1)]
+        pipelines = self.pack(pack_greedy, tables)
+
+        self.assertListEqual(pipelines, [tables[:MAX_TABLES_PER_PIPELINE], tables[MAX_TABLES_PER_PIPELINE:]])
+
+    def test_unknown_strategy(self):
+        self.assertRaises(ValueError, get_packing_strategy, 'random')